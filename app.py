@@ -1,4 +1,5 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, g
+import atexit
 import json
 import random
 import time
@@ -10,25 +11,118 @@ import threading
 import base64
 from datetime import datetime
 from object_detection import ObjectDetector
+from model_registry import model_registry
+from frame_slot import LatestFrameSlot
+from stream_broadcast import MJPEGBroadcaster, make_mjpeg_packet, BOUNDARY
+from upstream_reader import get_upstream_reader, get_upstream_stats
 from integrated_voice_assistant import IntegratedVoiceAssistant
+from component_loader import ComponentLoader
+from helmet_sessions import SessionManager, DEFAULT_HELMET
 
 app = Flask(__name__)
 
-# Initialize the object detector
-object_detector = ObjectDetector()
+# Object detector settings. HELMET_DETECTION_INTERVAL > 1 runs the detectors only
+# every Nth frame and tracks the boxes in between; HELMET_MOTION_GATING=1 skips or
+# crops detection based on which parts of the frame changed; HELMET_DETECTIONS_ONLY=1
+# streams the camera frames untouched and leaves drawing the boxes to the browser;
+# HELMET_PIPELINE picks the stages and detectors (a preset from pipeline.py such as
+# haar_only, or a .json file); HELMET_FRAME_CACHE_THRESHOLD is how many of the 64
+# frame hash bits may differ for a frame to reuse an earlier frame's detections
+# (-1 turns the cache off); HELMET_INFERENCE_BACKEND=onnxruntime (or auto, which falls
+# back to cv2.dnn without it) runs the YOLO models on ONNX Runtime, from a checked export
+# of the Darknet files kept in models/cache, tuned with the HELMET_ORT_* variables
+detector_settings = {
+    'detection_interval': int(os.environ.get('HELMET_DETECTION_INTERVAL', 1)),
+    'motion_gating': os.environ.get('HELMET_MOTION_GATING', '0') == '1',
+    'annotate': os.environ.get('HELMET_DETECTIONS_ONLY', '0') != '1',
+    'motion_method': os.environ.get('HELMET_MOTION_METHOD', 'diff'),  # diff, running_average or mog2
+    'motion_width': int(os.environ.get('HELMET_MOTION_WIDTH', 320)),  # Motion analysis resolution
+    'cores_per_stream': int(os.environ.get('HELMET_CORES_PER_STREAM', 1)),  # Threads one frame's detectors may use
+    'pipeline': os.environ.get('HELMET_PIPELINE', 'default'),
+    'frame_cache_size': int(os.environ.get('HELMET_FRAME_CACHE_SIZE', 32)),
+    'frame_cache_threshold': int(os.environ.get('HELMET_FRAME_CACHE_THRESHOLD', 4)),
+    'inference': {
+        'backend': os.environ.get('HELMET_INFERENCE_BACKEND', 'opencv'),  # opencv, auto or onnxruntime
+        'intra_op_threads': int(os.environ.get('HELMET_ORT_INTRA_THREADS', 0)),
+        'inter_op_threads': int(os.environ.get('HELMET_ORT_INTER_THREADS', 0)),
+        'graph_optimization': os.environ.get('HELMET_ORT_OPTIMIZATION', 'all'),  # disabled, basic, extended or all
+        'int8': os.environ.get('HELMET_ORT_INT8', '0') == '1'
+    }
+}
+
+# Optional pool of detector processes for the local webcam (HELMET_DETECTION_WORKERS > 0).
+# Created before anything else so the workers fork from a process with no extra threads
+detection_pool = None
+if int(os.environ.get('HELMET_DETECTION_WORKERS', 0)) > 0:
+    from detection_workers import DetectionWorkerPool
+    detection_pool = DetectionWorkerPool(
+        num_workers=int(os.environ['HELMET_DETECTION_WORKERS']),
+        detector_kwargs=detector_settings
+    )
+    # Stop the workers and free the shared frame ring when the server exits
+    atexit.register(detection_pool.close)
+
+# The object detector and the text-to-speech engine take seconds to load, so they are
+# built on a background thread once the server is listening (see component_loader.py).
+# Until the detector is ready, get_object_detector() returns None and the routes that
+# need it answer in a degraded mode; /api/ready reports the progress
+def load_object_detector():
+    return ObjectDetector(**detector_settings)
 
-# Initialize the integrated voice assistant
+component_loader = ComponentLoader()
+component_loader.register('object_detector', load_object_detector, warm_up=lambda detector: detector.warm_up())
+
+# Initialize the integrated voice assistant. Its routes must exist before the first
+# request, but its speech engine loads in the background; it can listen without one
 voice_assistant = IntegratedVoiceAssistant(app)
+component_loader.register('text_to_speech', voice_assistant.load_engine, required=False)
+
+def get_object_detector(create=True):
+    """
+    The requested helmet's object detector once it is ready, otherwise None. With
+    create set, a helmet without one gets it built in the background; routes that
+    only report status pass create=False
+    """
+    return current_session().get_detector(create)
+
+def get_stream_detector(stream):
+    """The requested helmet's detector context for one camera stream, or None while the detector loads"""
+    return current_session().get_stream_detector(stream)
+
+def detector_unavailable():
+    """Degraded answer for requests that need the object detector while it is still loading"""
+    session = current_session()
+    response = jsonify({
+        'success': False,
+        'ready': False,
+        'error': session.detector_error or 'Object detector is still loading',
+        'helmet_id': session.helmet_id,
+        'components': component_loader.get_stats()['components']
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
 
 # For webcam capture if using local camera
 webcam = None
 webcam_lock = threading.Lock()
 webcam_frame = None
 webcam_thread_active = False
+webcam_slot = None  # Latest captured frame, handed from the capture thread to the inference thread
+
+# Encodes each processed webcam frame once for all /local_camera_stream viewers
+local_broadcaster = MJPEGBroadcaster('local_camera')
 
-# Global state for simulation
-simulation_state = {
+# Frame slots of all active streams, for drop/latency statistics
+stream_slots = {}
+stream_slots_lock = threading.Lock()
+
+# Initial simulation state of every helmet. Routes change a helmet's state through its
+# store, which applies each change atomically and publishes it as a new immutable,
+# versioned snapshot that any thread can read without locking (see state_store.py)
+initial_state = {
     'speed': 0,
+    'current_time': datetime.now().strftime("%I:%M %p"),
     'call_active': False,
     'caller_name': None,
     'music_playing': False,
@@ -40,16 +134,6 @@ simulation_state = {
     'fuel_level': 75,
     'camera_connected': False,
     'esp32_camera_url': 'http://192.168.1.100', # Default ESP32 camera IP - update this
-    'camera_sensor_data': {
-        'light_level': 500,  # Ambient light level in lux
-        'motion_detected': False,  # Motion detection flag
-        'distance': 3.5,  # Distance in meters (from ultrasonic/ToF sensor)
-        'resolution': '640x480',  # Camera resolution
-        'framerate': 20,  # Camera framerate
-        'quality': 85,  # JPEG quality (0-100)
-        'humans_count': 0,  # Number of humans detected
-        'vehicles_count': 0  # Number of vehicles detected
-    },
     'sensor_history': {
         'light_trend': 'stable',  # 'increasing', 'decreasing', or 'stable'
         'light_direction': 1,  # 1 for increasing, -1 for decreasing
@@ -58,6 +142,99 @@ simulation_state = {
     }
 }
 
+# Initial camera sensor readings. The detector replaces them after every frame, so they
+# live in a store of their own and don't change the simulation state's version and ETag
+initial_sensors = {
+    'light_level': 500,  # Ambient light level in lux
+    'motion_detected': False,  # Motion detection flag
+    'distance': 3.5,  # Distance in meters (from ultrasonic/ToF sensor)
+    'resolution': '640x480',  # Camera resolution
+    'framerate': 20,  # Camera framerate
+    'quality': 85,  # JPEG quality (0-100)
+    'humans_count': 0,  # Number of humans detected
+    'vehicles_count': 0  # Number of vehicles detected
+}
+
+# One session per helmet, each with its own state, state channel (/api/state/stream)
+# and detector; the detectors share the model weights (see helmet_sessions.py).
+# HELMET_MAX_SESSIONS caps how many helmets the server hosts at once (0: no limit)
+# and HELMET_SESSION_IDLE_TIMEOUT is how many seconds an unused session is kept
+def create_session_detector(session):
+    """
+    Runs on the session's background thread. The default helmet gets the detector
+    the loader warms up; the others get their own once it is ready, sharing its models
+    """
+    base = component_loader.wait('object_detector')
+    if base is None or session.helmet_id == DEFAULT_HELMET:
+        return base
+    detector = ObjectDetector(**detector_settings, share_models_with=base)
+    detector.warm_up()
+    return detector
+
+sessions = SessionManager(
+    initial_state,
+    initial_sensors,
+    create_session_detector,
+    idle_timeout=float(os.environ.get('HELMET_SESSION_IDLE_TIMEOUT', 600)),
+    max_sessions=int(os.environ.get('HELMET_MAX_SESSIONS', 0)),
+    max_rate=float(os.environ.get('HELMET_STATE_MAX_RATE', 5))
+)
+
+# The local webcam and the server's microphone belong to the default helmet
+default_session = sessions.get(DEFAULT_HELMET)
+
+# Endpoints that serve one helmet, at /<rule> for the default helmet and at
+# /helmets/<helmet_id>/<rule> for any other
+helmet_endpoints = set()
+
+def helmet_route(rule, **options):
+    """Like app.route, for a route that works on the current helmet's session"""
+    def decorator(view):
+        helmet_endpoints.add(view.__name__)
+        app.route(rule, **options)(view)
+        app.route('/helmets/<helmet_id>' + rule, **options)(view)
+        return view
+    return decorator
+
+@app.url_value_preprocessor
+def pull_helmet_id(endpoint, values):
+    """Take the helmet ID out of /helmets/<helmet_id>/... URLs so views don't need the argument"""
+    if values and 'helmet_id' in values:
+        g.helmet_id = values.pop('helmet_id')
+        g.helmet_base = f'/helmets/{g.helmet_id}'
+    else:
+        g.helmet_id = DEFAULT_HELMET
+        g.helmet_base = ''
+
+@app.before_request
+def open_helmet_session():
+    """Find or create the session of the helmet a request is for"""
+    if request.endpoint not in helmet_endpoints:
+        return None
+    try:
+        g.helmet_session = sessions.get(g.helmet_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except RuntimeError as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return None
+
+def current_session():
+    """Session of the helmet the current request is for"""
+    return g.helmet_session
+
+def state_clock_loop():
+    """Keep every helmet's clock current and evict idle sessions; an unchanged time creates no new version"""
+    while True:
+        current_time = datetime.now().strftime("%I:%M %p")
+        for session in sessions.all():
+            session.state_store.update(current_time=current_time)
+        sessions.evict_idle()
+        time.sleep(5)
+
 # Sample data for simulation
 callers = ["John Smith", "Alice Johnson", "David Lee", "Sarah Wilson", "Mom", "Dad", "Work"]
 songs = ["Highway to Hell", "Born to be Wild", "Ride the Lightning", "Fuel", "Breaking the Law", "Living on a Prayer"]
@@ -71,89 +248,113 @@ navigation_steps = [
 ]
 
 # Routes
-@app.route('/')
+@helmet_route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', helmet_base=g.helmet_base)
 
-@app.route('/simulation')
+@helmet_route('/simulation')
 def simulation():
-    return render_template('simulation.html')
+    return render_template('simulation.html', helmet_base=g.helmet_base)
 
-@app.route('/api/state')
+@helmet_route('/api/state')
 def get_state():
-    # Add current time to state with 12-hour format and AM/PM
-    simulation_state['current_time'] = datetime.now().strftime("%I:%M %p")
-    return jsonify(simulation_state)
+    """
+    The whole simulation state. The ETag names the state version, so a client
+    sending it back in If-None-Match gets a 304 until something changes
+    """
+    snapshot = current_session().state_store.get()
+    if request.if_none_match.contains(snapshot.etag):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.to_json(), mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    # Revalidate every time, so browsers send If-None-Match on their own
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/api/update_speed', methods=['POST'])
+@helmet_route('/api/state/stream')
+def state_stream():
+    """
+    Push changed state and sensor fields as Server-Sent Events, coalesced to at
+    most ?max_rate messages per second (HELMET_STATE_MAX_RATE by default)
+    """
+    max_rate = request.args.get('max_rate', type=float)
+    return Response(current_session().state_feed.stream(max_rate=max_rate), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@helmet_route('/api/update_speed', methods=['POST'])
 def update_speed():
     data = request.json
-    simulation_state['speed'] = data.get('speed', simulation_state['speed'])
+    if 'speed' in data:
+        current_session().state_store.update(speed=data['speed'])
     return jsonify({'success': True})
 
-@app.route('/api/trigger_call', methods=['POST'])
+@helmet_route('/api/trigger_call', methods=['POST'])
 def trigger_call():
     data = request.json
-    if data.get('action') == 'start':
-        caller = data.get('caller', random.choice(callers))
-        simulation_state['call_active'] = True
-        simulation_state['caller_name'] = caller
-    else:
-        simulation_state['call_active'] = False
-        simulation_state['caller_name'] = None
+    with current_session().state_store.edit() as state:
+        if data.get('action') == 'start':
+            caller = data.get('caller', random.choice(callers))
+            state['call_active'] = True
+            state['caller_name'] = caller
+        else:
+            state['call_active'] = False
+            state['caller_name'] = None
     return jsonify({'success': True})
 
-@app.route('/api/music_control', methods=['POST'])
+@helmet_route('/api/music_control', methods=['POST'])
 def music_control():
     data = request.json
     action = data.get('action')
     
-    if action == 'play':
-        song = data.get('song', random.choice(songs))
-        simulation_state['music_playing'] = True
-        simulation_state['song_title'] = song
-    elif action == 'pause':
-        simulation_state['music_playing'] = False
-    elif action == 'next':
-        song = random.choice(songs)
-        simulation_state['music_playing'] = True
-        simulation_state['song_title'] = song
-    elif action == 'previous':
-        song = random.choice(songs)
-        simulation_state['music_playing'] = True
-        simulation_state['song_title'] = song
+    with current_session().state_store.edit() as state:
+        if action == 'play':
+            song = data.get('song', random.choice(songs))
+            state['music_playing'] = True
+            state['song_title'] = song
+        elif action == 'pause':
+            state['music_playing'] = False
+        elif action == 'next':
+            song = random.choice(songs)
+            state['music_playing'] = True
+            state['song_title'] = song
+        elif action == 'previous':
+            song = random.choice(songs)
+            state['music_playing'] = True
+            state['song_title'] = song
         
     return jsonify({'success': True})
 
-@app.route('/api/navigation', methods=['POST'])
+@helmet_route('/api/navigation', methods=['POST'])
 def navigation():
     data = request.json
     action = data.get('action')
     
-    if action == 'start':
-        # Start navigation with first step
-        step = navigation_steps[0]
-        simulation_state['nav_direction'] = step['direction']
-        simulation_state['nav_instruction'] = step['instruction']
-        simulation_state['nav_distance'] = step['distance']
-    elif action == 'next':
-        # Find current step and move to next
-        current_direction = simulation_state['nav_direction']
-        for i, step in enumerate(navigation_steps):
-            if step['direction'] == current_direction and i < len(navigation_steps) - 1:
-                next_step = navigation_steps[i + 1]
-                simulation_state['nav_direction'] = next_step['direction']
-                simulation_state['nav_instruction'] = next_step['instruction']
-                simulation_state['nav_distance'] = next_step['distance']
-                break
-    elif action == 'stop':
-        simulation_state['nav_direction'] = None
-        simulation_state['nav_instruction'] = None
-        simulation_state['nav_distance'] = 0
+    with current_session().state_store.edit() as state:
+        if action == 'start':
+            # Start navigation with first step
+            step = navigation_steps[0]
+            state['nav_direction'] = step['direction']
+            state['nav_instruction'] = step['instruction']
+            state['nav_distance'] = step['distance']
+        elif action == 'next':
+            # Find current step and move to next
+            current_direction = state['nav_direction']
+            for i, step in enumerate(navigation_steps):
+                if step['direction'] == current_direction and i < len(navigation_steps) - 1:
+                    next_step = navigation_steps[i + 1]
+                    state['nav_direction'] = next_step['direction']
+                    state['nav_instruction'] = next_step['instruction']
+                    state['nav_distance'] = next_step['distance']
+                    break
+        elif action == 'stop':
+            state['nav_direction'] = None
+            state['nav_instruction'] = None
+            state['nav_distance'] = 0
         
     return jsonify({'success': True})
 
-@app.route('/api/voice_command', methods=['POST'])
+@helmet_route('/api/voice_command', methods=['POST'])
 def voice_command():
     """Process voice commands from the voice assistant"""
     try:
@@ -171,112 +372,114 @@ def voice_command():
         # Log the incoming command
         print(f"Voice command received: '{command}'")
         
-        # Process different voice commands
-        if 'call' in command:
-            # Extract name after "call"
-            words = command.split()
-            if len(words) > 1 and words[0] == "call":
-                name = " ".join(words[1:])
-                simulation_state['call_active'] = True
-                simulation_state['caller_name'] = name
-                response['response'] = f"Calling {name}"
-            else:
-                # Check if name is somewhere else in the command
-                for i, word in enumerate(words):
-                    if word == "call" and i < len(words) - 1:
-                        name = " ".join(words[i+1:])
-                        simulation_state['call_active'] = True
-                        simulation_state['caller_name'] = name
-                        response['response'] = f"Calling {name}"
-                        break
+        # Every change a command makes becomes one new state version
+        with current_session().state_store.edit() as state:
+            # Process different voice commands
+            if 'call' in command:
+                # Extract name after "call"
+                words = command.split()
+                if len(words) > 1 and words[0] == "call":
+                    name = " ".join(words[1:])
+                    state['call_active'] = True
+                    state['caller_name'] = name
+                    response['response'] = f"Calling {name}"
+                else:
+                    # Check if name is somewhere else in the command
+                    for i, word in enumerate(words):
+                        if word == "call" and i < len(words) - 1:
+                            name = " ".join(words[i+1:])
+                            state['call_active'] = True
+                            state['caller_name'] = name
+                            response['response'] = f"Calling {name}"
+                            break
         
-        elif any(x in command for x in ['end call', 'hang up', 'stop call']):
-            simulation_state['call_active'] = False
-            simulation_state['caller_name'] = None
-            response['response'] = "Call ended"
+            elif any(x in command for x in ['end call', 'hang up', 'stop call']):
+                state['call_active'] = False
+                state['caller_name'] = None
+                response['response'] = "Call ended"
         
-        elif any(x in command for x in ['play music', 'play song', 'start music']):
-            song = random.choice(songs)
-            simulation_state['music_playing'] = True
-            simulation_state['song_title'] = song
-            response['response'] = f"Playing {song}"
+            elif any(x in command for x in ['play music', 'play song', 'start music']):
+                song = random.choice(songs)
+                state['music_playing'] = True
+                state['song_title'] = song
+                response['response'] = f"Playing {song}"
         
-        elif any(x in command for x in ['pause music', 'stop music']):
-            simulation_state['music_playing'] = False
-            response['response'] = "Music paused"
+            elif any(x in command for x in ['pause music', 'stop music']):
+                state['music_playing'] = False
+                response['response'] = "Music paused"
         
-        elif 'next song' in command or 'skip song' in command:
-            song = random.choice(songs)
-            simulation_state['music_playing'] = True
-            simulation_state['song_title'] = song
-            response['response'] = f"Playing next song: {song}"
+            elif 'next song' in command or 'skip song' in command:
+                song = random.choice(songs)
+                state['music_playing'] = True
+                state['song_title'] = song
+                response['response'] = f"Playing next song: {song}"
         
-        elif 'previous song' in command:
-            song = random.choice(songs)
-            simulation_state['music_playing'] = True
-            simulation_state['song_title'] = song
-            response['response'] = f"Playing previous song: {song}"
-        
-        elif any(x in command for x in ['navigate', 'directions', 'navigation', 'start navigation']):
-            # Check if there's a destination
-            destination = None
-            for word in ['to', 'towards']:
-                if word in command:
-                    parts = command.split(word, 1)
-                    if len(parts) > 1:
-                        destination = parts[1].strip()
+            elif 'previous song' in command:
+                song = random.choice(songs)
+                state['music_playing'] = True
+                state['song_title'] = song
+                response['response'] = f"Playing previous song: {song}"
+        
+            elif any(x in command for x in ['navigate', 'directions', 'navigation', 'start navigation']):
+                # Check if there's a destination
+                destination = None
+                for word in ['to', 'towards']:
+                    if word in command:
+                        parts = command.split(word, 1)
+                        if len(parts) > 1:
+                            destination = parts[1].strip()
             
-            # Start navigation with first step
-            step = navigation_steps[0]
-            simulation_state['nav_direction'] = step['direction']
-            simulation_state['nav_instruction'] = step['instruction']
-            simulation_state['nav_distance'] = step['distance']
+                # Start navigation with first step
+                step = navigation_steps[0]
+                state['nav_direction'] = step['direction']
+                state['nav_instruction'] = step['instruction']
+                state['nav_distance'] = step['distance']
             
-            if destination:
-                response['response'] = f"Starting navigation to {destination}: {step['instruction']}"
-            else:
-                response['response'] = f"Starting navigation: {step['instruction']}"
+                if destination:
+                    response['response'] = f"Starting navigation to {destination}: {step['instruction']}"
+                else:
+                    response['response'] = f"Starting navigation: {step['instruction']}"
         
-        elif any(x in command for x in ['stop navigation', 'cancel navigation', 'end navigation']):
-            simulation_state['nav_direction'] = None
-            simulation_state['nav_instruction'] = None
-            simulation_state['nav_distance'] = 0
-            response['response'] = "Navigation cancelled"
+            elif any(x in command for x in ['stop navigation', 'cancel navigation', 'end navigation']):
+                state['nav_direction'] = None
+                state['nav_instruction'] = None
+                state['nav_distance'] = 0
+                response['response'] = "Navigation cancelled"
         
-        elif 'next direction' in command:
-            # Find current step and move to next
-            current_direction = simulation_state['nav_direction']
-            for i, step in enumerate(navigation_steps):
-                if step['direction'] == current_direction and i < len(navigation_steps) - 1:
-                    next_step = navigation_steps[i + 1]
-                    simulation_state['nav_direction'] = next_step['direction']
-                    simulation_state['nav_instruction'] = next_step['instruction']
-                    simulation_state['nav_distance'] = next_step['distance']
-                    response['response'] = f"Next direction: {next_step['instruction']}"
-                    break
-            else:
-                response['response'] = "You have reached your destination"
+            elif 'next direction' in command:
+                # Find current step and move to next
+                current_direction = state['nav_direction']
+                for i, step in enumerate(navigation_steps):
+                    if step['direction'] == current_direction and i < len(navigation_steps) - 1:
+                        next_step = navigation_steps[i + 1]
+                        state['nav_direction'] = next_step['direction']
+                        state['nav_instruction'] = next_step['instruction']
+                        state['nav_distance'] = next_step['distance']
+                        response['response'] = f"Next direction: {next_step['instruction']}"
+                        break
+                else:
+                    response['response'] = "You have reached your destination"
         
-        elif 'speed' in command:
-            # Report current speed
-            current_speed = simulation_state['speed']
-            response['response'] = f"Current speed is {current_speed} kilometers per hour"
+            elif 'speed' in command:
+                # Report current speed
+                current_speed = state['speed']
+                response['response'] = f"Current speed is {current_speed} kilometers per hour"
             
-        elif any(x in command for x in ['time', "what's the time", 'current time']):
-            # Report current time
-            current_time = datetime.now().strftime("%I:%M %p")
-            response['response'] = f"The current time is {current_time}"
-        
-        elif 'help' in command:
-            # List available commands
-            response['response'] = ("Available commands: call [name], end call, "
-                                   "play music, pause music, next song, previous song, "
-                                   "navigate to [place], stop navigation, next direction, "
-                                   "current speed, what's the time")
+            elif any(x in command for x in ['time', "what's the time", 'current time']):
+                # Report current time
+                current_time = datetime.now().strftime("%I:%M %p")
+                response['response'] = f"The current time is {current_time}"
         
-        else:
-            response['action_taken'] = False
-            response['response'] = "I didn't understand that command. Try saying 'Helmet help' for available commands."
+            elif 'help' in command:
+                # List available commands
+                response['response'] = ("Available commands: call [name], end call, "
+                                       "play music, pause music, next song, previous song, "
+                                       "navigate to [place], stop navigation, next direction, "
+                                       "current speed, what's the time")
+        
+            else:
+                response['action_taken'] = False
+                response['response'] = "I didn't understand that command. Try saying 'Helmet help' for available commands."
         
         return jsonify(response)
     
@@ -288,98 +491,120 @@ def voice_command():
             'response': "Sorry, there was an error processing your command"
         })
 
-@app.route('/api/connect_camera', methods=['POST'])
+@helmet_route('/api/connect_camera', methods=['POST'])
 def connect_camera():
     data = request.json
     ip_address = data.get('ip_address', '')
     
     if ip_address:
         # Update the ESP32 camera URL
-        simulation_state['esp32_camera_url'] = f'http://{ip_address}'
+        camera_url = f'http://{ip_address}'
+        current_session().state_store.update(esp32_camera_url=camera_url)
         
         # Test the connection
         try:
-            resp = requests.get(f'{simulation_state["esp32_camera_url"]}', timeout=3)
+            resp = requests.get(camera_url, timeout=3)
             if resp.status_code == 200:
-                simulation_state['camera_connected'] = True
+                current_session().state_store.update(camera_connected=True)
                 return jsonify({'success': True, 'message': 'Camera connected successfully'})
         except:
             pass
             
     return jsonify({'success': False, 'message': 'Failed to connect to camera'})
 
-@app.route('/camera_stream')
+@helmet_route('/camera_stream')
 def camera_stream():
     """Stream the camera with object detection overlays"""
-    if not simulation_state['camera_connected']:
+    state = current_session().state_store.get()
+    if not state['camera_connected']:
         # Return a fallback image or error message if camera is not connected
         return Response(b'Camera not connected', mimetype='text/plain')
     
-    def generate_frames():
-        try:
-            # Create a connection to ESP32 camera stream
-            resp = requests.get(f'{simulation_state["esp32_camera_url"]}/stream', stream=True, timeout=5)
-            
-            # Variables for MJPEG parsing
-            boundary = b''
-            for line in resp.iter_lines():
-                if line.startswith(b'--'):
-                    boundary = line
-                    break
-            
-            # Process the stream
-            buffer = b''
-            for chunk in resp.iter_content(chunk_size=1024):
-                buffer += chunk
-                
-                # Find start and end of JPEG in buffer
-                start = buffer.find(b'\xff\xd8')
-                end = buffer.find(b'\xff\xd9')
-                
-                if start != -1 and end != -1:
-                    # Extract JPEG data
-                    jpg_data = buffer[start:end+2]
-                    buffer = buffer[end+2:]
-                    
-                    # Decode the frame
-                    frame = cv2.imdecode(np.frombuffer(jpg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    
-                    if frame is not None:
-                        # Process with object detection
-                        processed_frame, _, _, _ = object_detector.detect_objects(frame)
-                        
-                        # Encode back to JPEG
-                        _, jpeg = cv2.imencode('.jpg', processed_frame)
-                        
-                        # Construct MJPEG packet
-                        mjpeg_packet = (
-                            boundary + b'\r\n' +
-                            b'Content-Type: image/jpeg\r\n' +
-                            b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n'
-                        )
-                        mjpeg_packet += jpeg.tobytes() + b'\r\n'
-                        
-                        yield (mjpeg_packet)
-        except Exception as e:
-            print(f"Stream error: {e}")
-            yield b'Error in camera stream'
+    # Each camera gets a detector context of its own, so its motion and tracking state only sees its frames
+    object_detector = get_stream_detector(f"esp32:{state['esp32_camera_url']}")
+    if object_detector is None:
+        return detector_unavailable()
     
-    # Return streaming response
-    return Response(generate_frames(),
+    # All of this helmet's viewers share one upstream connection and one detection pass per frame
+    reader = get_upstream_reader(state['esp32_camera_url'], object_detector, owner=g.helmet_id)
+    subscriber = reader.subscribe(max_fps=request.args.get('fps', type=float))
+    
+    return Response(reader.broadcaster.stream(subscriber),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@helmet_route('/api/ingest', methods=['POST'])
+def ingest_frames():
+    """
+    Run detection on raw encoded frames uploaded by a helmet or phone relay.
+    Accepts one JPEG as the request body (image/jpeg or application/octet-stream)
+    or a batch as multipart/form-data, processed in upload order.
+    ?response=detections (default) returns JSON; ?response=jpeg returns the
+    annotated JPEG, or a multipart/mixed body of JPEGs for a batch.
+    """
+    if request.files:
+        frames = [f.read() for key in request.files for f in request.files.getlist(key)]
+    else:
+        frames = [request.get_data()]
+    frames = [frame for frame in frames if frame]
+    if not frames:
+        return jsonify({'success': False, 'error': 'No frame data'}), 400
+
+    return_image = request.args.get('response', 'detections') == 'jpeg'
+    quality = request.args.get('quality', default=85, type=int)
+
+    # Uploaded frames are a stream of their own, apart from the helmet's cameras
+    object_detector = get_stream_detector('ingest')
+    if object_detector is None:
+        return detector_unavailable()
+
+    # Uploads share the ingest context, so a batch goes through in order without
+    # another upload's frames in between
+    with current_session().ingest_lock:
+        results = [object_detector.process_encoded_frame(frame, return_image, quality) for frame in frames]
+
+    if not return_image:
+        return jsonify({'success': True, 'results': results})
+
+    failed = [result for result in results if 'error' in result]
+    if failed:
+        return jsonify({'success': False, 'error': failed[0]['error']}), 400
+
+    if len(results) == 1:
+        result = results[0]
+        return Response(result['jpeg'], mimetype='image/jpeg', headers={
+            'X-Humans-Count': str(result['humans_count']),
+            'X-Vehicles-Count': str(result['vehicles_count']),
+            'X-Light-Level': str(result['light_level']),
+            'X-Distance': str(result['distance'])
+        })
+
+    body = b''.join(make_mjpeg_packet(result['jpeg']) for result in results) + b'--' + BOUNDARY + b'--\r\n'
+    return Response(body, mimetype='multipart/mixed; boundary=frame')
+
+def close_webcam_slot():
+    """Close the webcam's frame slot and drop it from the stream statistics (call with webcam_lock held)"""
+    global webcam_slot
+    if webcam_slot is None:
+        return
+    webcam_slot.close()
+    with stream_slots_lock:
+        if stream_slots.get('local_camera') is webcam_slot:
+            del stream_slots['local_camera']
+    webcam_slot = None
+
 # Fix iPhone camera connection error
 
 @app.route('/api/start_local_camera', methods=['POST'])
 def start_local_camera():
     """Start local webcam with object detection"""
-    global webcam, webcam_thread_active
+    global webcam, webcam_thread_active, webcam_slot
     
     try:
         # Stop any existing webcam
         if webcam is not None:
             with webcam_lock:
                 webcam_thread_active = False
+                close_webcam_slot()
             
             # Give the thread time to stop
             time.sleep(0.5)
@@ -434,11 +659,16 @@ def start_local_camera():
         webcam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         webcam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         
-        # Start webcam thread
+        # Start the capture and inference threads, connected by a latest-frame slot
         with webcam_lock:
             webcam_thread_active = True
+            webcam_slot = LatestFrameSlot('local_camera')
+        
+        with stream_slots_lock:
+            stream_slots['local_camera'] = webcam_slot
         
-        threading.Thread(target=process_webcam, daemon=True).start()
+        threading.Thread(target=capture_webcam, args=(webcam_slot,), daemon=True).start()
+        threading.Thread(target=process_webcam, args=(webcam_slot,), daemon=True).start()
         
         return jsonify({'success': True, 'message': 'Local camera started'})
     
@@ -536,9 +766,10 @@ def stop_local_camera():
     global webcam, webcam_thread_active
     
     try:
-        # Stop webcam thread
+        # Stop webcam threads
         with webcam_lock:
             webcam_thread_active = False
+            close_webcam_slot()
         
         # Release webcam if it exists
         if webcam is not None:
@@ -556,112 +787,213 @@ def stop_local_camera():
 @app.route('/local_camera_stream')
 def local_camera_stream():
     """Stream from local webcam with object detection"""
-    def generate_frames():
-        global webcam_frame
-        
-        while True:
-            # Get latest processed frame
-            with webcam_lock:
-                if webcam_frame is None:
-                    # No frame available
-                    time.sleep(0.1)
-                    continue
-                
-                frame_to_send = webcam_frame.copy()
-            
-            # Encode frame to JPEG
-            _, jpeg = cv2.imencode('.jpg', frame_to_send)
-            
-            # Yield the frame in MJPEG format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-            
-            # Control frame rate
-            time.sleep(0.033)  # ~30 FPS
+    # Optional per-viewer frame-rate limit, e.g. /local_camera_stream?fps=10
+    max_fps = request.args.get('fps', default=30, type=float)
+    subscriber = local_broadcaster.subscribe(max_fps=max_fps)
     
-    return Response(generate_frames(),
+    return Response(local_broadcaster.stream(subscriber),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-def process_webcam():
-    """Background thread to process webcam frames with object detection"""
-    global webcam, webcam_frame, webcam_thread_active
+def capture_webcam(slot):
+    """Background thread that reads webcam frames into the latest-frame slot"""
+    global webcam, webcam_thread_active
     
     while True:
         # Check if thread should continue
         with webcam_lock:
-            if not webcam_thread_active:
+            if not webcam_thread_active or slot.closed:
                 break
         
-        # Read frame from webcam
+        # Read frame from webcam; read() paces this loop at the camera frame rate
         if webcam is not None and webcam.isOpened():
             ret, frame = webcam.read()
             
             if ret:
-                # Process frame with object detection
-                processed_frame, humans, vehicles, light = object_detector.detect_objects(frame)
-                
-                # Update the frame
-                with webcam_lock:
-                    webcam_frame = processed_frame
+                slot.put(frame)
+                continue
         
-        # Sleep to control processing rate
+        # Avoid spinning while the camera is unavailable
         time.sleep(0.01)
 
+def process_webcam(slot):
+    """Background thread to process webcam frames with object detection"""
+    global webcam_frame, webcam_thread_active
+    
+    while True:
+        # Check if thread should continue
+        with webcam_lock:
+            if not webcam_thread_active or slot.closed:
+                break
+        
+        # With worker processes, wait until one is free so the newest frame goes to it
+        if detection_pool is not None and not detection_pool.wait_for_slot(timeout=0.5):
+            continue
+        
+        # Always take the newest captured frame; older ones were dropped by the slot
+        frame = slot.get(timeout=0.5)
+        if frame is None:
+            continue
+        
+        if detection_pool is not None:
+            detection_pool.submit(frame, lambda result, frame=frame: publish_worker_result(frame, result))
+            continue
+        
+        # Show the camera without detections until the detector has loaded
+        object_detector = default_session.get_stream_detector('webcam')
+        if object_detector is None:
+            with webcam_lock:
+                webcam_frame = frame
+            local_broadcaster.publish(frame)
+            continue
+        
+        # Process frame with object detection
+        processed_frame, humans, vehicles, light = object_detector.detect_objects(frame)
+        
+        # Update the frame and send it to the viewers
+        with webcam_lock:
+            previous_frame = webcam_frame
+            webcam_frame = processed_frame
+        local_broadcaster.publish(processed_frame)
+        
+        # The frame it replaced has been encoded and sent, so its buffer can be reused
+        object_detector.release_frame(previous_frame)
+
+def publish_worker_result(frame, result):
+    """Finish a frame whose detectors ran in a worker and publish it as the latest webcam frame"""
+    global webcam_frame
+    
+    # Motion, smoothing, tracking and drawing stay in this process (see detection_workers.py),
+    # in the webcam's own detector context
+    object_detector = default_session.get_stream_detector('webcam')
+    if object_detector is not None:
+        frame, _, _, _ = object_detector.apply_worker_result(frame, result)
+    
+    with webcam_lock:
+        previous_frame = webcam_frame
+        webcam_frame = frame
+    local_broadcaster.publish(frame)
+    
+    # The frame it replaced has been encoded and sent, so its buffer can be reused
+    if object_detector is not None:
+        object_detector.release_frame(previous_frame)
+
 # Initialize app startup
 @app.before_first_request
 def init_app():
     """Initialize the application"""
-    pass  # Any initialization code can go here
+    # Under a WSGI server __main__ below never runs, so start loading at the latest now
+    component_loader.start()
+    threading.Thread(target=state_clock_loop, daemon=True, name='state-clock').start()
+
+@app.route('/api/ready')
+def get_readiness():
+    """Per-component load status and times; 200 once every required component is ready, 503 before"""
+    stats = component_loader.get_stats()
+    return jsonify(stats), 200 if stats['ready'] else 503
 
-@app.route('/api/detection_stats')
+@helmet_route('/api/detection_stats')
 def get_detection_stats():
     """Return current detection statistics for the JavaScript frontend"""
-    # Return the counts from the object detector
+    if get_object_detector(create=False) is None:
+        return detector_unavailable()
+    
+    # Return the counts of the stream that processed the latest frame
+    object_detector = current_session().get_active_detector()
     return jsonify({
         'success': True,
+        'stream': object_detector.stream,
         'humans_count': object_detector.humans_count,
         'vehicles_count': object_detector.vehicles_count,
         'faces_count': object_detector.faces_count,
         'motion_detected': object_detector.motion_detected,
         'light_level': object_detector.light_level,
-        'distance': object_detector.closest_distance
+        'distance': object_detector.closest_distance,
+        'motion_gate': object_detector.gate_stats,
+        'motion_regions': object_detector.motion_regions,
+        'motion_engine': object_detector.motion_engine.get_stats(),
+        'stages': object_detector.stage_executor.get_stats(),
+        'pipeline': dict(object_detector.pipeline.get_stats(),
+                         preset=object_detector.pipeline_config['name'],
+                         detectors=object_detector.pipeline_config['detectors']),
+        'preprocessing': object_detector.last_preprocessing,
+        'frame_cache': object_detector.frame_cache.get_stats(),
+        'frame_pool': object_detector.frame_pool.get_stats()
     })
 
-@app.route('/api/camera_status')
+@helmet_route('/api/detections')
+def get_detections():
+    """Return the latest frame's boxes, classes, confidences and distance for client-side overlays"""
+    object_detector = get_object_detector(create=False)
+    snapshot = object_detector.detection_feed.get() if object_detector is not None else None
+    return jsonify({'success': snapshot is not None, 'detections': snapshot})
+
+@helmet_route('/api/detections/stream')
+def detections_stream():
+    """Push every new detection snapshot to the browser as Server-Sent Events"""
+    object_detector = get_object_detector(create=False)
+    if object_detector is None:
+        # End the stream at once; EventSource reconnects after the retry delay
+        return Response('retry: 2000\n\n', mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    return Response(object_detector.detection_feed.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@helmet_route('/api/stream_stats')
+def get_stream_stats():
+    """Return captured/processed/dropped frame counters for each of this helmet's active streams"""
+    # The local webcam and the detection worker pool belong to the default helmet
+    local = g.helmet_id == DEFAULT_HELMET
+    streams = []
+    if local:
+        with stream_slots_lock:
+            streams = [slot.get_stats() for slot in stream_slots.values()]
+    object_detector = get_object_detector(create=False)
+    return jsonify({
+        'success': True,
+        'helmet_id': g.helmet_id,
+        'streams': streams,
+        'broadcasts': [local_broadcaster.get_stats()] if local else [],
+        'upstream': get_upstream_stats(owner=g.helmet_id),
+        'detection_pool': detection_pool.get_stats() if local and detection_pool is not None else None,
+        'detection_feed': object_detector.detection_feed.get_stats() if object_detector is not None else None,
+        'state_feed': current_session().state_feed.get_stats(),
+        'state_store': current_session().state_store.get_stats(),
+        'sensor_store': current_session().sensor_store.get_stats()
+    })
+
+@app.route('/api/sessions')
+def get_sessions():
+    """Return the active helmet sessions and the session manager's counters"""
+    return jsonify(sessions.get_stats())
+
+@app.route('/api/model_stats')
+def get_model_stats():
+    """Return load time and resident size of each shared detection model"""
+    return jsonify(model_registry.get_stats())
+
+@helmet_route('/api/camera_status')
 def get_camera_status():
     """Return current camera connection status"""
+    state = current_session().state_store.get()
     return jsonify({
-        'connected': simulation_state['camera_connected'],
-        'url': simulation_state['esp32_camera_url'],
-        'sensor_data': object_detector.get_sensor_data()  # Include sensor data with status
+        'connected': state['camera_connected'],
+        'url': state['esp32_camera_url'],
+        'detector_ready': get_object_detector(create=False) is not None,
+        # Include sensor data with status (kept current by the detector after every frame)
+        'sensor_data': current_session().sensor_store.get().to_dict()
     })
 
-@app.route('/api/camera_sensors')
+@helmet_route('/api/camera_sensors')
 def get_camera_sensors():
     """Return camera sensor data including detection results"""
-    # Get latest data directly from object detector
-    sensor_data = object_detector.get_sensor_data()
-    
-    # Force update human and vehicle counts to latest values
-    sensor_data['humans_count'] = object_detector.humans_count
-    sensor_data['vehicles_count'] = object_detector.vehicles_count
-    
-    # Update distance with closest detected object
-    sensor_data['distance'] = object_detector.closest_distance
-    
-    # Update motion flag
-    sensor_data['motion_detected'] = object_detector.motion_detected
-    
-    # Store the values in simulation state for future use
-    simulation_state['camera_sensor_data'] = sensor_data
-    
-    # Debugging: Print the data to make sure it's working
-    print(f"Sending sensor data: {sensor_data}")
-    
-    return jsonify({
+    # The detector stores its readings after every frame, so this is only a read
+    response = {
         'success': True,
-        'sensors': sensor_data
-    })
+        'sensors': current_session().sensor_store.get().to_dict()
+    }
+    if get_object_detector(create=False) is None:
+        # Degraded: the last known values until the detector has loaded
+        response['detector_ready'] = False
+    return jsonify(response)
 
 @app.route('/api/voice_assistant/start', methods=['POST'])
 def start_voice_assistant():
@@ -800,5 +1132,10 @@ if __name__ == '__main__':
         print(f"Using alternative port {port} instead.")
         print(f"Access the application at: http://localhost:{port}")
     
+    # Load the heavy components in the background so the server starts listening at once.
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN set) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        component_loader.start()
+    
     # Run the app with the selected port
     app.run(debug=True, host='0.0.0.0', threaded=True, port=port)
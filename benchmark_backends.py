@@ -0,0 +1,142 @@
+"""
+Side-by-side benchmark of the inference backends on the same frames.
+Runs the Darknet YOLO model on OpenCV DNN and its ONNX export on ONNX Runtime
+(FP32, and INT8 if requested), timing each forward pass and comparing the
+decoded person/vehicle boxes against the OpenCV results: a box counts as
+matched if the other backend has a box of the same category with IoU >= 0.5.
+
+Frames come from a directory of images (e.g. saved ESP32 snapshots); without
+one, a few synthetic frames are used, which is only good for timing.
+
+Usage: python benchmark_backends.py [frames_dir] [runs] [--int8] [--threads N]
+Expects models/yolov4-tiny.cfg and models/yolov4-tiny.weights, and uses
+models/yolov4-tiny.onnx or else the cached export of the Darknet files
+(override the base name with HELMET_BENCHMARK_MODEL=models/yolov4).
+"""
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+from inference_backends import OpenCVBackend, load_onnxruntime_backend, make_inference_config, onnxruntime_available
+from model_registry import get_output_layer_names
+from yolo_decoder import YoloDecoder
+
+CONF_THRESHOLD = 0.55
+NMS_THRESHOLD = 0.35
+INPUT_SIZE = (416, 416)
+MATCH_IOU = 0.5
+VEHICLE_CLASS_IDS = [1, 2, 3, 5, 7]
+
+
+def load_frames(frames_dir):
+    """Frames from a directory of images, or synthetic ones"""
+    if frames_dir:
+        names = sorted(n for n in os.listdir(frames_dir) if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+        frames = [cv2.imread(os.path.join(frames_dir, n)) for n in names]
+        return [f for f in frames if f is not None]
+    rng = np.random.default_rng(0)
+    return [cv2.GaussianBlur(rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8), (9, 9), 0)
+            for _ in range(10)]
+
+
+def detect(backend, decoder, frame):
+    """Forward pass and decoding; returns the forward time and (category, box) pairs after NMS"""
+    height, width = frame.shape[:2]
+    blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, INPUT_SIZE, swapRB=True, crop=False)
+    start = time.perf_counter()
+    outputs = backend.forward(blob)
+    forward_ms = (time.perf_counter() - start) * 1000
+
+    _, confidences, boxes, categories = decoder.decode(outputs, width, height, CONF_THRESHOLD)
+    boxes = boxes.tolist()
+    detections = []
+    if boxes:
+        for i in np.array(cv2.dnn.NMSBoxes(boxes, confidences.tolist(), CONF_THRESHOLD, NMS_THRESHOLD)).flatten():
+            detections.append((int(categories[i]), boxes[i]))
+    return forward_ms, detections
+
+
+def iou(box1, box2):
+    x1, y1 = max(box1[0], box2[0]), max(box1[1], box2[1])
+    x2 = min(box1[0] + box1[2], box2[0] + box2[2])
+    y2 = min(box1[1] + box1[3], box2[1] + box2[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = box1[2] * box1[3] + box2[2] * box2[3] - intersection
+    return intersection / union if union else 0.0
+
+
+def count_matches(detections, reference):
+    """How many detections have a same-category reference box with IoU >= MATCH_IOU"""
+    unused = list(reference)
+    matched = 0
+    for category, box in detections:
+        for candidate in unused:
+            if candidate[0] == category and iou(box, candidate[1]) >= MATCH_IOU:
+                unused.remove(candidate)
+                matched += 1
+                break
+    return matched
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    int8 = '--int8' in sys.argv
+    threads = int(sys.argv[sys.argv.index('--threads') + 1]) if '--threads' in sys.argv else 0
+    if threads:
+        args.remove(str(threads))
+    frames_dir = args[0] if args else None
+    runs = int(args[1]) if len(args) > 1 else 3
+
+    base = os.environ.get('HELMET_BENCHMARK_MODEL', 'models/yolov4-tiny')
+    config_path, weights_path = base + '.cfg', base + '.weights'
+    frames = load_frames(frames_dir)
+    decoder = YoloDecoder(lambda c: c == 0, lambda c: c in VEHICLE_CLASS_IDS)
+
+    net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    backends = [('opencv', OpenCVBackend(net, get_output_layer_names(net)))]
+    if onnxruntime_available:
+        settings = {'backend': 'onnxruntime', 'intra_op_threads': threads}
+        fp32 = load_onnxruntime_backend(weights_path, make_inference_config(settings), config_path=config_path)
+        backends.append(('onnxruntime fp32', fp32))
+        if int8:
+            settings['int8'] = True
+            int8_backend = load_onnxruntime_backend(weights_path, make_inference_config(settings), config_path=config_path)
+            backends.append(('onnxruntime int8', int8_backend))
+    else:
+        print("onnxruntime is not installed; timing OpenCV only")
+
+    print(f"{len(frames)} frames, {runs} runs each, model {base}")
+    reference = None
+    for name, backend in backends:
+        # One untimed pass so lazy initialization isn't counted
+        detect(backend, decoder, frames[0])
+        times = []
+        results = []
+        for run in range(runs):
+            for frame in frames:
+                forward_ms, detections = detect(backend, decoder, frame)
+                times.append(forward_ms)
+                if run == 0:
+                    results.append(detections)
+
+        line = f"{name:18s} median {np.median(times):7.2f} ms  p95 {np.percentile(times, 95):7.2f} ms"
+        if reference is None:
+            reference = results
+            total = sum(len(r) for r in results)
+            line += f"  {total} boxes (reference)"
+        else:
+            found = sum(len(r) for r in results)
+            expected = sum(len(r) for r in reference)
+            matched = sum(count_matches(r, ref) for r, ref in zip(results, reference))
+            recall = matched / expected if expected else 1.0
+            precision = matched / found if found else 1.0
+            line += f"  {found} boxes, recall {recall:.3f} precision {precision:.3f} vs opencv"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of the streaming MJPEG parser against the buffer-concatenating loop
+the ESP32 proxy used before. Runs on a recorded capture of a camera stream
+(the raw HTTP body of /stream) or, without one, on a synthetic stream of
+ESP32-sized frames. The capture is replayed in the same chunk sizes the
+proxy reads from the network.
+
+Usage:
+    python benchmark_mjpeg_parser.py [capture.mjpeg] [chunk_size]
+    python benchmark_mjpeg_parser.py --record http://<esp32-ip>/stream capture.mjpeg [seconds]
+"""
+import sys
+import time
+import numpy as np
+
+from mjpeg_parser import MJPEGParser
+from stream_broadcast import make_mjpeg_packet
+
+SYNTHETIC_FRAMES = 200
+SYNTHETIC_FRAME_BYTES = 60 * 1024  # Typical ESP32-CAM VGA JPEG
+
+
+def make_capture(rng, with_length=True):
+    """Build a multipart stream of fake JPEGs with no markers inside the body"""
+    parts = []
+    for _ in range(SYNTHETIC_FRAMES):
+        body = rng.integers(0, 0xff, size=SYNTHETIC_FRAME_BYTES, dtype=np.uint8).tobytes()
+        jpeg = b'\xff\xd8' + body + b'\xff\xd9'
+        if with_length:
+            parts.append(make_mjpeg_packet(jpeg))
+        else:
+            parts.append(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+    return b''.join(parts)
+
+
+def record_capture(url, path, seconds):
+    """Save the raw body of a live MJPEG stream for later benchmarking"""
+    import requests
+    end_time = time.time() + seconds
+    with requests.get(url, stream=True, timeout=(3, 10)) as response, open(path, 'wb') as f:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=16384):
+            f.write(chunk)
+            if time.time() > end_time:
+                break
+    print(f"Recorded {seconds}s of {url} to {path}")
+
+
+def split_chunks(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def legacy_parse(chunks):
+    """The original loop from the camera_stream proxy"""
+    frames = []
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        start = buffer.find(b'\xff\xd8')
+        end = buffer.find(b'\xff\xd9')
+        if start != -1 and end != -1:
+            frames.append(buffer[start:end + 2])
+            buffer = buffer[end + 2:]
+    return frames
+
+
+def streaming_parse(chunks):
+    parser = MJPEGParser()
+    frames = []
+    for chunk in chunks:
+        frames.extend(parser.feed(chunk))
+    return frames
+
+
+def time_call(func):
+    """Return the result of func() and its run time in milliseconds"""
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(name, data, chunk_size):
+    chunks = split_chunks(data, chunk_size)
+    legacy_frames, legacy_ms = time_call(lambda: legacy_parse(chunks))
+    frames, streaming_ms = time_call(lambda: streaming_parse(chunks))
+
+    # The legacy loop can only emit one frame per chunk, so compare what it found
+    if [bytes(f) for f in frames[:len(legacy_frames)]] != legacy_frames:
+        print("WARNING: streaming parser output differs from the legacy loop")
+
+    megabytes = len(data) / (1024 * 1024)
+    print(f"{name}: {megabytes:.1f} MB in {len(chunks)} chunks of {chunk_size} bytes")
+    print(f"  Legacy loop:  {legacy_ms:9.1f} ms  {len(legacy_frames):5d} frames  {megabytes / (legacy_ms / 1000):8.1f} MB/s")
+    print(f"  Streaming:    {streaming_ms:9.1f} ms  {len(frames):5d} frames  {megabytes / (streaming_ms / 1000):8.1f} MB/s")
+    print(f"  Speedup:      {legacy_ms / streaming_ms:9.1f}x")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--record':
+        record_capture(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else 10.0)
+        return
+
+    if len(sys.argv) > 1:
+        chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+        with open(sys.argv[1], 'rb') as f:
+            run(sys.argv[1], f.read(), chunk_size)
+        return
+
+    rng = np.random.default_rng(0)
+    for chunk_size in (1024, 16384):
+        run('Synthetic, Content-Length headers', make_capture(rng), chunk_size)
+        run('Synthetic, marker search only', make_capture(rng, with_length=False), chunk_size)
+
+
+if __name__ == "__main__":
+    main()
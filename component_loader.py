@@ -0,0 +1,133 @@
+"""
+Background loading of the app's heavy components.
+Building the object detector (MediaPipe, the YOLO networks, the HOG SVM, the
+Haar cascades) and the text-to-speech engine takes seconds. Doing that at
+import time keeps Flask from accepting connections until everything is ready,
+and orchestrators kill instances that take too long to start listening.
+
+Components are registered with a factory and an optional warm-up function and
+loaded one after another on a background thread once the server is up. The
+warm-up runs one inference on a dummy input so the first real frame doesn't
+pay for lazy allocations. Until a component is ready, get() returns None and
+callers answer in a degraded mode; get_stats() backs the /api/ready endpoint.
+"""
+import collections
+import threading
+import time
+
+# Component states, in the order a component goes through them
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ComponentLoader:
+    def __init__(self):
+        self.components = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # Notified whenever a component finishes loading
+        self.thread = None
+        self.start_time = None
+
+    def register(self, name, factory, warm_up=None, required=True):
+        """
+        Add a component. factory() builds it and warm_up(component), if given, runs
+        it once; a component that isn't required doesn't hold back readiness
+        """
+        with self.lock:
+            self.components[name] = {
+                'factory': factory,
+                'warm_up': warm_up,
+                'required': required,
+                'status': PENDING,
+                'instance': None,
+                'error': None,
+                'load_time': None,
+                'warm_up_time': None
+            }
+
+    def start(self):
+        """Start loading on a background thread; later calls do nothing"""
+        with self.lock:
+            if self.thread is not None:
+                return False
+            self.start_time = time.time()
+            self.thread = threading.Thread(target=self.load_all, daemon=True, name='component-loader')
+        self.thread.start()
+        return True
+
+    def load_all(self):
+        for name, component in list(self.components.items()):
+            self.load(name, component)
+        print(f"Component loading finished in {time.time() - self.start_time:.1f}s")
+
+    def load(self, name, component):
+        """Build and warm up one component, recording its status and timings"""
+        with self.lock:
+            component['status'] = LOADING
+        print(f"Loading {name}...")
+
+        try:
+            start_time = time.perf_counter()
+            instance = component['factory']()
+            load_time = time.perf_counter() - start_time
+
+            warm_up_time = None
+            if component['warm_up'] is not None:
+                start_time = time.perf_counter()
+                component['warm_up'](instance)
+                warm_up_time = time.perf_counter() - start_time
+        except Exception as e:
+            print(f"Failed to load {name}: {e}")
+            with self.lock:
+                component['status'] = FAILED
+                component['error'] = str(e)
+                self.changed.notify_all()
+            return
+
+        with self.lock:
+            component['instance'] = instance
+            component['load_time'] = load_time
+            component['warm_up_time'] = warm_up_time
+            component['status'] = READY
+            self.changed.notify_all()
+        print(f"Loaded {name} in {load_time:.2f}s"
+              + (f" (warm-up {warm_up_time * 1000:.0f} ms)" if warm_up_time is not None else ""))
+
+    def get(self, name):
+        """The component if it has finished loading, otherwise None"""
+        with self.lock:
+            component = self.components[name]
+            return component['instance'] if component['status'] == READY else None
+
+    def wait(self, name, timeout=None):
+        """Block until a component has loaded or failed; returns it, or None if it failed or timed out"""
+        with self.lock:
+            component = self.components[name]
+            self.changed.wait_for(lambda: component['status'] in (READY, FAILED), timeout)
+            return component['instance'] if component['status'] == READY else None
+
+    def is_ready(self):
+        """Whether every required component has loaded"""
+        with self.lock:
+            return all(c['status'] == READY for c in self.components.values() if c['required'])
+
+    def get_stats(self):
+        with self.lock:
+            components = {}
+            for name, component in self.components.items():
+                components[name] = {
+                    'status': component['status'],
+                    'required': component['required'],
+                    'load_time': None if component['load_time'] is None else round(component['load_time'], 3),
+                    'warm_up_ms': (None if component['warm_up_time'] is None
+                                   else round(component['warm_up_time'] * 1000, 1)),
+                    'error': component['error']
+                }
+            return {
+                'ready': all(c['status'] == READY for c in self.components.values() if c['required']),
+                'started': self.thread is not None,
+                'uptime': round(time.time() - self.start_time, 1) if self.start_time else 0.0,
+                'components': components
+            }
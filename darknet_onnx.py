@@ -0,0 +1,368 @@
+"""
+Export Darknet (YOLO) models to ONNX.
+cv2.dnn parses the Darknet .cfg and .weights files on every start; the export
+lets the registry run the model from the converted-model cache instead (see
+inference_backends.py). It covers the layers the YOLOv4 and YOLOv4-tiny
+configs use: convolutional (batch norm folded into the weights; leaky, mish
+or linear activation), route (including grouped routes), maxpool, upsample,
+shortcut and yolo.
+
+The yolo layers are decoded inside the graph, so the outputs have the same
+(rows x 85) layout as cv2.dnn's: normalized centre x, centre y, width and
+height, the objectness and the class scores multiplied by the objectness
+(zeroed up to 0.2, as cv2.dnn does).
+
+Every export is checked before it is used: a test input goes through both
+the export (on ONNX Runtime) and cv2.dnn's own Darknet parser, and an export
+whose outputs differ by more than VERIFY_TOLERANCE is refused, so a mistake
+in the conversion can't silently change the detections.
+
+Run it while preparing a helmet image, after prefetch_models.py, to build the
+cache ahead of the first start (with HELMET_INFERENCE_BACKEND=auto or
+onnxruntime):
+
+    python darknet_onnx.py                 # every Darknet model in models/
+    python darknet_onnx.py models/yolov4-tiny.cfg models/yolov4-tiny.weights out.onnx
+"""
+import os
+import sys
+import numpy as np
+
+try:
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+    onnx_available = True
+except ImportError:
+    onnx_available = False
+
+OPSET = 13
+# The IR version that goes with opset 13; newer onnx packages default to versions
+# older ONNX Runtime releases refuse to load
+IR_VERSION = 7
+INPUT_NAME = 'input'
+
+# Darknet adds this to the variance before normalizing
+BATCH_NORM_EPSILON = 1e-6
+
+# cv2.dnn zeroes class scores up to this value
+SCORE_THRESHOLD = 0.2
+
+# Largest difference from cv2.dnn's outputs an export may have on the test input
+VERIFY_TOLERANCE = 1e-3
+
+
+def parse_cfg(cfg_path):
+    """Read a Darknet .cfg file into a list of (section, options) tuples"""
+    sections = []
+    with open(cfg_path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('['):
+                sections.append((line.strip('[]').strip(), {}))
+            elif '=' in line and sections:
+                key, value = line.split('=', 1)
+                sections[-1][1][key.strip()] = value.strip()
+    return sections
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+class WeightsReader:
+    """Reads the float32 arrays of a Darknet .weights file in layer order"""
+    def __init__(self, weights_path):
+        with open(weights_path, 'rb') as f:
+            major, minor, _ = np.frombuffer(f.read(12), dtype=np.int32)
+            # Newer files store the number of images seen as 64 bits
+            f.read(8 if major * 10 + minor >= 2 else 4)
+            self.data = np.frombuffer(f.read(), dtype=np.float32)
+        self.offset = 0
+
+    def read(self, count):
+        if self.offset + count > len(self.data):
+            raise ValueError("Weights file is shorter than the config expects")
+        values = self.data[self.offset:self.offset + count]
+        self.offset += count
+        return values
+
+
+class GraphBuilder:
+    """Collects ONNX nodes and initializers with unique names"""
+    def __init__(self):
+        self.nodes = []
+        self.initializers = []
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return f"{prefix}_{self.count}"
+
+    def constant(self, array, prefix='const'):
+        name = self.name(prefix)
+        self.initializers.append(numpy_helper.from_array(np.asarray(array), name))
+        return name
+
+    def node(self, op, inputs, prefix=None, **attributes):
+        output = self.name(prefix or op.lower())
+        self.nodes.append(helper.make_node(op, inputs, [output], **attributes))
+        return output
+
+
+def add_convolutional(graph, options, x, channels, weights):
+    filters = int(options['filters'])
+    size = int(options.get('size', 1))
+    stride = int(options.get('stride', 1))
+    groups = int(options.get('groups', 1))
+    pad = size // 2 if int(options.get('pad', 0)) else int(options.get('padding', 0))
+
+    # Same order as Darknet's load_convolutional_weights
+    biases = weights.read(filters)
+    if int(options.get('batch_normalize', 0)):
+        scales = weights.read(filters)
+        mean = weights.read(filters)
+        variance = weights.read(filters)
+    kernel = weights.read(filters * (channels // groups) * size * size).reshape(filters, channels // groups, size, size)
+
+    if int(options.get('batch_normalize', 0)):
+        # Fold the batch norm into the convolution
+        factor = scales / np.sqrt(variance + BATCH_NORM_EPSILON)
+        kernel = kernel * factor[:, None, None, None]
+        biases = biases - mean * factor
+
+    y = graph.node('Conv', [x, graph.constant(kernel.astype(np.float32), 'weight'),
+                            graph.constant(biases.astype(np.float32), 'bias')],
+                   kernel_shape=[size, size], strides=[stride, stride], pads=[pad] * 4, group=groups)
+
+    activation = options.get('activation', 'logistic')
+    if activation == 'leaky':
+        y = graph.node('LeakyRelu', [y], alpha=0.1)
+    elif activation == 'mish':
+        # x * tanh(softplus(x)); composed so older ONNX Runtime versions can run it
+        y = graph.node('Mul', [y, graph.node('Tanh', [graph.node('Softplus', [y])])])
+    elif activation == 'logistic':
+        y = graph.node('Sigmoid', [y])
+    elif activation == 'relu':
+        y = graph.node('Relu', [y])
+    elif activation != 'linear':
+        raise ValueError(f"Unsupported Darknet activation '{activation}'")
+    return y, filters
+
+
+def add_maxpool(graph, options, x):
+    size = int(options.get('size', 2))
+    stride = int(options.get('stride', size))
+    # Darknet pads size - 1 pixels in total, half (rounded down) before the input
+    padding = int(options.get('padding', size - 1))
+    before = padding // 2
+    after = padding - before
+    return graph.node('MaxPool', [x], kernel_shape=[size, size], strides=[stride, stride],
+                      pads=[before, before, after, after])
+
+
+def add_yolo(graph, options, x, height, width, input_height, input_width):
+    """Decode a yolo layer into [1, height * width * anchors, 5 + classes] rows"""
+    classes = int(options['classes'])
+    mask = int_list(options['mask'])
+    anchors = np.array(int_list(options['anchors']), dtype=np.float32).reshape(-1, 2)[mask]
+    scale = float(options.get('scale_x_y', 1.0))
+    fields = 5 + classes
+    count = len(mask)
+
+    # [1, anchors * fields, H, W] -> [1, H, W, anchors, fields], the row order cv2.dnn uses
+    y = graph.node('Reshape', [x, graph.constant(np.array([1, count, fields, height, width], dtype=np.int64))])
+    y = graph.node('Transpose', [y], perm=[0, 3, 4, 1, 2])
+    y = graph.node('Reshape', [y, graph.constant(np.array([1, height * width * count, fields], dtype=np.int64))])
+
+    def columns(start, end):
+        return graph.node('Slice', [y, graph.constant(np.array([start], dtype=np.int64)),
+                                    graph.constant(np.array([end], dtype=np.int64)),
+                                    graph.constant(np.array([2], dtype=np.int64))])
+
+    # Grid cell and anchor of every row
+    grid_y, grid_x = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+    grid = np.stack([grid_x, grid_y], axis=-1)[:, :, None, :].repeat(count, axis=2).reshape(1, -1, 2)
+    anchor_sizes = np.tile(anchors, (height * width, 1)).reshape(1, -1, 2)
+
+    xy = graph.node('Sigmoid', [columns(0, 2)])
+    xy = graph.node('Mul', [xy, graph.constant(np.float32(scale))])
+    xy = graph.node('Add', [xy, graph.constant((grid - (scale - 1) / 2).astype(np.float32))])
+    xy = graph.node('Div', [xy, graph.constant(np.array([width, height], dtype=np.float32))])
+
+    wh = graph.node('Exp', [columns(2, 4)])
+    wh = graph.node('Mul', [wh, graph.constant((anchor_sizes / [input_width, input_height]).astype(np.float32))])
+
+    objectness = graph.node('Sigmoid', [columns(4, 5)])
+    scores = graph.node('Mul', [graph.node('Sigmoid', [columns(5, fields)]), objectness])
+    scores = graph.node('Where', [graph.node('Greater', [scores, graph.constant(np.float32(SCORE_THRESHOLD))]),
+                                  scores, graph.constant(np.float32(0))])
+    return graph.node('Concat', [xy, wh, objectness, scores], 'output', axis=2)
+
+
+def build_onnx_model(cfg_path, weights_path):
+    """Build an ONNX model equivalent to a Darknet .cfg/.weights pair"""
+    if not onnx_available:
+        raise RuntimeError("onnx is not installed")
+
+    sections = parse_cfg(cfg_path)
+    if not sections or sections[0][0] not in ('net', 'network'):
+        raise ValueError(f"{cfg_path} doesn't start with a [net] section")
+    net = sections[0][1]
+    input_height, input_width = int(net.get('height', 416)), int(net.get('width', 416))
+    channels = int(net.get('channels', 3))
+
+    graph = GraphBuilder()
+    weights = WeightsReader(weights_path)
+
+    # (tensor name, channels, height, width) of every layer's output
+    layers = []
+    outputs = []
+    x, height, width = INPUT_NAME, input_height, input_width
+    for index, (kind, options) in enumerate(sections[1:]):
+        if kind == 'convolutional':
+            x, channels = add_convolutional(graph, options, x, channels, weights)
+            stride = int(options.get('stride', 1))
+            height, width = (height + stride - 1) // stride, (width + stride - 1) // stride
+        elif kind == 'maxpool':
+            x = add_maxpool(graph, options, x)
+            stride = int(options.get('stride', int(options.get('size', 2))))
+            height, width = (height - 1) // stride + 1, (width - 1) // stride + 1
+        elif kind == 'route':
+            sources = [layers[i if i >= 0 else index + i] for i in int_list(options['layers'])]
+            groups = int(options.get('groups', 1))
+            if len(sources) == 1:
+                x, channels, height, width = sources[0]
+            else:
+                x = graph.node('Concat', [source[0] for source in sources], axis=1)
+                channels = sum(source[1] for source in sources)
+                height, width = sources[0][2], sources[0][3]
+            if groups > 1:
+                # Keep only one group of channels
+                channels //= groups
+                start = int(options.get('group_id', 0)) * channels
+                x = graph.node('Slice', [x, graph.constant(np.array([start], dtype=np.int64)),
+                                         graph.constant(np.array([start + channels], dtype=np.int64)),
+                                         graph.constant(np.array([1], dtype=np.int64))])
+        elif kind == 'upsample':
+            stride = int(options.get('stride', 2))
+            x = graph.node('Resize', [x, '', graph.constant(np.array([1, 1, stride, stride], dtype=np.float32))],
+                           mode='nearest', coordinate_transformation_mode='asymmetric', nearest_mode='floor')
+            height, width = height * stride, width * stride
+        elif kind == 'shortcut':
+            source = layers[int(options['from']) + index if int(options['from']) < 0 else int(options['from'])]
+            x = graph.node('Add', [x, source[0]])
+            if options.get('activation', 'linear') != 'linear':
+                raise ValueError("Only linear shortcut activations are supported")
+        elif kind == 'yolo':
+            rows = height * width * len(int_list(options['mask']))
+            outputs.append((add_yolo(graph, options, x, height, width, input_height, input_width),
+                            [1, rows, 5 + int(options['classes'])]))
+        else:
+            raise ValueError(f"Unsupported Darknet layer [{kind}]")
+        layers.append((x, channels, height, width))
+
+    if weights.offset != len(weights.data):
+        print(f"Warning: {len(weights.data) - weights.offset} values of {weights_path} were not used")
+
+    graph_proto = helper.make_graph(
+        graph.nodes, os.path.splitext(os.path.basename(cfg_path))[0],
+        [helper.make_tensor_value_info(INPUT_NAME, TensorProto.FLOAT, [1, 3, input_height, input_width])],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, shape) for name, shape in outputs],
+        graph.initializers)
+    model = helper.make_model(graph_proto, opset_imports=[helper.make_opsetid('', OPSET)],
+                              ir_version=IR_VERSION, producer_name='darknet_onnx')
+    onnx.checker.check_model(model)
+    return model
+
+
+def verify_export(cfg_path, weights_path, onnx_path, tolerance=VERIFY_TOLERANCE):
+    """
+    Run the same test input through an export on ONNX Runtime and through cv2.dnn's
+    Darknet parser; raises ValueError if their outputs differ by more than tolerance.
+    Returns the largest difference
+    """
+    import cv2
+    import onnxruntime as ort
+
+    if not hasattr(cv2.dnn, 'readNetFromDarknet'):
+        raise ValueError("This OpenCV can't read Darknet models, so the export can't be checked")
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    _, channels, height, width = session.get_inputs()[0].shape
+
+    # A smooth random image, so the activations are spread like on a real frame
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 255, size=(height, width, channels), dtype=np.uint8), (9, 9), 0)
+    blob = cv2.dnn.blobFromImage(image, 1 / 255.0, (width, height), swapRB=True, crop=False)
+
+    net = cv2.dnn.readNetFromDarknet(cfg_path, weights_path)
+    layer_names = net.getLayerNames()
+    net.setInput(blob)
+    expected = net.forward([layer_names[int(i) - 1] for i in np.array(net.getUnconnectedOutLayers()).reshape(-1)])
+    actual = session.run(None, {session.get_inputs()[0].name: blob})
+
+    # Both list the yolo layers in the order of the config
+    if len(expected) != len(actual):
+        raise ValueError(f"Export has {len(actual)} outputs, cv2.dnn has {len(expected)}")
+    largest = 0.0
+    for reference, output in zip(expected, actual):
+        output = output.reshape(-1, output.shape[-1])
+        if reference.shape != output.shape:
+            raise ValueError(f"Export output has shape {output.shape}, cv2.dnn's has {reference.shape}")
+        difference = np.abs(reference - output)
+        # Scores right at the cut-off may be zeroed by one side only
+        difference[:, 5:][np.abs(output[:, 5:] - SCORE_THRESHOLD) < tolerance] = 0
+        largest = max(largest, float(difference.max()))
+    if largest > tolerance:
+        raise ValueError(f"Export differs from cv2.dnn by up to {largest:.6f} (tolerance {tolerance})")
+    return largest
+
+
+def export_darknet_to_onnx(cfg_path, weights_path, onnx_path):
+    """Write the ONNX export of a Darknet model to onnx_path once it matches cv2.dnn"""
+    model = build_onnx_model(cfg_path, weights_path)
+    # Write to a temporary file first so a crash or a failed check never leaves a bad model
+    onnx.save(model, onnx_path + '.tmp')
+    try:
+        difference = verify_export(cfg_path, weights_path, onnx_path + '.tmp')
+    except Exception:
+        os.remove(onnx_path + '.tmp')
+        raise
+    os.replace(onnx_path + '.tmp', onnx_path)
+    print(f"Exported {weights_path} to {onnx_path} (matches cv2.dnn within {difference:.2g})")
+    return onnx_path
+
+
+def main(args):
+    if len(args) == 3:
+        export_darknet_to_onnx(*args)
+        return 0
+    if args:
+        print(__doc__)
+        return 2
+
+    # Warm the converted-model cache for every Darknet model that is present
+    from inference_backends import load_onnxruntime_backend, make_inference_config
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+    inference = make_inference_config({
+        'backend': 'onnxruntime',
+        'int8': os.environ.get('HELMET_ORT_INT8', '0') == '1',
+        'graph_optimization': os.environ.get('HELMET_ORT_OPTIMIZATION', 'all')
+    })
+    status = 0
+    for name in sorted(os.listdir(models_dir)):
+        weights_path = os.path.join(models_dir, name)
+        cfg_path = os.path.splitext(weights_path)[0] + '.cfg'
+        if not name.endswith('.weights') or not os.path.exists(cfg_path):
+            continue
+        try:
+            load_onnxruntime_backend(weights_path, inference, config_path=cfg_path)
+        except Exception as e:
+            print(f"Can't prepare {name}: {e}")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Latest-detections feed for client-side overlay rendering.
+Each processed frame publishes a small snapshot (boxes, classes, confidences,
+counts and distance). Browsers read it as JSON or follow it over a
+Server-Sent Events channel and draw the boxes on their own canvas, so the
+server can stream the camera frames untouched.
+"""
+import json
+import threading
+
+
+class DetectionFeed:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.snapshot = None
+        self.version = 0
+        self.clients = 0
+        self.listeners = []  # Called with each new snapshot on the publishing thread
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) for every published snapshot; it must be quick"""
+        self.listeners.append(listener)
+
+    def publish(self, snapshot):
+        """Replace the latest snapshot and wake every waiting client"""
+        with self.condition:
+            self.version += 1
+            snapshot['version'] = self.version
+            self.snapshot = snapshot
+            self.condition.notify_all()
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in detection feed listener: {e}")
+
+    def get(self):
+        """Return the latest snapshot, or None before the first frame"""
+        with self.condition:
+            return self.snapshot
+
+    def wait(self, version, timeout=None):
+        """
+        Wait for a snapshot newer than version.
+        Returns the newest snapshot, or None on timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.version > version, timeout):
+                return None
+            return self.snapshot
+
+    def stream(self, keepalive=15.0):
+        """
+        Generator of Server-Sent Events for a Flask streaming response.
+        A client that falls behind skips straight to the newest snapshot.
+        """
+        with self.condition:
+            self.clients += 1
+        try:
+            version = 0
+            while True:
+                snapshot = self.wait(version, timeout=keepalive)
+                if snapshot is None:
+                    # Comment line so proxies don't close an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                version = snapshot['version']
+                yield f"data: {json.dumps(snapshot)}\n\n"
+        finally:
+            with self.condition:
+                self.clients -= 1
+
+    def get_stats(self):
+        with self.condition:
+            return {'version': self.version, 'clients': self.clients}
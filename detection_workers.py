@@ -0,0 +1,283 @@
+"""
+Multi-process detection workers.
+Each worker process holds its own ObjectDetector and runs the detector cascade
+(network forward passes, decoding, NMS) outside the Flask process, so it scales
+with CPU cores. Frames are passed through a shared-memory ring buffer instead
+of being pickled, and results come back as compact box arrays.
+
+Consecutive frames of a stream go to different workers, so the workers keep no
+state between frames: everything that compares a frame with the previous one
+(motion, box smoothing, tracking) stays in the parent's detector, which
+finishes each frame with ObjectDetector.apply_worker_result.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Compact result encoding: one row per detection (x, y, w, h, category, confidence),
+# plus the list of class labels ('car', 'bus', ...) in the same order
+CATEGORY_CODES = {'person': 0, 'vehicle': 1, 'face': 2, 'other': 3}
+CATEGORY_NAMES = {code: name for name, code in CATEGORY_CODES.items()}
+NO_CONFIDENCE = -1.0
+
+
+def detections_to_array(detections):
+    """Pack detection dicts into an N x 6 float32 array"""
+    array = np.empty((len(detections), 6), dtype=np.float32)
+    for i, detection in enumerate(detections):
+        array[i, :4] = detection['box']
+        array[i, 4] = CATEGORY_CODES.get(detection['category'], CATEGORY_CODES['other'])
+        confidence = detection.get('confidence')
+        array[i, 5] = NO_CONFIDENCE if confidence is None else confidence
+    return array
+
+
+def array_to_detections(array, labels=None):
+    """Unpack an N x 6 detection array and its labels back into detection dicts"""
+    detections = []
+    for i, (x, y, w, h, category, confidence) in enumerate(array.tolist()):
+        name = CATEGORY_NAMES.get(int(category), 'other')
+        detections.append({
+            'category': name,
+            'label': labels[i] if labels is not None else name,
+            'box': [int(x), int(y), int(w), int(h)],
+            'confidence': None if confidence == NO_CONFIDENCE else confidence
+        })
+    return detections
+
+
+class SharedFrameRing:
+    """A fixed number of frame-sized slots in one shared memory block"""
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+
+    def view(self, slot, shape):
+        """Return a zero-copy uint8 array over the given slot"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, frame):
+        """Copy a frame into a slot"""
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes doesn't fit a {self.slot_bytes} byte slot")
+        np.copyto(self.view(slot, frame.shape), frame)
+
+    def close(self):
+        """Detach from the shared memory, removing it if this side created it"""
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_main(ring_name, slots, slot_bytes, task_queue, result_queue, detector_kwargs):
+    """Entry point of a detection worker process"""
+    # Import here so the parent process doesn't need the detector to create the pool
+    from object_detection import ObjectDetector
+
+    from frame_context import FrameContext
+
+    ring = SharedFrameRing(slots, slot_bytes, name=ring_name)
+    detector = ObjectDetector(**detector_kwargs)
+    result_queue.put(('ready', multiprocessing.current_process().name, None))
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+
+            sequence, slot, shape = task
+            start_time = time.time()
+            try:
+                # Only the detectors run here, with no box history from whatever frame this
+                # worker saw last; nothing is drawn, so the slot can be reused once the result is sent
+                frame = ring.view(slot, shape)
+                detector.reset_detector_boxes()
+                detector.run_detectors(frame, FrameContext(frame), draw=False)
+                result = {
+                    'sequence': sequence,
+                    'detections': detections_to_array(detector.last_detections),
+                    'labels': [detection['label'] for detection in detector.last_detections],
+                    'source': detector.last_detection_source,
+                    'worker_time': time.time() - start_time
+                }
+                result_queue.put(('result', slot, result))
+            except Exception as e:
+                result_queue.put(('error', slot, {'sequence': sequence, 'error': str(e)}))
+    finally:
+        ring.close()
+
+
+class DetectionWorkerPool:
+    """
+    Pool of detector processes fed through a shared-memory frame ring.
+    submit() never blocks: when every slot is in flight the frame is dropped.
+    Workers finish out of order, so a result older than one already handed to
+    its callback is dropped as well.
+    """
+    def __init__(self, num_workers=None, max_frame_shape=(1080, 1920, 3), slots_per_worker=2, detector_kwargs=None):
+        self.num_workers = num_workers or max(1, multiprocessing.cpu_count() - 1)
+        slots = self.num_workers * slots_per_worker
+        slot_bytes = int(np.prod(max_frame_shape))
+
+        # Fork where available so workers don't re-import the Flask app
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+
+        self.ring = SharedFrameRing(slots, slot_bytes)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        self.task_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.pending = {}  # slot -> (sequence, callback, submit time)
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.last_published = 0  # Sequence of the newest result handed to a callback
+        self.running = True
+
+        # Statistics
+        self.frames_submitted = 0
+        self.frames_completed = 0
+        self.frames_dropped = 0
+        self.frames_stale = 0  # Results dropped because a newer frame was already published
+        self.frames_oversized = 0  # Frames too large for a ring slot
+        self.workers_ready = 0
+        self.last_latency = 0.0
+
+        self.workers = []
+        for i in range(self.num_workers):
+            worker = context.Process(
+                target=worker_main,
+                args=(self.ring.name, slots, slot_bytes, self.task_queue, self.result_queue, detector_kwargs or {}),
+                name=f"detection-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+        self.collector = threading.Thread(target=self.collect_results, daemon=True)
+        self.collector.start()
+        print(f"Started {self.num_workers} detection workers with {slots} shared frame slots")
+
+    def wait_for_slot(self, timeout=None):
+        """Block until a frame slot is free, so callers can pick the newest frame to submit"""
+        try:
+            slot = self.free_slots.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        self.free_slots.put(slot)
+        return True
+
+    def submit(self, frame, callback):
+        """
+        Queue a frame for detection; callback(result) runs on the collector thread.
+        Returns the frame sequence number, or None if the frame was dropped.
+        """
+        if frame.nbytes > self.ring.slot_bytes:
+            # Larger than max_frame_shape; never worth taking a slot for
+            with self.lock:
+                self.frames_dropped += 1
+                self.frames_oversized += 1
+            return None
+
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.frames_dropped += 1
+            return None
+
+        try:
+            self.ring.write(slot, frame)
+        except Exception as e:
+            self.free_slots.put(slot)
+            with self.lock:
+                self.frames_dropped += 1
+            print(f"Could not pass a frame to the detection workers: {e}")
+            return None
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+            self.pending[slot] = (sequence, callback, time.time())
+            self.frames_submitted += 1
+
+        self.task_queue.put((sequence, slot, frame.shape))
+        return sequence
+
+    def collect_results(self):
+        """Collector thread: release slots and hand results to their callbacks"""
+        while self.running:
+            try:
+                kind, slot, result = self.result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'ready':
+                self.workers_ready += 1
+                continue
+
+            with self.lock:
+                sequence, callback, submit_time = self.pending.pop(slot)
+                self.frames_completed += 1
+                self.last_latency = time.time() - submit_time
+                stale = kind == 'result' and sequence < self.last_published
+                if stale:
+                    self.frames_stale += 1
+                elif kind == 'result':
+                    self.last_published = sequence
+            self.free_slots.put(slot)
+
+            if kind == 'error':
+                print(f"Detection worker error on frame {sequence}: {result['error']}")
+                continue
+            if stale:
+                continue
+
+            result['detections'] = array_to_detections(result['detections'], result.pop('labels'))
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Error in detection result callback: {e}")
+
+    def get_stats(self):
+        """Return pool throughput statistics"""
+        with self.lock:
+            return {
+                'workers': self.num_workers,
+                'workers_ready': self.workers_ready,
+                'frames_submitted': self.frames_submitted,
+                'frames_completed': self.frames_completed,
+                'frames_dropped': self.frames_dropped,
+                'frames_stale': self.frames_stale,
+                'frames_oversized': self.frames_oversized,
+                'in_flight': len(self.pending),
+                'last_latency_ms': round(self.last_latency * 1000, 1)
+            }
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        self.running = False
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+            if worker.is_alive():
+                worker.terminate()
+        self.collector.join(timeout=1.0)
+        self.ring.close()
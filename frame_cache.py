@@ -0,0 +1,120 @@
+"""
+Result cache for repeated and near-identical frames.
+ESP32 cameras resend the same picture when the scene is static or the link
+stalls. Each frame is reduced to a 32x24 grayscale thumbnail and a 64-bit
+difference hash (dHash) of it. A frame whose hash is within a few bits of a
+recent one, and whose thumbnail matches that frame's to within a few gray
+levels everywhere, reuses its detections instead of running any inference.
+The hash alone can't see an object shifting inside one hash cell; the
+thumbnail check can, while JPEG re-encoding noise stays well below it.
+"""
+import collections
+import threading
+import time
+import cv2
+import numpy as np
+
+# Size (width, height) of the thumbnail frames are compared by
+THUMBNAIL_SIZE = (32, 24)
+
+# The hash compares each pixel of a (HASH_SIZE + 1) x HASH_SIZE thumbnail with its right neighbour
+HASH_SIZE = 8
+
+
+def make_thumbnail(gray):
+    """Area-averaged grayscale thumbnail of a frame"""
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def dhash(thumbnail):
+    """64-bit difference hash of a grayscale image"""
+    small = cv2.resize(thumbnail, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash1, hash2):
+    """Number of bits in which two hashes differ"""
+    return bin(hash1 ^ hash2).count('1')
+
+
+class FrameResultCache:
+    """
+    Small LRU of detection results keyed by frame hash. A lookup tries the stored
+    hashes within threshold bits of the frame's, closest first, and takes the
+    first whose frame had the same shape and a thumbnail no pixel of which differs
+    by more than max_pixel_difference. Entries older than max_age seconds are
+    dropped so a static scene is still re-checked now and then.
+    """
+    def __init__(self, max_entries=32, threshold=4, max_pixel_difference=12, max_age=5.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_pixel_difference = max_pixel_difference
+        self.max_age = max_age
+        self.entries = collections.OrderedDict()  # hash -> (frame shape, thumbnail, result, time stored)
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.rejected = 0          # Hash matches whose thumbnails differed too much
+        self.last_distance = None  # Hamming distance of the last hit
+
+    def lookup(self, frame_hash, thumbnail, shape):
+        """Return the result stored for the closest matching frame, or None"""
+        now = time.time()
+        with self.lock:
+            candidates = []
+            for stored_hash, (stored_shape, _, _, stored_time) in list(self.entries.items()):
+                if now - stored_time > self.max_age:
+                    del self.entries[stored_hash]
+                    self.expired += 1
+                    continue
+                if stored_shape != shape:
+                    continue
+                distance = hamming_distance(frame_hash, stored_hash)
+                if distance <= self.threshold:
+                    candidates.append((distance, stored_hash))
+
+            for distance, stored_hash in sorted(candidates):
+                _, stored_thumbnail, result, _ = self.entries[stored_hash]
+                if cv2.absdiff(thumbnail, stored_thumbnail).max() > self.max_pixel_difference:
+                    self.rejected += 1
+                    continue
+                self.entries.move_to_end(stored_hash)
+                self.hits += 1
+                self.last_distance = distance
+                return result
+
+            self.misses += 1
+            return None
+
+    def store(self, frame_hash, thumbnail, shape, result):
+        """Remember the result for a frame, evicting the least recently used entry if full"""
+        with self.lock:
+            self.entries[frame_hash] = (shape, thumbnail, result, time.time())
+            self.entries.move_to_end(frame_hash)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'rejected': self.rejected,
+                'last_distance': self.last_distance
+            }
@@ -0,0 +1,86 @@
+"""
+Per-frame preprocessing shared by every detector and analyzer.
+A FrameContext computes each derived image (grayscale, RGB, resizes, DNN
+blobs) lazily the first time it is asked for and hands the same result to
+every later caller on that frame. Raw network outputs are cached the same
+way, so detectors sharing a model and its input size never run the same
+forward pass twice on one frame; each applies its own thresholds to the
+outputs. It also records what was computed, how long it took and how often
+it was reused.
+"""
+import os
+import time
+import cv2
+
+
+class FrameContext:
+    def __init__(self, frame, report=None, prefix=''):
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self.cache = {}
+
+        # Crops of this frame record into the same report under their own prefix
+        self.report = report if report is not None else {}
+        self.prefix = prefix
+
+    def get(self, key, name, compute):
+        """Return the cached value for key, computing it on first use"""
+        name = self.prefix + name
+        if key in self.cache:
+            self.report[name]['uses'] += 1
+            return self.cache[key]
+
+        start_time = time.perf_counter()
+        value = compute()
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.cache[key] = value
+
+        # Images of the same kind (e.g. blobs of two sizes) share one report entry
+        entry = self.report.setdefault(name, {'computed': 0, 'uses': 0, 'ms': 0.0})
+        entry['computed'] += 1
+        entry['uses'] += 1
+        entry['ms'] += elapsed
+        return value
+
+    def get_gray(self):
+        return self.get('gray', 'gray', lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY))
+
+    def get_rgb(self):
+        return self.get('rgb', 'rgb', lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB))
+
+    def get_resized_gray(self, size):
+        """Grayscale resized to size (width, height), e.g. for motion analysis"""
+        if size == (self.width, self.height):
+            return self.get_gray()
+        return self.get(('resized_gray', size), 'resized_gray',
+                        lambda: cv2.resize(self.get_gray(), size, interpolation=cv2.INTER_LINEAR))
+
+    def get_resized(self, size):
+        """The frame resized to size (width, height), or the frame itself if it already has that size"""
+        if size == (self.width, self.height):
+            return self.frame
+        return self.get(('resized', size), 'resized', lambda: cv2.resize(self.frame, size))
+
+    def get_blob(self, scale, size, mean=(0, 0, 0), swap_rb=True):
+        """A DNN input blob; detectors asking for the same preprocessing share one blob"""
+        mean = tuple(mean)
+        return self.get(('blob', scale, size, mean, swap_rb), 'blob',
+                        lambda: cv2.dnn.blobFromImage(self.frame, scale, size, mean, swapRB=swap_rb, crop=False))
+
+    def get_outputs(self, model, scale, size, mean=(0, 0, 0), swap_rb=True):
+        """
+        Raw outputs of a registry model (see model_registry.py) on this frame's blob.
+        Callers must treat them as read-only since later callers get the same arrays.
+        """
+        mean = tuple(mean)
+        return self.get(('outputs', model.key, scale, size, mean, swap_rb),
+                        'forward:' + os.path.basename(model.key[1]),
+                        lambda: model.forward(self.get_blob(scale, size, mean, swap_rb)))
+
+    def crop(self, x, y, w, h):
+        """A context for a region of this frame that reports into the same report"""
+        return FrameContext(self.frame[y:y + h, x:x + w], self.report, prefix='crop:')
+
+    def get_report(self):
+        """Return what was computed for this frame, how long it took and how often it was used"""
+        return {name: dict(entry, ms=round(entry['ms'], 2)) for name, entry in self.report.items()}
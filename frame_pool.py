@@ -0,0 +1,74 @@
+"""
+Reusable frame buffers.
+Full frames are large (6 MB at 1080p), so allocating and copying them per
+stage costs real memory bandwidth. FrameBufferPool hands out preallocated
+arrays and takes them back once their owner is done with them. The counters
+make it easy to check that a steady stream of frames stops allocating.
+"""
+import threading
+import weakref
+import numpy as np
+
+
+class FrameBufferPool:
+    def __init__(self, max_free=4):
+        self.max_free = max_free  # Spare buffers kept per shape
+        self.free = {}            # (shape, dtype) -> list of spare buffers
+        self.lock = threading.Lock()
+
+        # Buffers currently handed out, so release() only takes back what the pool owns
+        self.outstanding = weakref.WeakValueDictionary()
+
+        # Statistics
+        self.allocations = 0
+        self.reuses = 0
+        self.releases = 0
+        self.bytes_allocated = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Return a buffer of the given shape; its contents are undefined"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            spares = self.free.get(key)
+            if spares:
+                buffer = spares.pop()
+                self.reuses += 1
+            else:
+                buffer = np.empty(shape, dtype=dtype)
+                self.allocations += 1
+                self.bytes_allocated += buffer.nbytes
+            self.outstanding[id(buffer)] = buffer
+        return buffer
+
+    def copy(self, frame):
+        """Return a pooled copy of frame"""
+        buffer = self.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        return buffer
+
+    def release(self, buffer):
+        """
+        Give a buffer back to the pool. The caller must not use it afterwards.
+        Arrays the pool didn't hand out are ignored.
+        """
+        if buffer is None:
+            return
+        with self.lock:
+            if self.outstanding.get(id(buffer)) is not buffer:
+                return
+            del self.outstanding[id(buffer)]
+            self.releases += 1
+            spares = self.free.setdefault((buffer.shape, buffer.dtype.str), [])
+            if len(spares) < self.max_free:
+                spares.append(buffer)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'releases': self.releases,
+                'outstanding': len(self.outstanding),
+                'free': sum(len(spares) for spares in self.free.values()),
+                'mb_allocated': round(self.bytes_allocated / (1024 * 1024), 1)
+            }
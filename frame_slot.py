@@ -0,0 +1,68 @@
+"""
+Single-slot "latest frame wins" buffer between a capture thread and an
+inference thread. The capture side never blocks: a new frame replaces any
+frame the inference side hasn't taken yet, so latency stays bounded when
+inference is slower than the camera.
+"""
+import threading
+import time
+
+
+class LatestFrameSlot:
+    def __init__(self, name):
+        self.name = name
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_time = 0
+        self.closed = False
+
+        # Per-stream counters
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.last_latency = 0.0  # Seconds between capture and pickup of the last frame
+
+    def put(self, frame):
+        """Store the newest frame, dropping the previous one if it was never taken"""
+        with self.condition:
+            if self.frame is not None:
+                self.frames_dropped += 1
+            self.frame = frame
+            self.frame_time = time.time()
+            self.frames_captured += 1
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for a frame newer than the last one taken.
+        Returns None on timeout or when the slot is closed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None or self.closed, timeout)
+            if self.frame is None:
+                return None
+
+            frame = self.frame
+            self.frame = None
+            self.frames_processed += 1
+            self.last_latency = time.time() - self.frame_time
+            return frame
+
+    def close(self):
+        """Wake up any waiting consumer and stop handing out frames"""
+        with self.condition:
+            self.closed = True
+            self.frame = None
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """Return the frame counters for this stream"""
+        with self.condition:
+            return {
+                'name': self.name,
+                'frames_captured': self.frames_captured,
+                'frames_processed': self.frames_processed,
+                'frames_dropped': self.frames_dropped,
+                'last_latency_ms': round(self.last_latency * 1000, 1),
+                'closed': self.closed
+            }
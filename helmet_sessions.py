@@ -0,0 +1,258 @@
+"""
+Per-helmet sessions, so one server process can host a fleet of helmets.
+Each helmet ID gets its own session: its own simulation state and state
+channel and its own detector, whose detection feed its browsers follow. Every
+camera stream of the helmet (the local webcam, each ESP32 URL, uploaded
+frames) gets a detector context of its own from get_stream_detector, so the
+tracking, motion and frame-cache state of one camera never sees another's
+frames. The detectors of all sessions and streams share their models
+(networks through the model registry, the face, HOG and Haar models through
+share_models_with), so the weights are loaded once per process however many
+helmets and cameras there are.
+
+A session's detector is only built once the helmet sends frames, on a
+background thread, so requests never wait for it; until it is ready the
+routes that need it answer in a degraded mode, as during startup.
+
+Sessions are created on first use and evicted after idle_timeout seconds
+without requests or anyone following their streams. The default helmet, which owns
+the local webcam and the server's microphone, is never evicted.
+"""
+import copy
+import re
+import threading
+import time
+
+from state_feed import StateFeed
+from state_store import StateStore
+from upstream_reader import find_upstream_reader, stop_upstream_readers
+
+DEFAULT_HELMET = 'default'
+
+# Evict a session nobody has used for this many seconds
+IDLE_TIMEOUT = 600.0
+
+# Helmet IDs appear in URLs and logs, so only allow a safe set of characters
+HELMET_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class HelmetSession:
+    def __init__(self, helmet_id, initial_state, initial_sensors, detector_factory, max_rate=5.0):
+        self.helmet_id = helmet_id
+
+        # Simulation state, and the channel that pushes its changes to this helmet's browsers.
+        # The camera sensor readings change with nearly every frame, so they have a store of
+        # their own; the state's version (and ETag) only moves when the simulation changes
+        self.state_store = StateStore(initial_state)
+        self.sensor_store = StateStore(initial_sensors)
+        self.state_feed = StateFeed(max_rate=max_rate)
+        self.state_store.add_listener(self.publish_state)
+        self.sensor_store.add_listener(self.publish_sensors)
+        self.publish_state(self.state_store.get())
+        self.publish_sensors(self.sensor_store.get())
+
+        # Built in the background on first use; detector_factory(session) may block until
+        # the shared models have loaded, and returns None if they failed to
+        self.detector_factory = detector_factory
+        self.detector = None
+        self.detector_loading = False
+        self.detector_error = None
+        self.detector_lock = threading.Lock()
+        self.closed = False
+
+        # Detector context of each camera stream, and the stream that published last
+        self.stream_detectors = {}
+        self.active_stream = None
+
+        # Uploads share the ingest stream's context, so each batch goes through in
+        # order without another upload's frames in between
+        self.ingest_lock = threading.Lock()
+
+        self.created = time.time()
+        self.last_used = self.created
+        self.requests = 0
+
+    def touch(self):
+        self.last_used = time.time()
+        self.requests += 1
+
+    def publish_state(self, snapshot):
+        """Send whatever changed in a new state version to the state channel's clients"""
+        self.state_feed.publish('state', snapshot.to_dict())
+
+    def publish_sensors(self, snapshot):
+        """Send whatever changed in new sensor readings to the channel's sensors section"""
+        self.state_feed.publish('sensors', snapshot.to_dict())
+
+    def store_sensors(self, snapshot):
+        """
+        Store the sensor readings of the stream that published a snapshot, which
+        also pushes them to the state channel
+        """
+        detector = self.stream_detectors.get(snapshot.get('stream')) or self.detector
+        self.active_stream = snapshot.get('stream')
+        self.sensor_store.update(detector.get_sensor_data())
+
+    def get_detector(self, create=True):
+        """
+        This helmet's detector, or None while it is being built. Only callers with
+        frames to process should pass create=True; status reads never build one
+        """
+        if self.detector is None and create:
+            with self.detector_lock:
+                if self.detector is not None or self.detector_loading or self.closed:
+                    return self.detector
+                self.detector_loading = True
+            threading.Thread(target=self.load_detector, daemon=True, name=f'detector-{self.helmet_id}').start()
+        return self.detector
+
+    def get_stream_detector(self, stream, create=True):
+        """
+        The detector context of one of this helmet's camera streams, made on first use
+        from the session detector; None while that is being built
+        """
+        detector = self.get_detector(create)
+        if detector is None:
+            return None
+        with self.detector_lock:
+            context = self.stream_detectors.get(stream)
+            if context is None and create and not self.closed:
+                context = detector.make_stream_detector(stream)
+                self.stream_detectors[stream] = context
+            return context
+
+    def get_active_detector(self):
+        """The detector context of the stream that published the latest detections, or the session detector"""
+        return self.stream_detectors.get(self.active_stream) or self.detector
+
+    def load_detector(self):
+        """Background thread: build and wire up this helmet's detector"""
+        try:
+            detector = self.detector_factory(self)
+            error = None if detector is not None else 'Object detector models failed to load'
+        except Exception as e:
+            detector, error = None, str(e)
+            print(f"Failed to create the detector for helmet {self.helmet_id}: {e}")
+
+        with self.detector_lock:
+            self.detector_loading = False
+            self.detector_error = error
+            if detector is None:
+                return
+            if self.closed:
+                # Evicted while the detector was being built
+                detector.stage_executor.close()
+                return
+            # Every frame's results (from any stream, they share the feed) update the sensor section of the state
+            detector.detection_feed.add_listener(self.store_sensors)
+            self.detector = detector
+
+    def is_idle(self, timeout, now):
+        """Unused for timeout seconds, with nobody following its streams"""
+        if now - self.last_used < timeout or self.state_feed.get_stats()['clients'] > 0:
+            return False
+        if self.detector is None:
+            return not self.detector_loading
+        # This helmet's camera reader stops by itself once nobody watches it
+        if find_upstream_reader(self.helmet_id, self.state_store.get()['esp32_camera_url']) is not None:
+            return False
+        return self.detector.detection_feed.get_stats()['clients'] == 0
+
+    def close(self):
+        with self.detector_lock:
+            self.closed = True
+            detectors = list(self.stream_detectors.values())
+            if self.detector is not None:
+                detectors.append(self.detector)
+        # Its camera readers run the detectors, so they go first
+        stop_upstream_readers(self.helmet_id)
+        for detector in detectors:
+            detector.stage_executor.close()
+
+    def get_stats(self):
+        return {
+            'helmet_id': self.helmet_id,
+            'created': self.created,
+            'idle_seconds': round(time.time() - self.last_used, 1),
+            'requests': self.requests,
+            'state_version': self.state_store.get().version,
+            'sensor_version': self.sensor_store.get().version,
+            'state_clients': self.state_feed.get_stats()['clients'],
+            'detector_loaded': self.detector is not None,
+            'detector_loading': self.detector_loading,
+            'detector_error': self.detector_error,
+            'streams': sorted(self.stream_detectors),
+            'active_stream': self.active_stream
+        }
+
+
+class SessionManager:
+    def __init__(self, initial_state, initial_sensors, detector_factory, idle_timeout=IDLE_TIMEOUT,
+                 max_sessions=0, max_rate=5.0):
+        self.initial_state = copy.deepcopy(initial_state)
+        self.initial_sensors = copy.deepcopy(initial_sensors)
+        self.detector_factory = detector_factory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions  # 0 for no limit
+        self.max_rate = max_rate
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.created = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def get(self, helmet_id=DEFAULT_HELMET):
+        """
+        Return the session of a helmet, creating it on first use. Raises ValueError
+        for a malformed ID and RuntimeError when max_sessions are already active
+        """
+        session = self.sessions.get(helmet_id)
+        if session is None:
+            if not HELMET_ID_PATTERN.match(helmet_id):
+                raise ValueError(f"Invalid helmet ID '{helmet_id}'")
+            with self.lock:
+                session = self.sessions.get(helmet_id)
+                if session is None:
+                    if self.max_sessions and len(self.sessions) >= self.max_sessions:
+                        self.rejected += 1
+                        raise RuntimeError(f"Already hosting {len(self.sessions)} helmets")
+                    session = HelmetSession(helmet_id, copy.deepcopy(self.initial_state),
+                                            copy.deepcopy(self.initial_sensors), self.detector_factory,
+                                            self.max_rate)
+                    self.sessions[helmet_id] = session
+                    self.created += 1
+                    print(f"Created session for helmet {helmet_id}")
+        session.touch()
+        return session
+
+    def all(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def evict_idle(self):
+        """Close and forget sessions idle for longer than idle_timeout; returns their IDs"""
+        now = time.time()
+        with self.lock:
+            idle = [session for helmet_id, session in self.sessions.items()
+                    if helmet_id != DEFAULT_HELMET and session.is_idle(self.idle_timeout, now)]
+            for session in idle:
+                del self.sessions[session.helmet_id]
+                self.evicted += 1
+        for session in idle:
+            session.close()
+            print(f"Evicted idle session for helmet {session.helmet_id}")
+        return [session.helmet_id for session in idle]
+
+    def get_stats(self):
+        sessions = self.all()
+        return {
+            'active': len(sessions),
+            'max_sessions': self.max_sessions,
+            'idle_timeout': self.idle_timeout,
+            'created': self.created,
+            'evicted': self.evicted,
+            'rejected': self.rejected,
+            'sessions': [session.get_stats() for session in sessions]
+        }
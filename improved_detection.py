@@ -4,9 +4,11 @@ This module integrates with the existing object_detection.py file.
 """
 import cv2
 import numpy as np
-import os
-import urllib.request
 import time
+from model_registry import model_registry
+from model_store import model_store
+from yolo_decoder import YoloDecoder, CATEGORY_PERSON, CATEGORY_VEHICLE
+from frame_context import FrameContext
 
 # Constants for detection - increased thresholds for reliability
 CONF_THRESHOLD = 0.55  # Higher confidence threshold for more accurate detections
@@ -15,16 +17,23 @@ PERSON_CLASS_ID = 0    # YOLO class ID for person
 VEHICLE_CLASS_IDS = [2, 5, 7, 3, 1]  # car, bus, truck, motorcycle, bicycle in priority order
 
 class ImprovedDetector:
-    def __init__(self):
-        # Create models directory if it doesn't exist
-        os.makedirs("models", exist_ok=True)
+    def __init__(self, inference=None):
+        # Inference backend settings (see inference_backends.py)
+        self.inference = inference
         
         # Initialize detector
         self.net = None
+        self.model = None  # Shared registry entry for the loaded network
         self.output_layers = []
         self.initialized = False
         self.classes = None
         
+        # Vectorized output decoder with precomputed class lookup tables
+        self.decoder = YoloDecoder(
+            lambda class_id: self.is_person(class_id, self.get_class_name(class_id)),
+            lambda class_id: self.is_vehicle(class_id, self.get_class_name(class_id))
+        )
+        
         # Track last detections to reduce jitter
         self.last_human_boxes = []
         self.last_vehicle_boxes = []
@@ -36,22 +45,25 @@ class ImprovedDetector:
     def initialize_detector(self):
         """Initialize YOLOv4 for improved detection"""
         try:
-            # Define model files - prefer standard YOLOv4 over tiny for better accuracy
-            weights_path = "models/yolov4.weights"
-            config_path = "models/yolov4.cfg"
-            coco_names_path = "models/coco.names"
+            # Model files come from the local store (see model_store.py) and are never
+            # downloaded here; prefer standard YOLOv4 over tiny for better accuracy
+            weights_path = model_store.get('yolov4.weights')
+            config_path = model_store.get('yolov4.cfg')
+            coco_names_path = model_store.get('coco.names')
             
             # Fall back to YOLOv4-tiny if the full model isn't available
-            if not os.path.exists(weights_path) or not os.path.exists(config_path):
-                weights_path = "models/yolov4-tiny.weights"
-                config_path = "models/yolov4-tiny.cfg"
+            if weights_path is None or config_path is None:
+                weights_path = model_store.get('yolov4-tiny.weights')
+                config_path = model_store.get('yolov4-tiny.cfg')
             
             # Check if model files exist
-            if not os.path.exists(weights_path) or not os.path.exists(config_path):
-                self.download_model_files(weights_path, config_path, coco_names_path)
+            if weights_path is None or config_path is None:
+                print("No YOLO model files in the model store; fetch them with python prefetch_models.py")
+                self.initialized = False
+                return
             
             # Load class names
-            if os.path.exists(coco_names_path):
+            if coco_names_path is not None:
                 with open(coco_names_path, 'r') as f:
                     self.classes = [line.strip() for line in f.readlines()]
             else:
@@ -59,22 +71,11 @@ class ImprovedDetector:
                 self.classes = ["person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", 
                                "boat", "traffic light", "fire hydrant", "stop sign", "parking meter", "bench"]
             
-            # Load the network
+            # Get the network from the shared registry so it is only loaded once per process
             print(f"Loading detection model from {weights_path}")
-            self.net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
-            
-            # Optimize for CPU if no GPU
-            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-            
-            # Determine output layers
-            layer_names = self.net.getLayerNames()
-            try:
-                # OpenCV 4.5.4+
-                self.output_layers = [layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
-            except:
-                # Older OpenCV versions
-                self.output_layers = [layer_names[i[0] - 1] for i in self.net.getUnconnectedOutLayers()]
+            self.model = model_registry.get_darknet(config_path, weights_path, inference=self.inference)
+            self.net = self.model.net
+            self.output_layers = self.model.output_layers
             
             self.initialized = True
             print("Improved detector initialized successfully")
@@ -82,48 +83,6 @@ class ImprovedDetector:
             print(f"Failed to initialize improved detector: {e}")
             self.initialized = False
     
-    def download_model_files(self, weights_path, config_path, names_path):
-        """Download YOLO model files if they don't exist"""
-        try:
-            print(f"Downloading model files to {weights_path}...")
-            
-            # Create model directory if it doesn't exist
-            os.makedirs(os.path.dirname(weights_path), exist_ok=True)
-            
-            # Download configuration file
-            if not os.path.exists(config_path):
-                # Try YOLOv4-tiny first, as it's smaller
-                cfg_url = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4-tiny.cfg"
-                print(f"Downloading config from {cfg_url}")
-                urllib.request.urlretrieve(cfg_url, config_path)
-            
-            # Download weights file - prefer tiny for faster download
-            if not os.path.exists(weights_path):
-                weights_url = "https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v4_pre/yolov4-tiny.weights"
-                print(f"Downloading weights from {weights_url}")
-                urllib.request.urlretrieve(weights_url, weights_path)
-            
-            # Download class names
-            if not os.path.exists(names_path):
-                names_url = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names"
-                print(f"Downloading class names from {names_url}")
-                urllib.request.urlretrieve(names_url, names_path)
-            
-            print("Model files downloaded successfully")
-        except Exception as e:
-            print(f"Failed to download model files: {e}")
-            # Use the curl method as fallback
-            try:
-                if not os.path.exists(config_path):
-                    os.system(f"curl -o {config_path} https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4-tiny.cfg")
-                if not os.path.exists(weights_path):
-                    os.system(f"curl -L -o {weights_path} https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v4_pre/yolov4-tiny.weights")
-                if not os.path.exists(names_path):
-                    os.system(f"curl -o {names_path} https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names")
-            except Exception as e2:
-                print(f"Fallback download also failed: {e2}")
-                raise
-    
     def is_person(self, class_id, class_name):
         """Check if the detected object is a person"""
         if class_id == PERSON_CLASS_ID:
@@ -225,80 +184,32 @@ class ImprovedDetector:
         self.last_detection_time = current_time
         return smoothed_boxes
     
-    def detect(self, frame):
+    def detect(self, frame, annotate=True, context=None):
         """
         Detect humans and vehicles in the given frame
-        Returns: humans_count, vehicles_count, annotated_frame
+        Returns: humans_count, vehicles_count, annotated_frame (the input frame when annotate is False)
         """
         if not self.initialized or self.net is None:
             # Return zeros if not initialized
             return 0, 0, frame
         
         height, width = frame.shape[:2]
-        
-        # Store original for drawing
-        original_frame = frame.copy()
+        if context is None:
+            context = FrameContext(frame)
         
         # Prepare image for detection - YOLOv4 prefers 416x416
         target_size = (416, 416)
         
-        # Create blob from image
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, target_size, swapRB=True, crop=False)
-        
-        # Set input to the network
-        self.net.setInput(blob)
-        
-        # Run forward pass
-        outputs = self.net.forward(self.output_layers)
+        # Run forward pass on the shared network. When the precision detector already ran
+        # the same model on this frame its raw outputs are reused and only re-thresholded here
+        outputs = context.get_outputs(self.model, 1/255.0, target_size)
         
-        # Initialize lists for detection results
-        class_ids = []
-        confidences = []
-        boxes = []
-        
-        # Process each detection
-        for output in outputs:
-            for detection in output:
-                if len(detection) >= 85:  # YOLO outputs have 85 elements per detection
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    
-                    # Filter detections by confidence threshold
-                    if confidence > CONF_THRESHOLD:
-                        # Get class name if available
-                        class_name = self.get_class_name(class_id)
-                        
-                        # Filter to only keep persons and vehicles
-                        if self.is_person(class_id, class_name) or self.is_vehicle(class_id, class_name):
-                            # Scale the bounding box coordinates back to the frame size
-                            center_x = int(detection[0] * width)
-                            center_y = int(detection[1] * height)
-                            w = int(detection[2] * width)
-                            h = int(detection[3] * height)
-                            
-                            # Calculate top-left corner coordinates
-                            x = int(center_x - w / 2)
-                            y = int(center_y - h / 2)
-                            
-                            # Ensure coordinates are within frame boundaries
-                            x = max(0, x)
-                            y = max(0, y)
-                            w = min(w, width - x)
-                            h = min(h, height - y)
-                            
-                            # Skip if box is too small - these are often false positives
-                            if w < 20 or h < 20:
-                                continue
-                                
-                            # Skip if box is unrealistically large
-                            if w > width * 0.95 or h > height * 0.95:
-                                continue
-                            
-                            # Add to lists
-                            boxes.append([x, y, w, h])
-                            confidences.append(float(confidence))
-                            class_ids.append(class_id)
+        # Decode every output row at once, keeping only confident persons and
+        # vehicles and dropping boxes that are too small or unrealistically large
+        class_ids, confidences, boxes, categories = self.decoder.decode(
+            outputs, width, height, CONF_THRESHOLD, min_box_size=20, max_box_ratio=0.95)
+        boxes = boxes.tolist()
+        confidences = confidences.tolist()
         
         # Apply non-maximum suppression
         if boxes:
@@ -310,19 +221,11 @@ class ImprovedDetector:
         human_boxes = []
         vehicle_boxes = []
         
-        if len(indices) > 0:
-            for i in indices:
-                if isinstance(i, list):  # OpenCV 4.5.x and below
-                    i = i[0]
-                    
-                box = boxes[i]
-                class_id = class_ids[i]
-                class_name = self.get_class_name(class_id)
-                
-                if self.is_person(class_id, class_name):
-                    human_boxes.append(box)
-                elif self.is_vehicle(class_id, class_name):
-                    vehicle_boxes.append(box)
+        for i in np.array(indices).flatten():
+            if categories[i] == CATEGORY_PERSON:
+                human_boxes.append(boxes[i])
+            elif categories[i] == CATEGORY_VEHICLE:
+                vehicle_boxes.append(boxes[i])
         
         # Apply smoothing to reduce jitter
         human_boxes = self.smooth_detections(human_boxes, self.last_human_boxes, "human")
@@ -336,27 +239,35 @@ class ImprovedDetector:
         humans_count = len(human_boxes)
         vehicles_count = len(vehicle_boxes)
         
-        # Draw bounding boxes on original frame
-        for box in human_boxes:
+        if not annotate:
+            return humans_count, vehicles_count, frame
+        
+        # Draw bounding boxes on a copy of the frame
+        original_frame = frame.copy()
+        self.draw_detections(original_frame)
+        
+        return humans_count, vehicles_count, original_frame
+    
+    def draw_detections(self, frame):
+        """Draw the boxes and counts from the last detect() call onto frame"""
+        for box in self.last_human_boxes:
             x, y, w, h = box
             color = (50, 205, 50)  # Green
-            cv2.rectangle(original_frame, (x, y), (x + w, y + h), color, 2)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
             label = "Person"
-            cv2.putText(original_frame, label, (x, y - 10), 
+            cv2.putText(frame, label, (x, y - 10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         
-        for box in vehicle_boxes:
+        for box in self.last_vehicle_boxes:
             x, y, w, h = box
             color = (255, 165, 0)  # Orange
-            cv2.rectangle(original_frame, (x, y), (x + w, y + h), color, 2)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
             label = "Vehicle"
-            cv2.putText(original_frame, label, (x, y - 10), 
+            cv2.putText(frame, label, (x, y - 10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         
         # Add detector info
-        cv2.putText(original_frame, f"Humans: {humans_count}", (10, 30), 
+        cv2.putText(frame, f"Humans: {len(self.last_human_boxes)}", (10, 30), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (50, 205, 50), 2)
-        cv2.putText(original_frame, f"Vehicles: {vehicles_count}", (10, 60), 
+        cv2.putText(frame, f"Vehicles: {len(self.last_vehicle_boxes)}", (10, 60), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 165, 0), 2)
-        
-        return humans_count, vehicles_count, original_frame
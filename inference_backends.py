@@ -0,0 +1,224 @@
+"""
+Inference backends for the detection networks.
+A backend wraps one loaded network behind forward(blob), so detectors and the
+model registry don't depend on which runtime executes it:
+
+    'opencv'      - cv2.dnn with the OpenCV backend on the CPU (the default)
+    'auto'        - ONNX Runtime for YOLO models when it is installed, else
+                    OpenCV
+    'onnxruntime' - ONNX Runtime on the CPU, for YOLO models exported to ONNX,
+                    with configurable thread counts, graph optimization level
+                    and optional INT8 (dynamically quantized) weights
+
+The settings are a plain dict (see DEFAULT_INFERENCE), normally built from the
+HELMET_INFERENCE_* / HELMET_ORT_* environment variables in app.py. ONNX Runtime
+is optional; without it the registry falls back to OpenCV, which parses the
+Darknet files on every start.
+
+The ONNX model is an .onnx file next to the Darknet weights if there is one,
+otherwise the export darknet_onnx.py makes from the .cfg and .weights files
+(which needs the onnx package, and is only used once its outputs match
+cv2.dnn's on a test input). The export is quantized (if requested) and
+graph-optimized once, and both are saved in the converted-model cache (see
+model_cache.py), so later starts skip the Darknet parsing, the export, the
+ONNX protobuf, quantization and optimization.
+"""
+import os
+import numpy as np
+
+from darknet_onnx import export_darknet_to_onnx, onnx_available
+from model_cache import model_cache
+
+try:
+    import onnxruntime as ort
+    onnxruntime_available = True
+except ImportError:
+    onnxruntime_available = False
+
+BACKENDS = ('auto', 'opencv', 'onnxruntime')
+
+DEFAULT_INFERENCE = {
+    'backend': 'opencv',
+    'intra_op_threads': 0,         # 0 lets ONNX Runtime choose (one per physical core)
+    'inter_op_threads': 0,
+    'graph_optimization': 'all',   # disabled, basic, extended or all
+    'int8': False                  # Use dynamically quantized INT8 weights
+}
+
+# YOLO rows hold 4 box values and an objectness score before the class scores
+YOLO_BOX_FIELDS = 5
+
+
+def make_inference_config(inference=None):
+    """Fill in the defaults for an inference settings dict and check the backend name"""
+    config = dict(DEFAULT_INFERENCE)
+    config.update(inference or {})
+    if config['backend'] not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{config['backend']}', expected one of {BACKENDS}")
+    return config
+
+
+def get_onnx_path(weights_path):
+    """The ONNX export expected next to a Darknet weights file"""
+    return os.path.splitext(weights_path)[0] + '.onnx'
+
+
+def get_darknet_export(weights_path, config_path, cache=model_cache):
+    """
+    The ONNX model for a Darknet model: the .onnx file next to the weights if
+    there is one, otherwise an export from the .cfg and .weights files, made on
+    the first call and kept in the converted-model cache
+    """
+    onnx_path = get_onnx_path(weights_path)
+    if os.path.exists(onnx_path) or not config_path:
+        return onnx_path
+    if not onnx_available:
+        raise RuntimeError(f"No ONNX export at {onnx_path} and onnx is not installed to make one")
+
+    sources = [config_path, weights_path]
+    name = cache.entry_name(weights_path, {'export': 'onnx'})
+    metadata = cache.get(name, sources)
+    if metadata is not None:
+        return metadata['model']
+
+    export_path = export_darknet_to_onnx(config_path, weights_path, cache.artifact_path(name, '.onnx'))
+    cache.put(name, sources, [export_path], model=export_path)
+    return export_path
+
+
+def to_darknet_rows(outputs):
+    """
+    Convert ONNX YOLO outputs to the (rows x 85) layout cv2.dnn produces, so the same
+    decoder works for both backends. Handles exports that keep the Darknet layout
+    ([1, N, 85]) and exports with separate boxes ([1, N, 1, 4] as normalized
+    x1, y1, x2, y2) and class scores ([1, N, classes]).
+    """
+    if len(outputs) == 2 and outputs[0].shape[-1] == 4:
+        boxes = outputs[0].reshape(-1, 4)
+        scores = outputs[1].reshape(len(boxes), -1)
+        rows = np.empty((len(boxes), YOLO_BOX_FIELDS + scores.shape[1]), dtype=np.float32)
+        rows[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2
+        rows[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2
+        rows[:, 2] = boxes[:, 2] - boxes[:, 0]
+        rows[:, 3] = boxes[:, 3] - boxes[:, 1]
+        rows[:, 4] = 1.0  # Class scores already include the objectness
+        rows[:, YOLO_BOX_FIELDS:] = scores
+        return [rows]
+    return [output.reshape(-1, output.shape[-1]) for output in outputs]
+
+
+class OpenCVBackend:
+    """A cv2.dnn network"""
+    name = 'opencv'
+    # A cv2.dnn.Net keeps its input blob as state, so calls must be serialized
+    thread_safe = False
+
+    def __init__(self, net, output_layers):
+        self.net = net
+        self.output_layers = output_layers
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        if self.output_layers:
+            return self.net.forward(self.output_layers)
+        return self.net.forward()
+
+    def get_stats(self):
+        return {'backend': self.name}
+
+
+class OnnxRuntimeBackend:
+    """An ONNX Runtime session on the CPU"""
+    name = 'onnxruntime'
+    thread_safe = True
+
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0, graph_optimization='all',
+                 optimized_model_path=None):
+        if not onnxruntime_available:
+            raise RuntimeError("onnxruntime is not installed")
+
+        levels = {
+            'disabled': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        }
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = levels[graph_optimization]
+        # Inter-op threads only help when independent graph branches can run in parallel
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+        if optimized_model_path:
+            # Save the optimized graph in ORT format, which loads without parsing or re-optimizing
+            options.optimized_model_filepath = optimized_model_path
+            options.add_session_config_entry('session.save_model_format', 'ORT')
+
+        self.model_path = model_path
+        self.settings = {
+            'intra_op_threads': intra_op_threads,
+            'inter_op_threads': inter_op_threads,
+            'graph_optimization': graph_optimization
+        }
+        self.net = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.net.get_inputs()[0].name
+        self.output_layers = [output.name for output in self.net.get_outputs()]
+
+    def forward(self, blob):
+        outputs = self.net.run(self.output_layers, {self.input_name: blob.astype(np.float32, copy=False)})
+        return to_darknet_rows(outputs)
+
+    def get_stats(self):
+        return dict(self.settings, backend=self.name, model=self.model_path)
+
+
+def quantize_onnx_model(model_path, int8_path):
+    """Write a dynamically quantized (INT8 weights) copy of an ONNX model"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(model_path, int8_path, weight_type=QuantType.QUInt8)
+    print(f"Wrote INT8 model {int8_path}")
+
+
+def load_onnxruntime_backend(weights_path, inference, cache=model_cache, config_path=None):
+    """
+    Create an ONNX Runtime backend for the ONNX export of a Darknet model
+    (exported from config_path and weights_path if there is no .onnx file).
+    The first load quantizes (if INT8 is requested) and optimizes the model and
+    caches the result; later loads use the cached ORT-format model until the
+    ONNX file changes.
+    """
+    if not onnxruntime_available:
+        raise RuntimeError("onnxruntime is not installed")
+    onnx_path = get_darknet_export(weights_path, config_path, cache)
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(f"No ONNX export at {onnx_path}")
+
+    # Thread counts don't change the converted model, so they aren't part of the entry name
+    settings = {'int8': inference['int8'], 'graph_optimization': inference['graph_optimization']}
+    name = cache.entry_name(onnx_path, settings)
+    metadata = cache.get(name, [onnx_path])
+    if metadata is not None:
+        # Already optimized, so don't spend time running the optimizers again
+        return OnnxRuntimeBackend(metadata['model'], inference['intra_op_threads'],
+                                  inference['inter_op_threads'], 'disabled')
+
+    model_path = onnx_path
+    artifacts = []
+    if inference['int8']:
+        int8_path = cache.artifact_path(name, '.int8.onnx')
+        try:
+            quantize_onnx_model(onnx_path, int8_path)
+            model_path = int8_path
+            artifacts.append(int8_path)
+        except Exception as e:
+            print(f"INT8 quantization failed, using the FP32 model: {e}")
+            settings['int8'] = False
+
+    optimized_path = cache.artifact_path(name, '.ort')
+    backend = OnnxRuntimeBackend(model_path, inference['intra_op_threads'], inference['inter_op_threads'],
+                                 inference['graph_optimization'], optimized_model_path=optimized_path)
+    if settings['int8'] == inference['int8'] and os.path.exists(optimized_path):
+        cache.put(name, [onnx_path], artifacts + [optimized_path], model=optimized_path,
+                  input_name=backend.input_name, output_layers=backend.output_layers, settings=settings)
+    return backend
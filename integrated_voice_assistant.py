@@ -3,7 +3,6 @@ Direct integration of voice assistant functionality into main Flask app
 """
 import threading
 import time
-import pyttsx3
 import speech_recognition as sr
 from flask import jsonify
 
@@ -17,13 +16,9 @@ class IntegratedVoiceAssistant:
         self.recognizer.dynamic_energy_threshold = True
         self.wake_word = "helmet"
         
-        # Initialize text-to-speech engine
-        try:
-            self.engine = pyttsx3.init()
-            self.engine.setProperty('rate', 150)
-        except Exception as e:
-            print(f"Warning: TTS initialization failed: {e}")
-            self.engine = None
+        # The text-to-speech engine is slow to start, so it is created later by
+        # load_engine() (on the app's background loader); routes are registered now
+        self.engine = None
         
         # Register route for status checks
         @app.route('/api/voice_assistant/status', methods=['GET'])
@@ -43,6 +38,18 @@ class IntegratedVoiceAssistant:
                 'timestamp': self.transcript_timestamp
             })
     
+    def load_engine(self):
+        """Initialize the text-to-speech engine; until then speak() only prints"""
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+            engine.setProperty('rate', 150)
+            self.engine = engine
+        except Exception as e:
+            print(f"Warning: TTS initialization failed: {e}")
+            self.engine = None
+        return self
+    
     def start(self):
         """Start the voice assistant in a background thread"""
         if not self.is_running:
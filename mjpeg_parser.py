@@ -0,0 +1,140 @@
+"""
+Streaming parser for multipart/x-mixed-replace (MJPEG) camera streams.
+Works over a single growing bytearray, resumes every search where the last one
+stopped and skips straight over the JPEG body when the part headers carry a
+Content-Length, so parsing cost is linear in the stream size. Frames are
+returned as zero-copy memoryviews into the parser buffer.
+"""
+import re
+
+SOI = b'\xff\xd8'  # JPEG start-of-image marker
+EOI = b'\xff\xd9'  # JPEG end-of-image marker
+HEADER_END = b'\r\n\r\n'
+CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+
+# Compact the buffer once at least this many consumed bytes sit in front of it
+COMPACT_THRESHOLD = 64 * 1024
+
+# Part headers longer than this are not looked at for a Content-Length
+MAX_HEADER_BYTES = 512
+
+
+class MJPEGParser:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = 0        # First byte not yet consumed
+        self.soi = -1         # Start of the frame in progress, once found
+        self.scan = 0         # Where the next marker search resumes
+        self.length = -1      # Content-Length of the frame in progress, if its headers had one
+
+        # Statistics
+        self.frames = 0
+        self.bytes_fed = 0
+        self.length_hits = 0  # Frames delimited by Content-Length instead of a marker search
+
+    def compact(self):
+        """Drop consumed bytes from the front of the buffer"""
+        if self.start < COMPACT_THRESHOLD or self.start < len(self.buffer) // 2:
+            return
+        try:
+            del self.buffer[:self.start]
+        except BufferError:
+            # A caller still holds views into the buffer: leave them valid and
+            # continue in a fresh buffer holding only the unconsumed bytes
+            self.buffer = bytearray(memoryview(self.buffer)[self.start:])
+        if self.soi != -1:
+            self.soi -= self.start
+        self.scan -= self.start
+        self.start = 0
+
+    def append(self, data):
+        """Add bytes to the end of the buffer"""
+        try:
+            self.buffer += data
+        except BufferError:
+            # Same as compact(): never resize a buffer that views still point into
+            self.buffer = bytearray(memoryview(self.buffer)[self.start:]) + data
+            if self.soi != -1:
+                self.soi -= self.start
+            self.scan -= self.start
+            self.start = 0
+
+    def feed(self, data):
+        """
+        Add a chunk of stream data and return the frames it completed.
+        Each frame is a memoryview of one complete JPEG.
+        """
+        self.bytes_fed += len(data)
+        self.compact()
+        self.append(data)
+
+        frames = []
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+        return frames
+
+    def next_frame(self):
+        """Return the next complete frame in the buffer, or None if more data is needed"""
+        buffer = self.buffer
+
+        # Find the start of the next JPEG
+        if self.soi == -1:
+            soi = buffer.find(SOI, max(self.scan, self.start))
+            if soi == -1:
+                # Keep the last byte in case the marker straddles two chunks
+                self.scan = max(self.start, len(buffer) - 1)
+                return None
+            self.soi = soi
+            self.scan = soi + 2
+
+            # Use the part's Content-Length to jump straight to the end of the body
+            header = bytes(buffer[max(self.start, soi - MAX_HEADER_BYTES):soi])
+            match = CONTENT_LENGTH.search(header) if header.endswith(HEADER_END) else None
+            self.length = int(match.group(1)) if match else -1
+
+        # Content-Length known: the frame is complete once that many bytes are buffered
+        if self.length != -1:
+            end = self.soi + self.length
+            if len(buffer) < end:
+                return None
+            if buffer[end - 2:end] == EOI:
+                self.length_hits += 1
+                return self.emit(end)
+            # The length didn't match the image, fall back to searching for the marker
+            self.length = -1
+
+        # Otherwise search for the end marker, only after the start marker
+        eoi = buffer.find(EOI, self.scan)
+        if eoi == -1:
+            self.scan = max(self.soi + 2, len(buffer) - 1)
+            return None
+        return self.emit(eoi + 2)
+
+    def emit(self, end):
+        """Return the frame ending at end and move past it"""
+        frame = memoryview(self.buffer)[self.soi:end]
+        self.start = end
+        self.scan = end
+        self.soi = -1
+        self.length = -1
+        self.frames += 1
+        return frame
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes_fed,
+            'content_length_frames': self.length_hits,
+            'buffered': len(self.buffer) - self.start
+        }
+
+
+def iter_mjpeg_frames(chunks):
+    """Yield each JPEG frame (as a memoryview) from an iterable of stream chunks"""
+    parser = MJPEGParser()
+    for chunk in chunks:
+        for frame in parser.feed(chunk):
+            yield frame
@@ -0,0 +1,104 @@
+"""
+On-disk cache of converted models.
+Preparing a network for inference (quantizing it, optimizing its graph) is
+slow and gives the same result on every start. The first load writes the
+prepared model to models/cache together with a JSON metadata file (output
+names, settings, the source files' sizes and modification times); later
+starts load the prepared form directly. When a source file changes, its
+fingerprint no longer matches and the entry is rebuilt.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'cache')
+
+
+def fingerprint(paths):
+    """Identify the current version of some files by path, size and modification time"""
+    result = []
+    for path in paths:
+        stat = os.stat(path)
+        result.append({'path': os.path.realpath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    return result
+
+
+class ConvertedModelCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0  # Misses caused by a changed source file
+
+    def entry_name(self, source_path, settings):
+        """Cache entry name for a source model converted with the given settings"""
+        digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:10]
+        return f"{os.path.splitext(os.path.basename(source_path))[0]}-{digest}"
+
+    def artifact_path(self, name, suffix):
+        """Where a file belonging to a cache entry is stored"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, name + suffix)
+
+    def metadata_path(self, name):
+        return os.path.join(self.cache_dir, name + '.json')
+
+    def get(self, name, sources):
+        """
+        Return the metadata of an up-to-date cache entry, or None if it is missing,
+        was built from different source files or lost one of its artifacts
+        """
+        with self.lock:
+            try:
+                with open(self.metadata_path(name)) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if metadata.get('sources') != fingerprint(sources):
+                print(f"Source of cached model {name} changed, rebuilding")
+                self.misses += 1
+                self.rebuilds += 1
+                return None
+            if not all(os.path.exists(path) for path in metadata.get('artifacts', [])):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return metadata
+
+    def put(self, name, sources, artifacts, **metadata):
+        """Record a freshly built entry; artifacts are the files it consists of"""
+        metadata.update({
+            'sources': fingerprint(sources),
+            'artifacts': list(artifacts),
+            'created': time.time()
+        })
+        path = self.metadata_path(name)
+        with self.lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Write to a temporary file first so a crash never leaves half a metadata file
+            with open(path + '.tmp', 'w') as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(path + '.tmp', path)
+        return metadata
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'cache_dir': self.cache_dir,
+                'hits': self.hits,
+                'misses': self.misses,
+                'rebuilds': self.rebuilds
+            }
+
+
+# Single cache shared by every model in the process
+model_cache = ConvertedModelCache()
@@ -0,0 +1,185 @@
+"""
+Process-wide registry of loaded detection networks.
+Detectors ask the registry for a network instead of reading the model files
+themselves, so the same weights are parsed and held in memory only once.
+Each entry runs on an inference backend (see inference_backends.py) chosen by
+the detector's inference settings.
+"""
+import cv2
+import os
+import threading
+import time
+
+from inference_backends import OpenCVBackend, load_onnxruntime_backend, make_inference_config
+from model_cache import model_cache
+from model_store import model_store
+
+
+def get_resident_memory():
+    """Return the resident memory of this process in bytes, or None if unknown"""
+    try:
+        # Linux exposes the resident page count as the second field of statm
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return None
+
+
+def get_output_layer_names(net):
+    """Return the names of the unconnected output layers of a network"""
+    layer_names = net.getLayerNames()
+    try:
+        # OpenCV 4.5.4+
+        return [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
+    except:
+        # Older OpenCV versions
+        return [layer_names[i[0] - 1] for i in net.getUnconnectedOutLayers()]
+
+
+class ModelEntry:
+    """A loaded network shared by every detector that uses the same model files"""
+    def __init__(self, key, backend, load_time, resident_bytes):
+        self.key = key
+        self.backend = backend
+        self.net = backend.net
+        self.output_layers = backend.output_layers
+        self.load_time = load_time
+        self.resident_bytes = resident_bytes
+        self.users = 0
+
+        # Backends that keep per-call state (a cv2.dnn.Net keeps its input blob)
+        # must not have calls from different detectors interleave
+        self.lock = threading.Lock()
+
+    def forward(self, blob):
+        """Run the network on a blob and return the raw output tensors"""
+        if self.backend.thread_safe:
+            return self.backend.forward(blob)
+        with self.lock:
+            return self.backend.forward(blob)
+
+    def get_stats(self):
+        """Return load statistics for this model"""
+        framework, model_path, config_path, backend, target, _ = self.key
+        return {
+            'framework': framework,
+            'model': model_path,
+            'config': config_path,
+            'backend': backend,
+            'target': target,
+            'inference': self.backend.get_stats(),
+            'load_time': round(self.load_time, 3),
+            'resident_bytes': self.resident_bytes,
+            'users': self.users
+        }
+
+
+class ModelRegistry:
+    """
+    Loads each network once per process, keyed by model file, config file and
+    backend, and hands the same ModelEntry to every caller.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        # Loader for each supported model framework
+        self.loaders = {
+            'darknet': lambda model_path, config_path: cv2.dnn.readNetFromDarknet(config_path, model_path),
+            'tensorflow': lambda model_path, config_path: cv2.dnn.readNetFromTensorflow(model_path, config_path)
+        }
+
+    def make_key(self, framework, model_path, config_path, backend, target, inference):
+        """Build the registry key, normalising paths so relative and absolute paths match"""
+        return (
+            framework,
+            os.path.realpath(model_path),
+            os.path.realpath(config_path) if config_path else None,
+            int(backend),
+            int(target),
+            tuple(sorted(inference.items()))
+        )
+
+    def get(self, framework, model_path, config_path=None,
+            backend=cv2.dnn.DNN_BACKEND_OPENCV, target=cv2.dnn.DNN_TARGET_CPU,
+            output_layers=True, inference=None):
+        """
+        Return the shared ModelEntry for the given model files, loading it on first use.
+        inference selects the inference backend (see inference_backends.py); only
+        Darknet models can run on ONNX Runtime, others always use OpenCV.
+        """
+        inference = make_inference_config(inference)
+        if framework != 'darknet':
+            inference['backend'] = 'opencv'
+        key = self.make_key(framework, model_path, config_path, backend, target, inference)
+
+        # Hold the lock while loading so two detectors starting together
+        # don't both parse the same weights
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.load(key, framework, model_path, config_path, backend, target, output_layers, inference)
+                self.entries[key] = entry
+            entry.users += 1
+            return entry
+
+    def load(self, key, framework, model_path, config_path, backend, target, output_layers, inference):
+        """Read a network from disk and measure its load time and memory cost"""
+        if framework not in self.loaders:
+            raise ValueError(f"Unsupported model framework: {framework}")
+
+        memory_before = get_resident_memory()
+        start_time = time.time()
+
+        inference_backend = None
+        if inference['backend'] in ('auto', 'onnxruntime'):
+            try:
+                # Loads the cached ONNX export instead of parsing the Darknet files
+                inference_backend = load_onnxruntime_backend(model_path, inference, config_path=config_path)
+            except Exception as e:
+                print(f"Can't run {model_path} on ONNX Runtime, using OpenCV instead: {e}")
+
+        if inference_backend is None:
+            net = self.loaders[framework](model_path, config_path)
+            net.setPreferableBackend(backend)
+            net.setPreferableTarget(target)
+            layers = get_output_layer_names(net) if output_layers else []
+            inference_backend = OpenCVBackend(net, layers)
+
+        load_time = time.time() - start_time
+        memory_after = get_resident_memory()
+
+        # Fall back to the weights file size when the process RSS isn't available
+        if memory_before is not None and memory_after is not None:
+            resident_bytes = max(0, memory_after - memory_before)
+        else:
+            resident_bytes = os.path.getsize(model_path)
+
+        print(f"Loaded {framework} model {model_path} on {inference_backend.name} in {load_time:.2f}s "
+              f"({resident_bytes / (1024 * 1024):.1f} MB resident)")
+        return ModelEntry(key, inference_backend, load_time, resident_bytes)
+
+    def get_darknet(self, config_path, weights_path, **kwargs):
+        """Return the shared entry for a Darknet (YOLO) model"""
+        return self.get('darknet', weights_path, config_path, **kwargs)
+
+    def get_tensorflow(self, model_path, config_path, **kwargs):
+        """Return the shared entry for a TensorFlow frozen graph"""
+        return self.get('tensorflow', model_path, config_path, output_layers=False, **kwargs)
+
+    def get_stats(self):
+        """Return per-model load time and resident size"""
+        with self.lock:
+            models = [entry.get_stats() for entry in self.entries.values()]
+        return {
+            'models': models,
+            'converted_model_cache': model_cache.get_stats(),
+            'model_store': model_store.get_stats(),
+            'total_load_time': round(sum(m['load_time'] for m in models), 3),
+            'total_resident_bytes': sum(m['resident_bytes'] for m in models)
+        }
+
+
+# Single registry shared by every detector in the process
+model_registry = ModelRegistry()
@@ -0,0 +1,149 @@
+"""
+Local store of the model and cascade files the detectors load.
+models/manifest.json lists every file by name with its path, download URL,
+size and SHA-256. The serving process never downloads anything: detectors ask
+the store for a file and get its path if it is present and matches the
+manifest, or None, and carry on without that model. Files are fetched
+beforehand with the separate prefetch command (python prefetch_models.py).
+
+Verifying a file is a stat() against the manifest size plus a hash lookup in
+models/cache/hashes.json, keyed by path, size and modification time, so only
+files that changed since the last start are hashed again. A file whose
+entry has no checksum yet can't be verified: it is still used, so the app
+keeps working, but with a warning, and it doesn't count as verified in the
+stats. The manifest is only ever changed by hand (and committed); nothing
+writes to it at runtime.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from model_cache import CACHE_DIR
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(ROOT_DIR, 'models', 'manifest.json')
+HASH_CACHE_PATH = os.path.join(CACHE_DIR, 'hashes.json')
+
+# Verification results
+OK = 'ok'
+UNPINNED = 'unpinned'          # Present, but the manifest has no checksum to verify it against
+MISSING = 'missing'
+SIZE_MISMATCH = 'size_mismatch'
+CHECKSUM_MISMATCH = 'checksum_mismatch'
+USABLE = (OK, UNPINNED)         # Unpinned files are used unverified, with a warning
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json(path, data):
+    """Write JSON through a temporary file so a crash never leaves half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+class ModelStore:
+    def __init__(self, manifest_path=MANIFEST_PATH, hash_cache_path=HASH_CACHE_PATH, root_dir=ROOT_DIR):
+        self.manifest_path = manifest_path
+        self.hash_cache_path = hash_cache_path
+        self.root_dir = root_dir
+        self.lock = threading.Lock()
+
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.hash_cache = self.load_hash_cache()
+        self.results = {}  # name -> (stat key, verification result) for this process
+
+        # Statistics
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+
+    def load_hash_cache(self):
+        try:
+            with open(self.hash_cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def path(self, name):
+        """Absolute path of a manifest entry"""
+        return os.path.join(self.root_dir, self.manifest[name]['path'])
+
+    def file_hash(self, path, stat):
+        """SHA-256 of a file, reusing the cached value while its size and mtime are unchanged"""
+        cached = self.hash_cache.get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        digest = sha256_file(path)
+        self.hashed_files += 1
+        self.hashed_bytes += stat.st_size
+        self.hash_cache[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        try:
+            write_json(self.hash_cache_path, self.hash_cache)
+        except OSError as e:
+            print(f"Could not save the model hash cache: {e}")
+        return digest
+
+    def verify(self, name):
+        """Check one file against the manifest; returns one of the verification results"""
+        entry = self.manifest[name]
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return MISSING
+
+        with self.lock:
+            key = (stat.st_size, stat.st_mtime_ns)
+            known = self.results.get(name)
+            if known is not None and known[0] == key:
+                return known[1]
+
+            if entry.get('size') is not None and entry['size'] != stat.st_size:
+                result = SIZE_MISMATCH
+            elif entry.get('sha256') is None:
+                result = UNPINNED
+            elif self.file_hash(path, stat) != entry['sha256']:
+                result = CHECKSUM_MISMATCH
+            else:
+                result = OK
+            self.results[name] = (key, result)
+
+        if result == UNPINNED and known is None:
+            print(f"Warning: model file {path} has no checksum in the manifest and is used unverified")
+        elif result not in USABLE:
+            print(f"Model file {path} failed verification ({result}); run python prefetch_models.py {name}")
+        return result
+
+    def get(self, name):
+        """Path of a verified file, or None if it is missing or doesn't match the manifest"""
+        if name not in self.manifest:
+            raise KeyError(f"'{name}' is not in the model manifest {self.manifest_path}")
+        return self.path(name) if self.verify(name) in USABLE else None
+
+    def get_stats(self):
+        files = {name: self.verify(name) for name in self.manifest}
+        return {
+            'manifest': self.manifest_path,
+            'files': files,
+            'usable': sum(1 for result in files.values() if result in USABLE),
+            'verified': sum(1 for result in files.values() if result == OK),
+            'unverified': [name for name, result in files.items() if result == UNPINNED],
+            'hashed_files': self.hashed_files,
+            'hashed_bytes': self.hashed_bytes
+        }
+
+
+# Single store shared by every detector in the process
+model_store = ModelStore()
@@ -0,0 +1,117 @@
+"""
+Incremental motion detection at a reduced analysis resolution.
+The engine keeps its own state from the previous frame (the blurred,
+downscaled grayscale, or a background model), so each new frame costs one
+resize, one small blur and the comparison. Changed areas are returned as
+bounding boxes in full-frame coordinates.
+
+Methods:
+    'diff'            - difference against the previous frame
+    'running_average' - difference against an exponentially weighted background
+    'mog2'            - OpenCV's adaptive Gaussian-mixture background subtractor
+"""
+import time
+import cv2
+import numpy as np
+
+MOTION_METHODS = ('diff', 'running_average', 'mog2')
+
+
+class MotionEngine:
+    def __init__(self, method='diff', analysis_width=320, threshold=25, min_area=500,
+                 blur_size=21, background_alpha=0.05):
+        if method not in MOTION_METHODS:
+            raise ValueError(f"Unknown motion method '{method}', expected one of {MOTION_METHODS}")
+        self.method = method
+        self.analysis_width = analysis_width
+        self.threshold = threshold
+        self.min_area = min_area          # In full-frame pixels
+        self.blur_size = blur_size        # At full resolution; scaled down with the frame
+        self.background_alpha = background_alpha
+
+        # State carried between frames
+        self.previous = None              # Blurred small gray of the previous frame
+        self.background = None            # Running-average background (float32)
+        self.subtractor = None            # MOG2 model
+        self.frame_shape = None
+
+        # Statistics
+        self.frames = 0
+        self.last_time = 0.0
+
+    def reset(self):
+        """Forget the previous frame and background model"""
+        self.previous = None
+        self.background = None
+        self.subtractor = None
+        self.frame_shape = None
+
+    def get_analysis_size(self, width, height):
+        """Size (width, height) the motion analysis runs at for a frame"""
+        if width <= self.analysis_width:
+            return width, height
+        return self.analysis_width, max(1, round(height * self.analysis_width / width))
+
+    def update(self, context):
+        """
+        Compare the frame in context with the engine's state and update it.
+        Returns the changed regions as [x, y, w, h] lists in full-frame coordinates,
+        or None if there was no previous state to compare against yet.
+        """
+        start_time = time.perf_counter()
+        width, height = context.width, context.height
+        size = self.get_analysis_size(width, height)
+        scale = size[0] / width
+
+        # A different stream or resolution: start over
+        if self.frame_shape != (height, width):
+            self.reset()
+            self.frame_shape = (height, width)
+
+        # Blur at the analysis resolution with a kernel scaled to match the full-size one
+        ksize = max(3, int(self.blur_size * scale) | 1)
+        small = cv2.GaussianBlur(context.get_resized_gray(size), (ksize, ksize), 0)
+
+        mask = None
+        if self.method == 'diff':
+            if self.previous is not None:
+                mask = cv2.threshold(cv2.absdiff(self.previous, small), self.threshold, 255, cv2.THRESH_BINARY)[1]
+            self.previous = small
+        elif self.method == 'running_average':
+            if self.background is not None:
+                diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+                mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]
+                cv2.accumulateWeighted(small, self.background, self.background_alpha)
+            else:
+                self.background = small.astype(np.float32)
+        else:
+            if self.subtractor is None:
+                self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+                self.subtractor.apply(small)
+            else:
+                mask = self.subtractor.apply(small)
+
+        regions = None
+        if mask is not None:
+            # Fill holes, then keep the bounding boxes of the large changed areas
+            mask = cv2.dilate(mask, None, iterations=2)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            min_area = self.min_area * scale * scale
+            regions = []
+            for contour in contours:
+                if cv2.contourArea(contour) > min_area:
+                    x, y, w, h = cv2.boundingRect(contour)
+                    regions.append([int(x / scale), int(y / scale),
+                                    min(width, int(np.ceil(w / scale))), min(height, int(np.ceil(h / scale)))])
+
+        self.frames += 1
+        self.last_time = time.perf_counter() - start_time
+        return regions
+
+    def get_stats(self):
+        return {
+            'method': self.method,
+            'analysis_width': self.analysis_width,
+            'frames': self.frames,
+            'last_ms': round(self.last_time * 1000, 3)
+        }
@@ -25,30 +25,78 @@ try:
 except ImportError:
     precision_detector_available = False
 
+from object_tracker import OpticalFlowTracker
+from detection_feed import DetectionFeed
+from frame_context import FrameContext
+from frame_pool import FrameBufferPool
+from motion_engine import MotionEngine
+from stage_executor import StageExecutor
+from pipeline import Pipeline, Stage, load_pipeline_config
+from frame_cache import FrameResultCache, dhash, make_thumbnail
+
+# Box colors used when drawing detections (BGR)
+DETECTION_COLORS = {
+    'person': (0, 255, 0),     # Green for humans
+    'face': (0, 255, 0),       # Green for faces
+    'vehicle': (255, 165, 0),  # Orange for vehicles
+    'other': (255, 0, 0)       # Red for other objects
+}
+VEHICLE_LABELS = ['car', 'truck', 'bus', 'motorcycle', 'bicycle']
+
 class ObjectDetector:
     """
     Handles object detection using OpenCV and MediaPipe.
     This class processes video frames to detect humans and vehicles.
     """
-    def __init__(self):
+    def __init__(self, detection_interval=1, min_tracking_confidence=0.5, motion_gating=False, annotate=True,
+                 motion_method='diff', motion_width=320, cores_per_stream=1, pipeline='default',
+                 frame_cache_size=32, frame_cache_threshold=4, inference=None, share_models_with=None,
+                 stream=None, detection_feed=None):
+        # Settings a detector for another stream is created with (see make_stream_detector)
+        self.settings = {
+            'detection_interval': detection_interval, 'min_tracking_confidence': min_tracking_confidence,
+            'motion_gating': motion_gating, 'annotate': annotate, 'motion_method': motion_method,
+            'motion_width': motion_width, 'cores_per_stream': cores_per_stream, 'pipeline': pipeline,
+            'frame_cache_size': frame_cache_size, 'frame_cache_threshold': frame_cache_threshold,
+            'inference': inference
+        }
+        
+        # Name of the camera stream this detector follows; its motion, tracking and
+        # frame-cache state only make sense for consecutive frames of that one stream
+        self.stream = stream
+        
         # Initialize MediaPipe face detection
         self.mp_face_detection = mp.solutions.face_detection
         self.mp_drawing = mp.solutions.drawing_utils
         
+        # The models that keep no per-stream state (MediaPipe faces, HOG, the Haar cascade)
+        # are taken from share_models_with when given, so detectors for more streams
+        # don't load them again; the YOLO and SSD networks are shared by model_registry
+        shared = share_models_with
+        
         # Initialize face detector with higher confidence threshold for accuracy
-        self.face_detector = self.mp_face_detection.FaceDetection(
-            model_selection=1,  # 1 for full range detection (up to 5m)
-            min_detection_confidence=0.6
-        )
+        if shared is not None:
+            self.face_detector = shared.face_detector
+            self.face_detector_lock = shared.face_detector_lock
+        else:
+            self.face_detector = self.mp_face_detection.FaceDetection(
+                model_selection=1,  # 1 for full range detection (up to 5m)
+                min_detection_confidence=0.6
+            )
+            self.face_detector_lock = threading.Lock()  # The MediaPipe graph takes one frame at a time
         
         # Use OpenCV's DNN module for object detection instead of MediaPipe
         # Load COCO model for general object detection
         self.object_net = self.load_object_detection_model()
+        self.object_net_lock = threading.Lock()
         self.object_classes = self.load_coco_classes()
         
-        # Initialize OpenCV-based person detector using HOG
-        self.hog = cv2.HOGDescriptor()
-        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Initialize OpenCV-based person detector using HOG (detectMultiScale is safe to call concurrently)
+        if shared is not None:
+            self.hog = shared.hog
+        else:
+            self.hog = cv2.HOGDescriptor()
+            self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
         
         # Detection results
         self.humans_count = 0
@@ -57,8 +105,9 @@ class ObjectDetector:
         self.light_level = 500  # Default light level (0-1000)
         self.closest_distance = 3.0  # Default distance in meters
         self.motion_detected = False
-        self.last_frame = None
-        self.current_frame = None
+        
+        # Reusable full-frame buffers for the annotated output
+        self.frame_pool = FrameBufferPool()
         
         # Hardware info
         self.resolution = "640x480"
@@ -68,16 +117,62 @@ class ObjectDetector:
         # Threading lock
         self.lock = threading.Lock()
         
-        # Motion detection parameters
+        # Frames go through detect_objects / apply_worker_result one at a time, so callers
+        # on different threads can't interleave their updates to the per-stream state
+        self.frame_lock = threading.Lock()
+        
+        # Independent detector stages of a frame (faces, SSD, HOG) run concurrently
+        # on up to cores_per_stream threads; 1 keeps everything on the calling thread
+        self.stage_executor = StageExecutor(cores_per_stream)
+        
+        # Motion detection parameters. The engine works on a downscaled copy of the
+        # frame (motion_width pixels wide) and keeps its own previous-frame state
         self.motion_threshold = 25
         self.min_motion_area = 500  # Minimum contour area to be considered motion
         self.last_motion_time = time.time() - 10  # Initialize to avoid false positives at start
+        self.motion_regions = []  # Bounding boxes of the changed areas in the last frame
+        self.motion_engine = MotionEngine(method=motion_method, analysis_width=motion_width,
+                                          threshold=self.motion_threshold, min_area=self.min_motion_area)
+        
+        # Motion-gated inference: reuse the previous results when nothing moved and
+        # only run the detectors on the changed areas when little of the frame moved
+        self.motion_gating = motion_gating
+        self.max_gated_area = 0.5  # Fraction of the frame above which the full cascade runs
+        self.gate_region_padding = 0.25  # Context added around each changed area
+        self.min_gate_region_size = 160  # Smallest region the detectors are run on
+        self.has_detection_results = False
+        self.gate_stats = {'reused': 0, 'partial': 0, 'full': 0}
+        
+        # Detect-every-Nth-frame mode: run the detectors every detection_interval
+        # frames (1 = every frame) and follow the boxes with optical flow in between,
+        # running the detectors early if tracking confidence drops
+        self.detection_interval = max(1, int(detection_interval))
+        self.min_tracking_confidence = min_tracking_confidence
+        self.tracker = OpticalFlowTracker()
+        self.frames_since_detection = 0
+        
+        # Detections from the last frame as dicts with category, label, box and confidence,
+        # and the detector that produced them
+        self.last_detections = []
+        self.last_detection_source = None
+        
+        # Detections-only mode: with annotate off nothing is drawn on the frames and
+        # the browser renders the boxes from the detection feed instead
+        self.annotate = annotate
+        self.detection_feed = detection_feed if detection_feed is not None else DetectionFeed()
+        
+        # What the shared preprocessing computed for the last frame
+        self.last_preprocessing = {}
+        
+        # Repeated or near-identical frames (hashes within frame_cache_threshold bits)
+        # reuse the detections of the earlier frame without running any inference
+        self.frame_cache = FrameResultCache(max_entries=frame_cache_size, threshold=frame_cache_threshold)
 
         # Initialize improved detector for better human/vehicle detection
         self.improved_detector = None
         if improved_detector_available:
             try:
-                self.improved_detector = ImprovedDetector()
+                self.improved_detector = ImprovedDetector(inference)
                 print("Using improved detector for humans and vehicles")
             except Exception as e:
                 print(f"Failed to initialize improved detector: {e}")
@@ -85,7 +180,9 @@ class ObjectDetector:
 
         # Initialize the Haar Cascade vehicle detector
         self.car_detector = None
-        if car_detector_available:
+        if shared is not None:
+            self.car_detector = shared.car_detector
+        elif car_detector_available:
             try:
                 self.car_detector = HaarVehicleDetector()
                 print("Using Haar Cascade for vehicle detection")
@@ -97,11 +194,17 @@ class ObjectDetector:
         self.precision_detector = None
         if precision_detector_available:
             try:
-                self.precision_detector = PrecisionDetector()
+                self.precision_detector = PrecisionDetector(inference)
                 print("Using high-precision detector for humans and vehicles")
             except Exception as e:
                 print(f"Failed to initialize precision detector: {e}")
                 self.precision_detector = None
+        
+        # The per-frame stages and the detectors they use come from a preset name
+        # or JSON file (see pipeline.py), so deployments can trim the cascade
+        self.pipeline_config = load_pipeline_config(pipeline)
+        self.enabled_detectors = set(self.pipeline_config['detectors'])
+        self.pipeline = self.build_pipeline(self.pipeline_config['stages'])
     
     def load_object_detection_model(self):
         """Load a pre-trained object detection model from OpenCV"""
@@ -145,42 +248,193 @@ class ObjectDetector:
         """Process a frame and detect objects"""
         if frame is None or frame.size == 0:
             return frame, 0, 0, 0
-            
-        # Store the frame for motion detection
-        with self.lock:
-            if self.current_frame is not None:
-                self.last_frame = self.current_frame.copy()
-            self.current_frame = frame.copy()
         
-        # Get frame dimensions
+        # Each configured stage reads its inputs from the record and adds its outputs
+        with self.frame_lock:
+            record = self.pipeline.run({'frame': frame})
+            annotated_frame = record['result'][0]
+            
+            return annotated_frame, self.humans_count, self.vehicles_count, self.light_level
+    
+    def make_stream_detector(self, stream):
+        """
+        A detector with the same settings for another camera stream. It shares this
+        detector's models and detection feed but keeps its own per-stream state
+        """
+        return ObjectDetector(**self.settings, share_models_with=self, stream=stream,
+                              detection_feed=self.detection_feed)
+    
+    def warm_up(self, width=640, height=480):
+        """
+        Run every enabled detector once on a dummy frame, so the networks allocate
+        their buffers before the first real frame. Leaves no detections behind.
+        """
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8), (9, 9), 0)
+        self.run_detectors(frame, FrameContext(frame), draw=False)
+    
+        self.last_detections = []
+        self.last_detection_source = None
+    
+    def build_pipeline(self, stage_names):
+        """Assemble the per-frame pipeline from stage names, checking that every input is produced"""
+        stages = {
+            'preprocess': Stage('preprocess', self.stage_preprocess, ['frame'], ['context']),
+            'cache_lookup': Stage('cache_lookup', self.stage_cache_lookup, ['frame', 'context'],
+                                  ['frame_hash', 'thumbnail', 'result']),
+            'motion': Stage('motion', self.stage_motion, ['context'], ['motion_analyzed']),
+            'motion_gate': Stage('motion_gate', self.stage_motion_gate,
+                                 ['frame', 'context', 'motion_analyzed'], ['result', 'detectors_ran']),
+            'tracker': Stage('tracker', self.stage_tracker, ['frame', 'context'], ['result']),
+            'detectors': Stage('detectors', self.stage_detectors, ['frame', 'context'], ['result', 'detectors_ran']),
+            'cache_store': Stage('cache_store', self.stage_cache_store,
+                                 ['frame', 'frame_hash', 'thumbnail', 'result'], []),
+            'distance': Stage('distance', self.stage_distance, ['frame', 'result'], ['distance']),
+            'annotate': Stage('annotate', self.stage_annotate, ['result'], []),
+            'publish': Stage('publish', self.stage_publish, ['context', 'result'], [])
+        }
+        return Pipeline('frame', [stages[name] for name in stage_names], inputs=['frame'])
+    
+    def stage_preprocess(self, record):
+        """Set up the shared per-frame preprocessing and measure the light level"""
+        frame = record['frame']
         height, width = frame.shape[:2]
         self.resolution = f"{width}x{height}"
         
+        # Grayscale, RGB, blobs etc. are computed once here and shared by every stage
+        context = FrameContext(frame)
+        
         # Analyze light level from frame brightness
-        self.analyze_brightness(frame)
+        self.analyze_brightness(frame, context)
+        return {'context': context}
+    
+    def stage_cache_lookup(self, record):
+        """Reuse the detections of a recent frame that looks the same"""
+        frame, context = record['frame'], record['context']
+        thumbnail = context.get('thumbnail', 'thumbnail', lambda: make_thumbnail(context.get_gray()))
+        frame_hash = dhash(thumbnail)
+        cached = self.frame_cache.lookup(frame_hash, thumbnail, frame.shape)
+        if cached is None:
+            return {'frame_hash': frame_hash, 'thumbnail': thumbnail, 'result': None}
+        
+        self.last_detection_source = cached['source']
+        detections = [dict(d, box=list(d['box'])) for d in cached['detections']]
+        return {'frame_hash': frame_hash, 'thumbnail': thumbnail, 'result': self.apply_detections(frame, detections)}
+    
+    def stage_cache_store(self, record):
+        """Remember freshly detected results for frames that repeat"""
+        if record.get('detectors_ran'):
+            self.frame_cache.store(record['frame_hash'], record['thumbnail'], record['frame'].shape, {
+                'source': self.last_detection_source,
+                'detections': [dict(d, box=list(d['box'])) for d in self.last_detections]
+            })
+        return {}
+    
+    def stage_motion(self, record):
+        """Analyze motion against the previous frame (false on the first frame of a stream)"""
+        return {'motion_analyzed': self.detect_motion(record['context'])}
+    
+    def stage_motion_gate(self, record):
+        """Let the motion regions decide how much of the frame needs the detectors"""
+        result = record.get('result')
+        detectors_ran = False
+        if result is None and self.motion_gating and record['motion_analyzed'] and self.has_detection_results:
+            result = self.run_motion_gate(record['frame'], record['context'])
+            detectors_ran = result is not None and len(self.motion_regions) > 0
+        return {'result': result, 'detectors_ran': detectors_ran}
+    
+    def stage_tracker(self, record):
+        """Between detector runs, carry the previous boxes forward with the tracker"""
+        result = record.get('result')
+        if result is None and self.detection_interval > 1:
+            if self.frames_since_detection < self.detection_interval - 1 and self.tracker.prev_gray is not None:
+                detections = self.tracker.update(record['context'].get_gray())
+                if self.tracker.confidence >= self.min_tracking_confidence:
+                    self.frames_since_detection += 1
+                    result = self.apply_detections(record['frame'], detections)
+        return {'result': result}
+    
+    def stage_detectors(self, record):
+        """Run the detector cascade unless an earlier stage already produced this frame's results"""
+        result = record.get('result')
+        detectors_ran = record.get('detectors_ran', False)
+        if result is None:
+            result = self.run_detectors(record['frame'], record['context'])
+            self.has_detection_results = True
+            self.gate_stats['full'] += 1
+            detectors_ran = True
         
-        # Analyze motion if we have previous frames
-        if self.last_frame is not None:
-            self.detect_motion(self.last_frame, frame)
+        # Fresh detections restart the tracker
+        if detectors_ran and self.detection_interval > 1:
+            self.tracker.start(record['context'].get_gray(), self.last_detections)
+            self.frames_since_detection = 0
         
-        # Make a copy for drawing
-        annotated_frame = frame.copy()
+        # Update the counts
+        annotated_frame, humans_detected, vehicles_detected, faces_detected = result
+        self.humans_count = humans_detected + faces_detected
+        self.vehicles_count = vehicles_detected
+        self.faces_count = faces_detected
+        return {'result': result, 'detectors_ran': detectors_ran}
+    
+    def stage_distance(self, record):
+        """Estimate the distance to the closest detected object"""
+        height, width = record['frame'].shape[:2]
+        self.closest_distance = 10.0
+        for detection in self.last_detections:
+            x, y, w, h = detection['box']
+            size_ratio = (w * h) / (width * height)
+            self.closest_distance = min(self.closest_distance, self.estimate_distance(size_ratio, detection['label']))
+        return {'distance': self.closest_distance}
+    
+    def stage_annotate(self, record):
+        """Add a summary display on the frame"""
+        annotated_frame, humans_detected, vehicles_detected, faces_detected = record['result']
+        if self.annotate:
+            self.add_detection_summary(annotated_frame, humans_detected, faces_detected, vehicles_detected)
+        return {}
+    
+    def stage_publish(self, record):
+        """Publish the boxes for clients that draw their own overlays"""
+        self.last_preprocessing = record['context'].get_report()
+        self.detection_feed.publish(self.get_detection_snapshot())
+        return {}
+    
+    def run_detectors(self, frame, context=None, draw=True):
+        """
+        Run the full detector cascade on a frame
+        Returns: annotated_frame, humans, vehicles, faces (annotated only if draw is set)
+        """
+        if context is None:
+            context = FrameContext(frame)
+        annotate = self.annotate and draw
+        enabled = self.enabled_detectors
+        height, width = frame.shape[:2]
+        detections = []
+        source = None
+        
+        # The detectors only detect; whichever one's results are used draws them
+        # afterwards onto a single pooled copy of the frame
+        annotator = None
         
         # Reset counts
         humans_detected = 0
         vehicles_detected = 0
         faces_detected = 0
         
-        # At the beginning of the function, reset the closest distance to a large value
-        # so we can find the minimum in this frame
-        self.closest_distance = 10.0  # Reset to far distance at start of each detection
+        # Face detection doesn't depend on the other detectors, so start it now and
+        # collect the result when the faces are merged in below
+        face_stage = None
+        if 'faces' in enabled:
+            face_stage = self.stage_executor.submit('faces', self.detect_faces, context.get_rgb())
         
         # FIRST PRIORITY: Use precision detector (designed for maximum accuracy)
         precision_detection_success = False
-        if self.precision_detector and self.precision_detector.initialized:
+        if 'precision' in enabled and self.precision_detector and self.precision_detector.initialized:
             try:
                 # This detector focuses on minimizing false positives
-                humans_from_precision, vehicles_from_precision, annotated_frame = self.precision_detector.detect(frame)
+                humans_from_precision, vehicles_from_precision, _ = self.stage_executor.run(
+                    'precision', self.precision_detector.detect, frame, False, context)
+                annotator = self.precision_detector.draw_detections
                 
                 # Only use if we detected something
                 if humans_from_precision > 0 or vehicles_from_precision > 0:
@@ -188,19 +442,23 @@ class ObjectDetector:
                     humans_detected = humans_from_precision
                     vehicles_detected = vehicles_from_precision
                     
-                    # Calculate distance - don't need to do this for every detection since
-                    # the precision detector is already very selective
-                    self.calculate_distance_for_precision_objects(frame, humans_from_precision, vehicles_from_precision)
+                    source = 'precision'
+                    detections.extend(self.make_detections(self.precision_detector.last_valid_human_boxes, 'person'))
+                    detections.extend(self.make_detections(self.precision_detector.last_valid_vehicle_boxes, 'vehicle'))
             except Exception as e:
                 print(f"Error using precision detector: {e}")
                 precision_detection_success = False
 
         # ALWAYS prioritize the improved detector if available
         improved_detection_success = False
-        if not precision_detection_success and self.improved_detector is not None and self.improved_detector.initialized:
+        if (not precision_detection_success and 'improved' in enabled and
+                self.improved_detector is not None and self.improved_detector.initialized):
             try:
-                # Use the improved detector for humans and vehicles
-                humans_from_improved, vehicles_from_improved, annotated_frame = self.improved_detector.detect(frame)
+                # Use the improved detector for humans and vehicles. It shares the precision
+                # detector's YOLO model, so this only re-thresholds the cached network outputs
+                humans_from_improved, vehicles_from_improved, _ = self.stage_executor.run(
+                    'improved', self.improved_detector.detect, frame, False, context)
+                annotator = self.improved_detector.draw_detections
                 
                 # Only use its results if it found something
                 if humans_from_improved > 0 or vehicles_from_improved > 0:
@@ -208,39 +466,51 @@ class ObjectDetector:
                     humans_detected = humans_from_improved
                     vehicles_detected = vehicles_from_improved
                     
-                    # Calculate distance based on largest human detection
-                    if hasattr(self.improved_detector, 'last_human_boxes') and self.improved_detector.last_human_boxes:
-                        largest_box = max(self.improved_detector.last_human_boxes, key=lambda box: box[2] * box[3])
-                        human_size_ratio = (largest_box[2] * largest_box[3]) / (width * height)
-                        human_distance = self.estimate_distance(human_size_ratio, 'person')
-                        self.closest_distance = min(self.closest_distance, human_distance)
+                    source = 'improved'
+                    detections.extend(self.make_detections(self.improved_detector.last_human_boxes, 'person'))
+                    detections.extend(self.make_detections(self.improved_detector.last_vehicle_boxes, 'vehicle'))
             except Exception as e:
                 print(f"Error using improved detector: {e}")
                 # Fall back to regular detection methods
                 improved_detection_success = False
         
+        # With neither YOLO detector reporting anything, the SSD and HOG fallbacks
+        # below will run too. Start the SSD now, and HOG as well when there are cores
+        # to spare (its result is thrown away if the SSD finds a person; the simulated
+        # fallback always reports people, so HOG is never needed after it)
+        fallback = not precision_detection_success and not improved_detection_success
+        use_dnn = 'dnn' in enabled
+        dnn_stage = None
+        hog_stage = None
+        if fallback and use_dnn and self.object_net is not None:
+            dnn_stage = self.stage_executor.submit('dnn_forward', self.forward_object_net,
+                                                   context.get_blob(1.0, (300, 300), (127.5, 127.5, 127.5)))
+        if dnn_stage is not None and 'hog' in enabled and self.stage_executor.can_speculate():
+            hog_stage = self.stage_executor.submit('hog_speculative', self.detect_people_hog,
+                                                   context.get_resized((min(width, 640), min(height, 480))))
+        
         # Specifically use the car detector for vehicles if available
-        if not precision_detection_success and not improved_detection_success and self.car_detector and self.car_detector.initialized:
-            car_boxes, car_annotated_frame = self.car_detector.detect_vehicles(frame.copy())
+        if fallback and 'haar' in enabled and self.car_detector and self.car_detector.initialized:
+            car_boxes, _ = self.car_detector.detect_vehicles(frame, False, context)
             
             if len(car_boxes) > 0:
                 vehicles_detected = len(car_boxes)
-                annotated_frame = car_annotated_frame
-                
-                # Calculate closest vehicle distance
-                largest_car_box = max(car_boxes, key=lambda box: box[2] * box[3], default=None)
-                if largest_car_box:
-                    x, y, w, h = largest_car_box
-                    car_size_ratio = (w * h) / (width * height)
-                    car_distance = self.estimate_distance(car_size_ratio, 'car')
-                    self.closest_distance = min(self.closest_distance, car_distance)
+                annotator = lambda canvas: self.car_detector.draw_vehicles(canvas, car_boxes)
+                source = 'haar'
+                detections.extend(self.make_detections(car_boxes, 'vehicle', 'car'))
+        
+        # Make the one copy for drawing
+        annotated_frame = frame
+        if annotate:
+            annotated_frame = self.frame_pool.copy(frame)
+            if annotator is not None:
+                annotator(annotated_frame)
         
         # Continue with MediaPipe face detection which is accurate
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_results = self.face_detector.process(rgb_frame)
+        face_results = face_stage.result() if face_stage is not None else None
         
         # Draw face detections
-        if face_results.detections:
+        if face_results is not None and face_results.detections:
             faces_detected = len(face_results.detections)
             for detection in face_results.detections:
                 bbox = detection.location_data.relative_bounding_box
@@ -249,161 +519,330 @@ class ObjectDetector:
                 w = int(bbox.width * width)
                 h = int(bbox.height * height)
                 
-                # Draw rectangle around face
-                cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                
-                # Add label
                 confidence = detection.score[0]
-                label = f"Face {int(confidence * 100)}%"
-                cv2.putText(annotated_frame, label, (x, y - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                
-                # Calculate face distance for closest object
-                face_size_ratio = (w * h) / (width * height)
-                face_distance = self.estimate_distance(face_size_ratio, 'face')
-                self.closest_distance = min(self.closest_distance, face_distance)
-        
-        # Only use original detection methods if improved detector failed 
-        # AND we didn't find any humans with it
-        if not precision_detection_success and not improved_detection_success and humans_detected == 0:
-            # Detect other objects using OpenCV DNN
-            if self.object_net is not None:
-                # Create a blob from the frame
-                blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (127.5, 127.5, 127.5), swapRB=True, crop=False)
-                
-                # Pass the blob through the network
-                self.object_net.setInput(blob)
-                detections = self.object_net.forward()
-                
-                # Process each detection
-                for i in range(detections.shape[2]):
-                    confidence = detections[0, 0, i, 2]
-                    
-                    # Filter weak detections
-                    if confidence > 0.5:
-                        # Get the class index
-                        class_id = int(detections[0, 0, i, 1])
-                        
-                        # Look up the class name
-                        class_name = self.object_classes.get(class_id, "unknown")
-                        
-                        # Count humans and vehicles
-                        if class_name == 'person':
-                            humans_detected += 1
-                            color = (0, 255, 0)  # Green for humans
-                        elif class_name in ['car', 'truck', 'bus', 'motorcycle', 'bicycle']:
-                            vehicles_detected += 1
-                            color = (255, 165, 0)  # Orange for vehicles
-                        else:
-                            color = (255, 0, 0)  # Red for other objects
-                        
-                        # Get bounding box coordinates
-                        box = detections[0, 0, i, 3:7] * np.array([width, height, width, height])
-                        (x, y, x2, y2) = box.astype("int")
-                        
-                        # Draw bounding box
-                        cv2.rectangle(annotated_frame, (x, y), (x2, y2), color, 2)
-                        
-                        # Add label
-                        label = f"{class_name} {int(confidence * 100)}%"
-                        cv2.putText(annotated_frame, label, (x, y - 10), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                        
-                        # Estimate distance based on object size
-                        obj_size_ratio = ((x2 - x) * (y2 - y)) / (width * height)
-                        estimated_distance = self.estimate_distance(obj_size_ratio, class_name)
-                        
-                        # Update closest distance if this object is closer
-                        if estimated_distance < self.closest_distance:
-                            self.closest_distance = estimated_distance
-            else:
-                # Fallback to simulated detections if model isn't available
-                simulated_detections = self.generate_simulated_detections(frame, width, height)
-                
-                # Process simulated detections
-                for detection in simulated_detections:
-                    class_name, confidence, (x, y, w, h) = detection
-                    
-                    # Count objects
-                    if class_name == 'person':
-                        humans_detected += 1
-                        color = (0, 255, 0)  # Green
-                    elif class_name in ['car', 'truck', 'bus', 'motorcycle', 'bicycle']:
-                        vehicles_detected += 1
-                        color = (255, 165, 0)  # Orange
-                    else:
-                        color = (255, 0, 0)  # Red
-                    
-                    # Draw bounding box
-                    cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), color, 2)
+                if annotate:
+                    # Draw rectangle around face
+                    cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
                     
                     # Add label
-                    label = f"{class_name} {int(confidence * 100)}%"
+                    label = f"Face {int(confidence * 100)}%"
                     cv2.putText(annotated_frame, label, (x, y - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                
+                detections.append({'category': 'face', 'label': 'face', 'box': [x, y, w, h],
+                                   'confidence': float(confidence)})
+        
+        # Neither YOLO detector found anything: fall back to the SSD (or simulated
+        # detections) and HOG. Whichever finds people first makes the other one
+        # unnecessary, so they run in order of measured cost per frame with people
+        if fallback:
+            fallback_stages = [name for name in ('dnn', 'hog') if name in enabled]
+            for name in self.stage_executor.order_by_cost(fallback_stages):
+                if humans_detected > 0:
+                    break
+                if name == 'dnn':
+                    fallback_detections, fallback_source = self.stage_executor.run(
+                        'dnn', self.detect_dnn_fallback, frame, dnn_stage)
+                else:
+                    fallback_detections = self.stage_executor.run('hog', self.detect_hog_fallback, context, hog_stage)
+                    fallback_source = 'hog'
+                
+                found_humans = sum(1 for d in fallback_detections if d['category'] == 'person')
+                self.stage_executor.record_hit(name, found_humans > 0)
+                humans_detected += found_humans
+                vehicles_detected += sum(1 for d in fallback_detections if d['category'] == 'vehicle')
+                if fallback_detections:
+                    source = fallback_source
+                    detections.extend(fallback_detections)
+                    if annotate:
+                        self.draw_detections(annotated_frame, fallback_detections)
+        
+        self.last_detections = detections
+        self.last_detection_source = source
+        return annotated_frame, humans_detected, vehicles_detected, faces_detected
+    
+    def detect_dnn_fallback(self, frame, dnn_stage):
+        """
+        Detect objects with the SSD started by run_detectors, or simulate them
+        when the model isn't available
+        Returns: detection records, source name
+        """
+        height, width = frame.shape[:2]
+        detections = []
+        
+        if self.object_net is None:
+            # Fallback to simulated detections if model isn't available
+            for class_name, confidence, (x, y, w, h) in self.generate_simulated_detections(frame, width, height):
+                detections.append({'category': self.get_category(class_name), 'label': class_name,
+                                   'box': [x, y, w, h], 'confidence': float(confidence)})
+            return detections, 'simulated'
+        
+        # Pass the blob through the network (started by run_detectors)
+        dnn_detections = dnn_stage.result()
+        
+        # Process each detection
+        for i in range(dnn_detections.shape[2]):
+            confidence = dnn_detections[0, 0, i, 2]
             
-            # If no humans detected with DNN, try OpenCV's HOG detector for people
-            if humans_detected == 0:
-                # Resize for better HOG performance
-                resized_frame = cv2.resize(frame, (min(width, 640), min(height, 480)))
-                boxes, weights = self.hog.detectMultiScale(
-                    resized_frame, 
-                    winStride=(8, 8),
-                    padding=(4, 4),
-                    scale=1.05
-                )
+            # Filter weak detections
+            if confidence > 0.5:
+                # Look up the class name
+                class_id = int(dnn_detections[0, 0, i, 1])
+                class_name = self.object_classes.get(class_id, "unknown")
                 
-                # Scale boxes back to original frame size
-                scale_x = width / resized_frame.shape[1]
-                scale_y = height / resized_frame.shape[0]
+                # Get bounding box coordinates
+                box = dnn_detections[0, 0, i, 3:7] * np.array([width, height, width, height])
+                (x, y, x2, y2) = box.astype("int")
                 
-                for (x, y, w, h), weight in zip(boxes, weights):
-                    x, y = int(x * scale_x), int(y * scale_y)
-                    w, h = int(w * scale_x), int(h * scale_y)
-                    
-                    cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                    confidence = weight[0] if hasattr(weight, '__getitem__') else weight
-                    label = f"Person {int(min(confidence, 1.0) * 100)}%"
-                    cv2.putText(annotated_frame, label, (x, y - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    
-                    humans_detected += 1
-                    
-                    # Estimate distance
-                    obj_size_ratio = (w * h) / (width * height)
-                    estimated_distance = self.estimate_distance(obj_size_ratio, 'person')
-                    if estimated_distance < self.closest_distance:
-                        self.closest_distance = estimated_distance
+                detections.append({'category': self.get_category(class_name), 'label': class_name,
+                                   'box': [int(x), int(y), int(x2 - x), int(y2 - y)],
+                                   'confidence': float(confidence)})
+        return detections, 'dnn'
+    
+    def detect_hog_fallback(self, context, hog_stage):
+        """Detect people with HOG, using the speculative result if run_detectors started one"""
+        width, height = context.width, context.height
         
-        # Update the counts and distance
-        self.humans_count = humans_detected + faces_detected
-        self.vehicles_count = vehicles_detected
-        self.faces_count = faces_detected
+        # Resize for better HOG performance
+        resized_frame = context.get_resized((min(width, 640), min(height, 480)))
+        if hog_stage is not None:
+            boxes, weights = hog_stage.result()
+        else:
+            boxes, weights = self.detect_people_hog(resized_frame)
         
-        # Add a summary display on the frame
-        self.add_detection_summary(annotated_frame, humans_detected, faces_detected, vehicles_detected)
+        # Scale boxes back to original frame size
+        scale_x = width / resized_frame.shape[1]
+        scale_y = height / resized_frame.shape[0]
         
-        return annotated_frame, self.humans_count, self.vehicles_count, self.light_level
+        detections = []
+        for (x, y, w, h), weight in zip(boxes, weights):
+            x, y = int(x * scale_x), int(y * scale_y)
+            w, h = int(w * scale_x), int(h * scale_y)
+            
+            confidence = weight[0] if hasattr(weight, '__getitem__') else weight
+            detections.append({'category': 'person', 'label': 'person', 'box': [x, y, w, h],
+                               'confidence': float(min(confidence, 1.0))})
+        return detections
     
-    def calculate_distance_for_precision_objects(self, frame, humans_count, vehicles_count):
-        """Calculate accurate distances for objects detected by precision detector"""
-        if humans_count > 0 and hasattr(self.precision_detector, 'last_valid_human_boxes') and self.precision_detector.last_valid_human_boxes:
-            # Get the largest human box for distance estimation
-            largest_box = max(self.precision_detector.last_valid_human_boxes, key=lambda box: box[2] * box[3])
-            x, y, w, h = largest_box
-            height, width = frame.shape[:2]
-            size_ratio = (w * h) / (width * height)
-            person_distance = self.estimate_distance(size_ratio, 'person')
-            self.closest_distance = min(self.closest_distance, person_distance)
+    def detect_faces(self, rgb_frame):
+        """Run the MediaPipe face detector, which may be shared with other detectors"""
+        with self.face_detector_lock:
+            return self.face_detector.process(rgb_frame)
+    
+    def forward_object_net(self, blob):
+        """Run the SSD network on a blob"""
+        with self.object_net_lock:
+            self.object_net.setInput(blob)
+            return self.object_net.forward()
+    
+    def detect_people_hog(self, resized_frame):
+        """Run the HOG people detector; returns boxes and weights"""
+        return self.hog.detectMultiScale(
+            resized_frame, 
+            winStride=(8, 8),
+            padding=(4, 4),
+            scale=1.05
+        )
+    
+    def run_motion_gate(self, frame, context):
+        """
+        Use this frame's motion regions to limit detector work
+        Returns: annotated_frame, humans, vehicles, faces - or None if the full cascade should run
+        """
+        height, width = frame.shape[:2]
+        
+        # Nothing changed: the previous results still hold
+        if not self.motion_regions:
+            self.gate_stats['reused'] += 1
+            return self.apply_detections(frame, self.last_detections)
+        
+        # Too much of the frame changed to be worth cropping
+        regions = self.merge_motion_regions(self.motion_regions, width, height)
+        changed_area = sum(w * h for (x, y, w, h) in regions)
+        if changed_area > self.max_gated_area * width * height:
+            return None
+        
+        # Keep previous detections that lie entirely outside the changed areas. Each crop
+        # may be handled by a different detector, so every detection records its source
+        previous_source = self.last_detection_source
+        detections = [dict(d, source=d.get('source', previous_source)) for d in self.last_detections
+                      if not any(self.boxes_overlap(d['box'], region) for region in regions)]
+        
+        # Run the detectors on each changed area. Their box histories are in full-frame
+        # coordinates, so clear them first to keep the crop results from being smoothed
+        # against unrelated boxes; apply_detections restores the merged boxes afterwards
+        self.reset_detector_boxes()
+        for (rx, ry, rw, rh) in regions:
+            self.run_detectors(frame[ry:ry + rh, rx:rx + rw], context.crop(rx, ry, rw, rh), draw=False)
+            for detection in self.last_detections:
+                x, y, w, h = detection['box']
+                detections.append(dict(detection, box=[x + rx, y + ry, w, h], source=self.last_detection_source))
+        
+        self.gate_stats['partial'] += 1
+        return self.apply_detections(frame, detections)
+    
+    def merge_motion_regions(self, regions, width, height):
+        """Pad the motion regions for context and merge the ones that overlap"""
+        padded = []
+        for (x, y, w, h) in regions:
+            pad_x = max(int(w * self.gate_region_padding), (self.min_gate_region_size - w) // 2, 0)
+            pad_y = max(int(h * self.gate_region_padding), (self.min_gate_region_size - h) // 2, 0)
+            x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+            x2, y2 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+            padded.append([x1, y1, x2 - x1, y2 - y1])
+        
+        # Repeatedly merge overlapping regions until none overlap
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(padded)):
+                for j in range(i + 1, len(padded)):
+                    if self.boxes_overlap(padded[i], padded[j]):
+                        x1 = min(padded[i][0], padded[j][0])
+                        y1 = min(padded[i][1], padded[j][1])
+                        x2 = max(padded[i][0] + padded[i][2], padded[j][0] + padded[j][2])
+                        y2 = max(padded[i][1] + padded[i][3], padded[j][1] + padded[j][3])
+                        padded[i] = [x1, y1, x2 - x1, y2 - y1]
+                        del padded[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return padded
+    
+    def boxes_overlap(self, box1, box2):
+        """Check whether two (x, y, w, h) boxes intersect"""
+        return (box1[0] < box2[0] + box2[2] and box2[0] < box1[0] + box1[2] and
+                box1[1] < box2[1] + box2[3] and box2[1] < box1[1] + box1[3])
+    
+    def set_detector_boxes(self, human_boxes, vehicle_boxes, source=None):
+        """Overwrite the box history of a detector (by default the one that produced the last results)"""
+        source = source or self.last_detection_source
+        if source == 'precision' and self.precision_detector:
+            self.precision_detector.last_valid_human_boxes = human_boxes
+            self.precision_detector.last_valid_vehicle_boxes = vehicle_boxes
+        elif source == 'improved' and self.improved_detector:
+            self.improved_detector.last_human_boxes = human_boxes
+            self.improved_detector.last_vehicle_boxes = vehicle_boxes
+    
+    def get_category(self, label):
+        """Map a class label to one of the person/vehicle/face/other categories"""
+        if label in ['person', 'human']:
+            return 'person'
+        if label in VEHICLE_LABELS or label == 'vehicle':
+            return 'vehicle'
+        if label == 'face':
+            return 'face'
+        return 'other'
+    
+    def make_detections(self, boxes, category, label=None):
+        """Build detection records for a list of (x, y, w, h) boxes"""
+        return [{'category': category, 'label': label or category,
+                 'box': [int(v) for v in box], 'confidence': None} for box in boxes]
+    
+    def apply_detections(self, frame, detections):
+        """
+        Use tracked, reused or region-detected boxes as this frame's detections
+        Returns: annotated_frame, humans, vehicles, faces
+        """
+        # Keep the detectors' own box histories in step so their smoothing sees the
+        # current positions. Motion-gated frames can mix detections from several
+        # detectors; each one gets back the boxes it found
+        human_boxes = [d['box'] for d in detections if d['category'] == 'person']
+        vehicle_boxes = [d['box'] for d in detections if d['category'] == 'vehicle']
+        by_source = {self.last_detection_source: ([], [])}
+        for d in detections:
+            if d['category'] in ('person', 'vehicle'):
+                humans, vehicles = by_source.setdefault(d.get('source', self.last_detection_source), ([], []))
+                (humans if d['category'] == 'person' else vehicles).append(d['box'])
+        for source, (source_humans, source_vehicles) in by_source.items():
+            self.set_detector_boxes(source_humans, source_vehicles, source)
+        
+        self.last_detections = detections
+        
+        if not self.annotate:
+            annotated_frame = frame
+        else:
+            annotated_frame = self.frame_pool.copy(frame)
+            self.draw_detections(annotated_frame, detections)
+        
+        faces = sum(1 for d in detections if d['category'] == 'face')
+        return annotated_frame, len(human_boxes), len(vehicle_boxes), faces
+    
+    def reset_detector_boxes(self):
+        """Forget the box history of every detector, so the next run depends on its frame alone"""
+        if self.precision_detector:
+            self.precision_detector.last_valid_human_boxes = []
+            self.precision_detector.last_valid_vehicle_boxes = []
+        if self.improved_detector:
+            self.improved_detector.last_human_boxes = []
+            self.improved_detector.last_vehicle_boxes = []
+    
+    def smooth_worker_detections(self, source, detections):
+        """
+        Smooth a worker's person and vehicle boxes against this process's box history,
+        as the YOLO detector that found them does in-process
+        """
+        if source == 'precision' and self.precision_detector:
+            detector = self.precision_detector
+            previous = (detector.last_valid_human_boxes, detector.last_valid_vehicle_boxes)
+        elif source == 'improved' and self.improved_detector:
+            detector = self.improved_detector
+            previous = (detector.last_human_boxes, detector.last_vehicle_boxes)
+        else:
+            return detections
+        
+        human_boxes = detector.smooth_detections(
+            [d['box'] for d in detections if d['category'] == 'person'], previous[0], "human")
+        vehicle_boxes = detector.smooth_detections(
+            [d['box'] for d in detections if d['category'] == 'vehicle'], previous[1], "vehicle")
+        others = [d for d in detections if d['category'] not in ('person', 'vehicle')]
+        return self.make_detections(human_boxes, 'person') + self.make_detections(vehicle_boxes, 'vehicle') + others
+    
+    def apply_worker_result(self, frame, result):
+        """
+        Finish a frame whose detectors ran in a detection worker process. The workers
+        keep no state between frames, so light, motion, smoothing, tracking and
+        drawing happen here, on results handed over in frame order.
+        Returns: annotated_frame, humans, vehicles, light_level (like detect_objects)
+        """
+        with self.frame_lock:
+            context = FrameContext(frame)
+            self.resolution = f"{context.width}x{context.height}"
+            self.analyze_brightness(frame, context)
+            self.detect_motion(context)
+        
+            detections = self.smooth_worker_detections(result['source'], result['detections'])
+            self.last_detection_source = result['source']
+            annotated_frame, humans_detected, vehicles_detected, faces_detected = self.apply_detections(frame, detections)
+            self.has_detection_results = True
+            if self.detection_interval > 1:
+                self.tracker.start(context.get_gray(), self.last_detections)
+                self.frames_since_detection = 0
+        
+            self.humans_count = humans_detected + faces_detected
+            self.vehicles_count = vehicles_detected
+            self.faces_count = faces_detected
+            self.stage_distance({'frame': frame})
+            if self.annotate:
+                self.add_detection_summary(annotated_frame, humans_detected, faces_detected, vehicles_detected)
+        
+            self.last_preprocessing = context.get_report()
+            self.detection_feed.publish(self.get_detection_snapshot())
+            return annotated_frame, self.humans_count, self.vehicles_count, self.light_level
+    
+    def draw_detections(self, frame, detections):
+        """Draw detection boxes and labels onto a frame"""
+        for detection in detections:
+            x, y, w, h = detection['box']
+            color = DETECTION_COLORS.get(detection['category'], DETECTION_COLORS['other'])
+            label = detection['label'].capitalize()
+            if detection['confidence'] is not None:
+                label = f"{label} {int(min(detection['confidence'], 1.0) * 100)}%"
             
-        if vehicles_count > 0 and hasattr(self.precision_detector, 'last_valid_vehicle_boxes') and self.precision_detector.last_valid_vehicle_boxes:
-            # Get the largest vehicle box for distance estimation
-            largest_box = max(self.precision_detector.last_valid_vehicle_boxes, key=lambda box: box[2] * box[3])
-            x, y, w, h = largest_box
-            height, width = frame.shape[:2]
-            size_ratio = (w * h) / (width * height)
-            vehicle_distance = self.estimate_distance(size_ratio, 'vehicle')
-            self.closest_distance = min(self.closest_distance, vehicle_distance)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            cv2.putText(frame, label, (x, y - 10), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
     
     def generate_simulated_detections(self, frame, width, height):
         """Generate simulated detections for demonstration purposes"""
@@ -451,43 +890,28 @@ class ObjectDetector:
         
         return detections
     
-    def analyze_brightness(self, frame):
+    def analyze_brightness(self, frame, context=None):
         """Analyze the frame to determine light level (0-1000)"""
         # Convert to grayscale and calculate mean brightness
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = context.get_gray() if context is not None else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         mean_brightness = np.mean(gray)
         
         # Convert 0-255 scale to 0-1000 scale
         self.light_level = int((mean_brightness / 255.0) * 1000)
     
-    def detect_motion(self, prev_frame, curr_frame):
-        """Detect motion between frames"""
-        # Convert frames to grayscale
-        prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-        curr_gray = cv2.cvtColor(curr_frame, cv2.COLOR_BGR2GRAY)
-        
-        # Apply Gaussian blur to reduce noise
-        prev_gray = cv2.GaussianBlur(prev_gray, (21, 21), 0)
-        curr_gray = cv2.GaussianBlur(curr_gray, (21, 21), 0)
-        
-        # Calculate absolute difference between frames
-        frame_diff = cv2.absdiff(prev_gray, curr_gray)
-        
-        # Apply threshold to difference
-        thresh = cv2.threshold(frame_diff, self.motion_threshold, 255, cv2.THRESH_BINARY)[1]
-        
-        # Dilate threshold image to fill holes
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        
-        # Find contours in threshold image
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def detect_motion(self, context):
+        """
+        Detect motion against the previous frame and record the changed regions
+        Returns: False if there was no previous frame to compare with
+        """
+        with self.lock:
+            regions = self.motion_engine.update(context)
+        if regions is None:
+            self.motion_regions = []
+            return False
         
-        # Check if any large contours exist
-        significant_motion = False
-        for contour in contours:
-            if cv2.contourArea(contour) > self.min_motion_area:
-                significant_motion = True
-                break
+        self.motion_regions = regions
+        significant_motion = len(self.motion_regions) > 0
         
         # If motion detected, update motion state
         if significant_motion:
@@ -497,6 +921,7 @@ class ObjectDetector:
             # If no motion for 2 seconds, reset motion state
             if time.time() - self.last_motion_time > 2:
                 self.motion_detected = False
+        return True
     
     def estimate_distance(self, size_ratio, category):
         """
@@ -572,21 +997,24 @@ class ObjectDetector:
         """Add a summary of detections to the frame"""
         height, width = frame.shape[:2]
         
-        # Create a semi-transparent overlay
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, height - 90), (220, height - 10), (0, 0, 0), -1)
+        # Only the panel area changes, so blend just that region instead of the whole frame
+        top, left = max(0, height - 90), 10
+        panel = frame[top:height - 9, left:min(width, 221)]
+        if panel.size == 0:
+            return
         
-        # Add text
-        cv2.putText(overlay, f"Humans: {humans + faces}", (20, height - 65), 
+        # Create a semi-transparent overlay (text positions are relative to the panel)
+        overlay = np.zeros_like(panel)
+        cv2.putText(overlay, f"Humans: {humans + faces}", (20 - left, height - 65 - top), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-        cv2.putText(overlay, f"Faces: {faces}", (20, height - 45), 
+        cv2.putText(overlay, f"Faces: {faces}", (20 - left, height - 45 - top), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-        cv2.putText(overlay, f"Vehicles: {vehicles}", (20, height - 25), 
+        cv2.putText(overlay, f"Vehicles: {vehicles}", (20 - left, height - 25 - top), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 1)
         
         # Blend the overlay with the original frame
         alpha = 0.7
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        cv2.addWeighted(overlay, alpha, panel, 1 - alpha, 0, panel)
     
     def get_sensor_data(self):
         """Return sensor data for the API"""
@@ -601,6 +1029,31 @@ class ObjectDetector:
             'vehicles_count': self.vehicles_count
         }
     
+    def release_frame(self, frame):
+        """Hand a frame returned by detect_objects back for reuse once the caller is done with it"""
+        self.frame_pool.release(frame)
+    
+    def get_detection_snapshot(self):
+        """Return the last frame's detections and counts as JSON-ready data"""
+        return {
+            'timestamp': time.time(),
+            'stream': self.stream,
+            'resolution': self.resolution,
+            'annotated': self.annotate,
+            'humans_count': self.humans_count,
+            'vehicles_count': self.vehicles_count,
+            'faces_count': self.faces_count,
+            'light_level': self.light_level,
+            'distance': self.closest_distance,
+            'motion_detected': self.motion_detected,
+            'detections': [{
+                'category': d['category'],
+                'label': d['label'],
+                'box': [int(v) for v in d['box']],
+                'confidence': None if d['confidence'] is None else float(d['confidence'])
+            } for d in self.last_detections]
+        }
+    
     def process_image_data(self, image_data):
         """Process image data from ESP32 camera or base64 string"""
         try:
@@ -631,6 +1084,9 @@ class ObjectDetector:
             pil_image.save(buffer, format="JPEG", quality=85)
             img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
             
+            # Encoded, so the annotated frame's buffer can go back to the pool
+            self.release_frame(processed_frame)
+            
             return {
                 'processed_image': f'data:image/jpeg;base64,{img_str}',
                 'humans_count': humans,
@@ -647,6 +1103,29 @@ class ObjectDetector:
                 'light_level': 500
             }
 
+    def process_encoded_frame(self, jpeg_data, return_image=False, quality=85):
+        """
+        Process one encoded frame (JPEG/PNG bytes) without base64 or PIL.
+        Returns the detection results, plus the annotated frame as JPEG bytes
+        under 'jpeg' when return_image is set.
+        """
+        frame = cv2.imdecode(np.frombuffer(jpeg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return {'error': 'Could not decode image'}
+        
+        processed_frame, humans, vehicles, light = self.detect_objects(frame)
+        result = self.get_detection_snapshot()
+        
+        if return_image:
+            ok, jpeg = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                result = {'error': 'Could not encode image'}
+            else:
+                result['jpeg'] = jpeg.tobytes()
+        
+        self.release_frame(processed_frame)
+        return result
+
 # Add missing import
 import os
 import math
@@ -0,0 +1,122 @@
+"""
+Lightweight box tracking between detector runs.
+Carries the last detections forward with sparse Lucas-Kanade optical flow so
+the expensive detectors only need to run every few frames.
+"""
+import cv2
+import numpy as np
+
+# Optical flow parameters
+LK_PARAMS = dict(
+    winSize=(15, 15),
+    maxLevel=2,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
+)
+MAX_POINTS_PER_BOX = 30
+MIN_POINTS_PER_BOX = 4
+
+
+def clip_box(box, width, height):
+    """Clip an (x, y, w, h) box to the frame; the size is 0 or less if it lies outside"""
+    x, y, w, h = box
+    x1, y1 = max(0, int(round(x))), max(0, int(round(y)))
+    x2, y2 = min(width, int(round(x + w))), min(height, int(round(y + h)))
+    return [x1, y1, x2 - x1, y2 - y1]
+
+
+class OpticalFlowTracker:
+    def __init__(self):
+        self.prev_gray = None
+        self.tracks = []  # One entry per tracked detection
+        self.confidence = 0.0  # Fraction of feature points still tracked
+
+    def reset(self):
+        """Forget all tracked boxes"""
+        self.prev_gray = None
+        self.tracks = []
+        self.confidence = 0.0
+
+    def start(self, gray, detections):
+        """Start tracking a fresh set of detections on the given grayscale frame"""
+        self.prev_gray = gray
+        self.tracks = []
+        height, width = gray.shape[:2]
+
+        for detection in detections:
+            # Only the visible part of the box has corners to follow
+            x, y, w, h = clip_box(detection['box'], width, height)
+
+            # Pick good corners inside the box to follow
+            points = None
+            if w > 0 and h > 0:
+                mask = np.zeros_like(gray)
+                mask[y:y + h, x:x + w] = 255
+                points = cv2.goodFeaturesToTrack(gray, maxCorners=MAX_POINTS_PER_BOX,
+                                                 qualityLevel=0.01, minDistance=5, mask=mask)
+
+            self.tracks.append({
+                # The full box is kept, so a box that moves past the frame edge and back keeps its size
+                'box': [float(v) for v in detection['box']],
+                'detection': dict(detection, box=[x, y, w, h]),
+                'points': points,
+                'initial_points': 0 if points is None else len(points)
+            })
+
+        self.confidence = 1.0
+
+    def update(self, gray):
+        """
+        Move every tracked box to the current frame.
+        Returns the moved detections; self.confidence reflects how reliable they are.
+        """
+        if self.prev_gray is None:
+            self.confidence = 0.0
+            return []
+
+        # Track the points of all boxes with a single optical flow call
+        trackable = [t for t in self.tracks if t['points'] is not None and len(t['points']) > 0]
+        if trackable:
+            old_points = np.concatenate([t['points'] for t in trackable])
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, old_points, None, **LK_PARAMS)
+            status = status.reshape(-1).astype(bool)
+
+        height, width = gray.shape[:2]
+        confidences = []
+        offset = 0
+
+        for track in self.tracks:
+            if track['initial_points'] == 0:
+                # Featureless boxes can't be followed, so they stay where they are
+                continue
+            if track['points'] is None:
+                # Lost on an earlier frame
+                confidences.append(0.0)
+                continue
+
+            count = len(track['points'])
+            old = old_points[offset:offset + count].reshape(-1, 2)
+            new = new_points[offset:offset + count].reshape(-1, 2)
+            good = status[offset:offset + count]
+            offset += count
+
+            # Too few points left means the object can't be followed reliably
+            if good.sum() < MIN_POINTS_PER_BOX:
+                track['points'] = None
+                confidences.append(0.0)
+                continue
+
+            # Move the full box by the median motion of its points and clip only what is reported
+            dx, dy = np.median(new[good] - old[good], axis=0)
+            x, y, w, h = track['box']
+            track['box'] = [x + float(dx), y + float(dy), w, h]
+            track['detection']['box'] = clip_box(track['box'], width, height)
+            track['points'] = new[good].reshape(-1, 1, 2)
+            confidences.append(good.sum() / track['initial_points'])
+
+        self.confidence = float(np.mean(confidences)) if confidences else 1.0
+        self.prev_gray = gray
+
+        # Boxes that moved out of the frame entirely aren't reported
+        return [dict(t['detection']) for t in self.tracks
+                if (t['points'] is not None or t['initial_points'] == 0)
+                and t['detection']['box'][2] > 0 and t['detection']['box'][3] > 0]
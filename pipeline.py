@@ -0,0 +1,275 @@
+"""
+Declarative frame-processing pipelines.
+A pipeline is an ordered list of named stages. Each stage declares the record
+fields it reads (inputs) and the fields it may add (outputs), and the pipeline
+checks when it is built that every input comes from the source record or an
+earlier stage. Frames travel through the stages as dicts ("records").
+
+run() pushes one record through every stage on the calling thread. start()
+instead gives each stage its own bounded queue and worker threads, so
+consecutive frames overlap (frame N+1 is decoded while frame N is in the
+detectors). Queues drop their oldest record when full, which keeps latency
+bounded when a later stage is slower than the camera. Every stage is timed
+either way.
+
+Which stages and detectors a deployment uses comes from a named preset or a
+JSON file (see load_pipeline_config), e.g. HELMET_PIPELINE=haar_only.
+"""
+import collections
+import json
+import threading
+import time
+
+# Detectors in cascade order. The first of precision/improved to find something
+# is used; Haar vehicles and MediaPipe faces are merged in, and the SSD (or the
+# simulated detections without a model) and HOG only run when nothing else found people
+DETECTORS = ('precision', 'improved', 'haar', 'faces', 'dnn', 'hog')
+
+# Stages of ObjectDetector.detect_objects, in the order they run
+FRAME_STAGES = ('preprocess', 'cache_lookup', 'motion', 'motion_gate', 'tracker', 'detectors', 'cache_store',
+                'distance', 'annotate', 'publish')
+
+# Stages every configuration needs
+REQUIRED_STAGES = ('preprocess', 'detectors')
+
+# Settings each preset overrides; anything left out uses the defaults below
+PIPELINE_PRESETS = {
+    # The full cascade
+    'default': {},
+    # Haar cascades only, for weak hardware
+    'haar_only': {'detectors': ['haar']},
+    # The YOLO-based detectors without the slower fallbacks
+    'yolo_only': {'detectors': ['precision', 'improved']},
+    # MediaPipe faces only
+    'faces_only': {'detectors': ['faces']},
+    # Haar and faces without motion analysis, tracking or the summary panel
+    'lite': {
+        'detectors': ['haar', 'faces'],
+        'stages': ['preprocess', 'detectors', 'distance', 'publish']
+    }
+}
+
+
+def load_pipeline_config(name=None):
+    """
+    Return the pipeline configuration for a preset name or a path to a JSON file
+    with the same keys: detectors, stages, workers and queue_sizes (the last two
+    map stage names to thread and queue counts for pipelines run with start())
+    """
+    name = name or 'default'
+    if name.endswith('.json'):
+        with open(name) as f:
+            overrides = json.load(f)
+    elif name in PIPELINE_PRESETS:
+        overrides = PIPELINE_PRESETS[name]
+    else:
+        raise ValueError(f"Unknown pipeline preset '{name}', expected one of {tuple(PIPELINE_PRESETS)} or a .json file")
+
+    config = {
+        'name': name,
+        'detectors': list(DETECTORS),
+        'stages': list(FRAME_STAGES),
+        'workers': {},
+        'queue_sizes': {}
+    }
+    config.update(overrides)
+
+    unknown = [d for d in config['detectors'] if d not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown detectors {unknown} in pipeline '{name}', expected some of {DETECTORS}")
+    unknown = [s for s in config['stages'] if s not in FRAME_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown} in pipeline '{name}', expected some of {FRAME_STAGES}")
+    missing = [s for s in REQUIRED_STAGES if s not in config['stages']]
+    if missing:
+        raise ValueError(f"Pipeline '{name}' is missing the required stages {missing}")
+    return config
+
+
+class StageQueue:
+    """Bounded queue in front of a stage that drops its oldest record when full"""
+    def __init__(self, maxsize=1, on_drop=None):
+        self.records = collections.deque()
+        self.maxsize = max(1, int(maxsize))
+        self.on_drop = on_drop
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, record):
+        dropped = None
+        with self.condition:
+            if len(self.records) >= self.maxsize:
+                dropped = self.records.popleft()
+                self.dropped += 1
+            self.records.append(record)
+            self.condition.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        """Return the oldest record, or None on timeout or when closed"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.records or self.closed, timeout)
+            if not self.records:
+                return None
+            return self.records.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.records)
+
+
+class Stage:
+    """
+    One named step of a pipeline. func takes the record and returns a dict of
+    new fields (a subset of outputs), or None to drop the frame.
+    """
+    def __init__(self, name, func, inputs=(), outputs=(), workers=1, queue_size=1):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.workers = max(1, int(workers))  # More than one can reorder frames
+        self.queue_size = queue_size
+        self.queue = None                    # Created by Pipeline.start()
+
+        # Statistics
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.dropped_frames = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def process(self, record):
+        """Run the stage on a record; returns the updated record or None if it was dropped"""
+        start_time = time.perf_counter()
+        try:
+            outputs = self.func(record)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self.lock:
+                self.calls += 1
+                self.total_time += elapsed
+                self.last_time = elapsed
+
+        if outputs is None:
+            with self.lock:
+                self.dropped_frames += 1
+            return None
+        for key in outputs:
+            if key not in self.outputs:
+                raise ValueError(f"Stage '{self.name}' produced undeclared output '{key}'")
+        record.update(outputs)
+        return record
+
+    def get_stats(self):
+        with self.lock:
+            stats = {
+                'inputs': list(self.inputs),
+                'outputs': list(self.outputs),
+                'workers': self.workers,
+                'calls': self.calls,
+                'errors': self.errors,
+                'dropped_frames': self.dropped_frames,
+                'last_ms': round(self.last_time * 1000, 2),
+                'avg_ms': round(self.total_time * 1000 / self.calls, 2) if self.calls else 0.0
+            }
+        if self.queue is not None:
+            stats['queued'] = len(self.queue)
+            stats['queue_dropped'] = self.queue.dropped
+        return stats
+
+
+class Pipeline:
+    def __init__(self, name, stages, inputs=(), on_drop=None):
+        self.name = name
+        self.stages = list(stages)
+        self.inputs = tuple(inputs)
+        self.on_drop = on_drop  # Called with records a full queue throws away
+        self.sink = None
+        self.running = False
+        self.threads = []
+        self.validate()
+
+    def validate(self):
+        """Check that every stage's inputs are available by the time it runs"""
+        available = set(self.inputs)
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Pipeline '{self.name}' has more than one stage named '{stage.name}'")
+            names.add(stage.name)
+            missing = [key for key in stage.inputs if key not in available]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' of pipeline '{self.name}' needs {missing}, "
+                                 f"which no earlier stage produces")
+            available.update(stage.outputs)
+
+    def run(self, record):
+        """Push one record through every stage on the calling thread"""
+        for stage in self.stages:
+            record = stage.process(record)
+            if record is None:
+                return None
+        return record
+
+    def start(self, sink=None):
+        """Run each stage on its own worker threads; sink receives the finished records"""
+        self.sink = sink
+        self.running = True
+        for stage in self.stages:
+            stage.queue = StageQueue(stage.queue_size, self.on_drop)
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(target=self.worker_loop, args=(index,), daemon=True,
+                                          name=f'{self.name}-{stage.name}-{worker}')
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, record):
+        """Queue a record for the first stage of a started pipeline"""
+        self.stages[0].queue.put(record)
+
+    def worker_loop(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while self.running:
+            record = stage.queue.get(timeout=1.0)
+            if record is None:
+                continue
+
+            try:
+                record = stage.process(record)
+            except Exception as e:
+                with stage.lock:
+                    stage.errors += 1
+                print(f"Error in stage '{stage.name}' of pipeline '{self.name}': {e}")
+                record = None
+
+            if record is None:
+                continue
+            if next_stage is not None:
+                next_stage.queue.put(record)
+            elif self.sink is not None:
+                self.sink(record)
+
+    def stop(self):
+        self.running = False
+        for stage in self.stages:
+            if stage.queue is not None:
+                stage.queue.close()
+
+    def get_stats(self):
+        stages = {stage.name: stage.get_stats() for stage in self.stages}
+        return {
+            'name': self.name,
+            'threaded': bool(self.threads),
+            'stages': stages,
+            'last_total_ms': round(sum(s['last_ms'] for s in stages.values()), 2)
+        }
@@ -4,9 +4,11 @@ Focuses on minimizing false positives by using multiple validation checks.
 """
 import cv2
 import numpy as np
-import os
-import urllib.request
 import time
+from model_registry import model_registry
+from model_store import model_store
+from yolo_decoder import YoloDecoder, CATEGORY_PERSON, CATEGORY_VEHICLE
+from frame_context import FrameContext
 
 # Constants for detection with high precision
 CONF_THRESHOLD = 0.70  # Higher confidence threshold to avoid false positives
@@ -15,23 +17,22 @@ MIN_DETECTION_SIZE = 0.005  # Minimum object size as ratio of image (prevents ti
 MAX_DETECTION_SIZE = 0.80   # Maximum object size as ratio of image
 
 class PrecisionDetector:
-    def __init__(self):
-        # Path configurations
-        self.models_dir = os.path.join(os.path.dirname(__file__), 'models')
-        os.makedirs(self.models_dir, exist_ok=True)
+    def __init__(self, inference=None):
+        # Inference backend settings for YOLO (see inference_backends.py)
+        self.inference = inference
         
-        # Model configurations
+        # Model configurations, as names in the local model store (see model_store.py)
         self.model_files = {
             'yolo': {
-                'weights': os.path.join(self.models_dir, 'yolov4.weights'),
-                'config': os.path.join(self.models_dir, 'yolov4.cfg'),
-                'names': os.path.join(self.models_dir, 'coco.names'),
-                'tiny_weights': os.path.join(self.models_dir, 'yolov4-tiny.weights'),
-                'tiny_config': os.path.join(self.models_dir, 'yolov4-tiny.cfg'),
+                'weights': 'yolov4.weights',
+                'config': 'yolov4.cfg',
+                'names': 'coco.names',
+                'tiny_weights': 'yolov4-tiny.weights',
+                'tiny_config': 'yolov4-tiny.cfg',
             },
             'ssd': {
-                'weights': os.path.join(self.models_dir, 'frozen_inference_graph.pb'),
-                'config': os.path.join(self.models_dir, 'ssd_mobilenet_v2_coco_2018_03_29.pbtxt'),
+                'weights': 'ssd_mobilenet_v2_coco.pb',
+                'config': 'ssd_mobilenet_v2_coco.pbtxt',
             }
         }
         
@@ -39,9 +40,14 @@ class PrecisionDetector:
         self.person_class_id = 0  # COCO class ID for person
         self.vehicle_class_ids = [1, 2, 3, 5, 7]  # bicycle, car, motorcycle, bus, truck
         
-        # Detectors
+        # Vectorized YOLO output decoder with precomputed class lookup tables
+        self.decoder = YoloDecoder(self.is_person, self.is_vehicle)
+        
+        # Detectors (shared registry entries, see model_registry.py)
+        self.yolo_model = None
         self.yolo_net = None
         self.yolo_output_layers = []
+        self.ssd_model = None
         self.ssd_net = None  # SSD MobileNet backup detector
         
         # Detection state
@@ -58,112 +64,54 @@ class PrecisionDetector:
     def initialize_detectors(self):
         """Initialize multiple detectors for redundancy and accuracy"""
         try:
-            # First, download model files if needed
-            self.download_model_files()
+            # Model files are only read from the local store, never downloaded here;
+            # missing ones are fetched beforehand with python prefetch_models.py
+            names_path = model_store.get(self.model_files['yolo']['names'])
             
             # Load class names
-            if os.path.exists(self.model_files['yolo']['names']):
-                with open(self.model_files['yolo']['names'], 'r') as f:
+            if names_path is not None:
+                with open(names_path, 'r') as f:
                     self.classes = [line.strip() for line in f.readlines()]
             else:
                 # Fallback class names for COCO dataset
                 self.classes = ["person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck"]
             
             # Initialize YOLO network
-            yolo_config = self.model_files['yolo']['config']
-            yolo_weights = self.model_files['yolo']['weights']
+            yolo_config = model_store.get(self.model_files['yolo']['config'])
+            yolo_weights = model_store.get(self.model_files['yolo']['weights'])
             
             # Fall back to tiny YOLO if full model isn't available
-            if not os.path.exists(yolo_weights) or not os.path.exists(yolo_config):
-                yolo_config = self.model_files['yolo']['tiny_config']
-                yolo_weights = self.model_files['yolo']['tiny_weights']
+            if yolo_weights is None or yolo_config is None:
+                yolo_config = model_store.get(self.model_files['yolo']['tiny_config'])
+                yolo_weights = model_store.get(self.model_files['yolo']['tiny_weights'])
             
             # Load appropriate YOLO model if available
-            if os.path.exists(yolo_weights) and os.path.exists(yolo_config):
+            if yolo_weights is not None and yolo_config is not None:
                 print(f"Loading YOLO model from {yolo_weights}")
-                self.yolo_net = cv2.dnn.readNetFromDarknet(yolo_config, yolo_weights)
-                
-                # Optimize network for CPU
-                self.yolo_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-                self.yolo_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-                
-                # Get output layer names
-                layer_names = self.yolo_net.getLayerNames()
-                try:
-                    # OpenCV 4.5.4+
-                    self.yolo_output_layers = [layer_names[i - 1] for i in self.yolo_net.getUnconnectedOutLayers()]
-                except:
-                    # Older OpenCV versions
-                    self.yolo_output_layers = [layer_names[i[0] - 1] for i in self.yolo_net.getUnconnectedOutLayers()]
+                self.yolo_model = model_registry.get_darknet(yolo_config, yolo_weights, inference=self.inference)
+                self.yolo_net = self.yolo_model.net
+                self.yolo_output_layers = self.yolo_model.output_layers
             
             # Try to load SSD MobileNet as backup
-            ssd_weights = self.model_files['ssd']['weights']
-            ssd_config = self.model_files['ssd']['config']
+            ssd_weights = model_store.get(self.model_files['ssd']['weights'])
+            ssd_config = model_store.get(self.model_files['ssd']['config'])
             
-            if os.path.exists(ssd_weights) and os.path.exists(ssd_config):
+            if ssd_weights is not None and ssd_config is not None:
                 print(f"Loading SSD MobileNet model from {ssd_weights}")
-                self.ssd_net = cv2.dnn.readNetFromTensorflow(ssd_weights, ssd_config)
-                self.ssd_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-                self.ssd_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+                self.ssd_model = model_registry.get_tensorflow(ssd_weights, ssd_config)
+                self.ssd_net = self.ssd_model.net
             
             # Mark initialization successful if at least one model is loaded
             self.initialized = (self.yolo_net is not None) or (self.ssd_net is not None)
             if self.initialized:
                 print("Precision detector initialized successfully")
             else:
-                print("Warning: No detection models could be loaded")
+                print("Warning: No detection models could be loaded; fetch them with python prefetch_models.py")
         
         except Exception as e:
             print(f"Error initializing precision detector: {e}")
             self.initialized = False
     
-    def download_model_files(self):
-        """Download model files if they don't exist"""
-        try:
-            # Download YOLO config and names files - they're small
-            yolo_names_url = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names"
-            yolo_cfg_url = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4-tiny.cfg"
-            yolo_tiny_cfg_url = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4-tiny.cfg"
-            
-            # Only download if they don't exist
-            if not os.path.exists(self.model_files['yolo']['names']):
-                print(f"Downloading YOLO class names from {yolo_names_url}")
-                urllib.request.urlretrieve(yolo_names_url, self.model_files['yolo']['names'])
-                
-            if not os.path.exists(self.model_files['yolo']['config']):
-                print(f"Downloading YOLO config from {yolo_cfg_url}")
-                urllib.request.urlretrieve(yolo_cfg_url, self.model_files['yolo']['config'])
-                
-            if not os.path.exists(self.model_files['yolo']['tiny_config']):
-                print(f"Downloading YOLO tiny config from {yolo_tiny_cfg_url}")
-                urllib.request.urlretrieve(yolo_tiny_cfg_url, self.model_files['yolo']['tiny_config'])
-                
-            # For weights files, they're large and we should check before downloading
-            # We'll provide download instructions if needed, rather than auto-downloading
-            if not os.path.exists(self.model_files['yolo']['tiny_weights']):
-                print("YOLO tiny weights file not found. You may want to download it from:")
-                print("https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v4_pre/yolov4-tiny.weights")
-                print(f"and save it to {self.model_files['yolo']['tiny_weights']}")
-                
-            if not os.path.exists(self.model_files['ssd']['config']):
-                # Create a minimal config file for TensorFlow model
-                with open(self.model_files['ssd']['config'], 'w') as f:
-                    f.write("""# SSD MobileNet v2 COCO configuration
-node {
-  name: "image_tensor"
-  op: "Placeholder"
-  attr {
-    key: "dtype"
-    value {
-      type: DT_UINT8
-    }
-  }
-}
-""")
-                
-        except Exception as e:
-            print(f"Error downloading model files: {e}")
-    
     def is_person(self, class_id):
         """Check if detected class is a person"""
         return class_id == self.person_class_id or (self.classes and class_id < len(self.classes) and self.classes[class_id] == "person")
@@ -221,19 +169,18 @@ node {
         self.last_detection_time = time.time()
         return current_boxes
     
-    def detect(self, frame):
+    def detect(self, frame, annotate=True, context=None):
         """
         Detect humans and vehicles with high precision
-        Returns: humans_count, vehicles_count, annotated_frame
+        Returns: humans_count, vehicles_count, annotated_frame (the input frame when annotate is False)
         """
         if not self.initialized:
             return 0, 0, frame
             
         height, width = frame.shape[:2]
         frame_dims = (width, height)
-        
-        # Copy frame for annotations
-        annotated_frame = frame.copy()
+        if context is None:
+            context = FrameContext(frame)
         
         # Track detections for this frame
         human_boxes = []
@@ -242,13 +189,13 @@ node {
         # Try YOLO detection first
         if self.yolo_net is not None:
             # Use both YOLOv4 and SSD MobileNet for high-precision detection
-            yolo_humans, yolo_vehicles = self.detect_with_yolo(frame, frame_dims, annotated_frame)
+            yolo_humans, yolo_vehicles = self.detect_with_yolo(frame, frame_dims, context)
             human_boxes.extend(yolo_humans)
             vehicle_boxes.extend(yolo_vehicles)
             
         # Try SSD MobileNet if we haven't found anything with YOLO
         if self.ssd_net is not None and not (human_boxes or vehicle_boxes):
-            ssd_humans, ssd_vehicles = self.detect_with_ssd(frame, frame_dims, annotated_frame)
+            ssd_humans, ssd_vehicles = self.detect_with_ssd(frame, frame_dims, context)
             human_boxes.extend(ssd_humans)
             vehicle_boxes.extend(ssd_vehicles)
             
@@ -264,108 +211,73 @@ node {
         humans_count = len(human_boxes)
         vehicles_count = len(vehicle_boxes)
         
-        # Clear the annotations and redraw only the final validated detections
-        annotated_frame = frame.copy()
+        if not annotate:
+            return humans_count, vehicles_count, frame
         
+        # Draw only the final validated detections
+        annotated_frame = frame.copy()
+        self.draw_detections(annotated_frame)
+                    
+        return humans_count, vehicles_count, annotated_frame
+    
+    def draw_detections(self, frame):
+        """Draw the boxes and counts from the last detect() call onto frame"""
         # Draw human detections
-        for x, y, w, h in human_boxes:
-            cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(annotated_frame, "Person", (x, y - 5), 
+        for x, y, w, h in self.last_valid_human_boxes:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(frame, "Person", (x, y - 5), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
             
         # Draw vehicle detections
-        for x, y, w, h in vehicle_boxes:
-            cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-            cv2.putText(annotated_frame, "Vehicle", (x, y - 5), 
+        for x, y, w, h in self.last_valid_vehicle_boxes:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
+            cv2.putText(frame, "Vehicle", (x, y - 5), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
             
         # Add summary text
-        cv2.putText(annotated_frame, f"Humans: {humans_count}", (10, 30), 
+        cv2.putText(frame, f"Humans: {len(self.last_valid_human_boxes)}", (10, 30), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(annotated_frame, f"Vehicles: {vehicles_count}", (10, 60), 
+        cv2.putText(frame, f"Vehicles: {len(self.last_valid_vehicle_boxes)}", (10, 60), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    
-        return humans_count, vehicles_count, annotated_frame
     
-    def detect_with_yolo(self, frame, frame_dims, annotated_frame):
+    def detect_with_yolo(self, frame, frame_dims, context):
         """Detect objects using YOLO"""
         width, height = frame_dims
         human_boxes = []
         vehicle_boxes = []
         
-        # Prepare input blob
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
-        self.yolo_net.setInput(blob)
+        # Run detection on the shared network, unless another detector already ran it on this frame
+        outputs = context.get_outputs(self.yolo_model, 1/255.0, (416, 416))
         
-        # Run detection
-        outputs = self.yolo_net.forward(self.yolo_output_layers)
-        
-        # Process detections
-        boxes = []
-        confidences = []
-        class_ids = []
-        
-        for output in outputs:
-            for detection in output:
-                if len(detection) >= 85:  # YOLO format check
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    
-                    # Only keep persons and vehicles with high confidence
-                    if confidence > CONF_THRESHOLD and (self.is_person(class_id) or self.is_vehicle(class_id)):
-                        # Calculate box coordinates
-                        center_x = int(detection[0] * width)
-                        center_y = int(detection[1] * height)
-                        w = int(detection[2] * width)
-                        h = int(detection[3] * height)
-                        x = int(center_x - w/2)
-                        y = int(center_y - h/2)
-                        
-                        # Ensure coordinates are valid
-                        x = max(0, x)
-                        y = max(0, y)
-                        w = min(w, width - x)
-                        h = min(h, height - y)
-                        
-                        boxes.append([x, y, w, h])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
+        # Decode every output row at once, keeping only confident persons and vehicles
+        class_ids, confidences, boxes, categories = self.decoder.decode(
+            outputs, width, height, CONF_THRESHOLD)
+        boxes = boxes.tolist()
+        confidences = confidences.tolist()
         
         # Apply non-maximum suppression
         if boxes:
             indices = cv2.dnn.NMSBoxes(boxes, confidences, CONF_THRESHOLD, NMS_THRESHOLD)
             
             # Process valid detections
-            for i in indices:
-                if isinstance(i, list):  # OpenCV version compatibility
-                    i = i[0]
-                
-                x, y, w, h = boxes[i]
-                confidence = confidences[i]
-                class_id = class_ids[i]
-                
+            for i in np.array(indices).flatten():
                 # Apply extra validation to minimize false positives
-                if self.validate_detection([x, y, w, h], frame_dims, class_id, confidence):
-                    if self.is_person(class_id):
-                        human_boxes.append([x, y, w, h])
-                    elif self.is_vehicle(class_id):
-                        vehicle_boxes.append([x, y, w, h])
+                if self.validate_detection(boxes[i], frame_dims, class_ids[i], confidences[i]):
+                    if categories[i] == CATEGORY_PERSON:
+                        human_boxes.append(boxes[i])
+                    elif categories[i] == CATEGORY_VEHICLE:
+                        vehicle_boxes.append(boxes[i])
         
         return human_boxes, vehicle_boxes
     
-    def detect_with_ssd(self, frame, frame_dims, annotated_frame):
+    def detect_with_ssd(self, frame, frame_dims, context):
         """Detect objects using SSD MobileNet"""
         width, height = frame_dims
         human_boxes = []
         vehicle_boxes = []
         
-        # Prepare input blob - SSD needs 300x300
-        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), [127.5, 127.5, 127.5], swapRB=True, crop=False)
-        self.ssd_net.setInput(blob)
-        
-        # Run detection
-        detections = self.ssd_net.forward()
+        # Run detection on the shared network - SSD needs 300x300
+        detections = context.get_outputs(self.ssd_model, 1.0, (300, 300), (127.5, 127.5, 127.5))
         
         # Process detections
         for i in range(detections.shape[2]):
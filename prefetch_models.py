@@ -0,0 +1,110 @@
+"""
+Fetch the model and cascade files listed in models/manifest.json.
+This is the only part of the project that downloads models; the app itself
+works offline with whatever the store holds (see model_store.py). Run it once
+when preparing a helmet image or after changing the manifest.
+
+Files already present and matching the manifest are skipped. A downloaded file
+must match the manifest's size and SHA-256. Entries without a checksum are
+downloaded with a warning that prints the file's checksum; check it against
+the upstream release and add it to models/manifest.json by hand. The manifest
+is never rewritten here, so trusting a download is always a reviewed commit.
+
+Usage: python prefetch_models.py [name ...] [--force] [--check] [--strict]
+    name      manifest entries to fetch (default: all)
+    --force   download again even if the local file verifies
+    --check   only verify the local files, without any network access;
+              exits with status 1 if any of them is missing or corrupt
+    --strict  also fail for files the manifest has no checksum for
+"""
+import hashlib
+import os
+import sys
+import urllib.request
+
+from model_store import ModelStore, USABLE, MISSING, UNPINNED
+
+# Give up on a stalled connection after this many seconds
+DOWNLOAD_TIMEOUT = 30
+
+
+def download(url, path, chunk_size=1 << 20):
+    """Download url to path through a .part file; returns the SHA-256 and size"""
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response, open(path + '.part', 'wb') as f:
+        for chunk in iter(lambda: response.read(chunk_size), b''):
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def is_acceptable(result, strict):
+    """Whether a verification result passes; strict also rejects unpinned files"""
+    return result in USABLE and not (strict and result == UNPINNED)
+
+
+def fetch(store, name, force=False, strict=False):
+    """Make one manifest entry present and verified; returns True on success"""
+    entry = store.manifest[name]
+    path = store.path(name)
+    result = store.verify(name)
+    if result in USABLE and not force:
+        print(f"{name}: {result}")
+        return is_acceptable(result, strict)
+    if not entry.get('url'):
+        print(f"{name}: {result}, no download URL. {entry.get('note', '')}".rstrip())
+        return is_acceptable(result, strict)
+
+    print(f"{name}: downloading {entry['url']}")
+    try:
+        sha256, size = download(entry['url'], path)
+    except Exception as e:
+        print(f"{name}: download failed: {e}")
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        return False
+
+    if entry.get('sha256') is not None and (sha256 != entry['sha256'] or entry.get('size') not in (None, size)):
+        print(f"{name}: downloaded file doesn't match the manifest (sha256 {sha256}, {size} bytes), discarded")
+        os.remove(path + '.part')
+        return False
+
+    os.replace(path + '.part', path)
+    if entry.get('sha256') is None:
+        print(f"{name}: WARNING, the manifest has no checksum for this file, so it is unverified. "
+              f"Check it against the upstream release and add it to the manifest: "
+              f"\"size\": {size}, \"sha256\": \"{sha256}\"")
+    result = store.verify(name)
+    print(f"{name}: {result}")
+    return is_acceptable(result, strict)
+
+
+def main():
+    names = [a for a in sys.argv[1:] if not a.startswith('--')]
+    force = '--force' in sys.argv
+    strict = '--strict' in sys.argv
+    store = ModelStore()
+    unknown = [name for name in names if name not in store.manifest]
+    if unknown:
+        print(f"Unknown entries {unknown}, expected some of {list(store.manifest)}")
+        return 2
+    names = names or list(store.manifest)
+
+    if '--check' in sys.argv:
+        failed = False
+        for name in names:
+            result = store.verify(name)
+            failed = failed or not is_acceptable(result, strict)
+            detail = {MISSING: f" ({store.path(name)})", UNPINNED: " (WARNING: no checksum in the manifest, unverified)"}
+            print(f"{name}: {result}" + detail.get(result, ""))
+        return 1 if failed else 0
+
+    results = [fetch(store, name, force, strict) for name in names]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Intra-frame parallelism for independent detector stages.
+OpenCV, the DNN module and MediaPipe release the GIL inside native code, so
+stages of one frame that don't depend on each other can run at the same time
+on a small thread pool. Results are always consumed by the caller in a fixed
+order, so the merged output doesn't depend on which stage finished first.
+
+The executor also keeps a smoothed cost and result rate for every stage, so
+callers can run interchangeable stages (where the first one to find something
+makes the rest unnecessary) cheapest first.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Weight of the newest measurement in the smoothed stage costs and result rates
+COST_SMOOTHING = 0.2
+
+# Floor for result rates when ordering, so a stage that rarely finds anything
+# is pushed back rather than never tried again
+MIN_HIT_RATE = 0.05
+
+
+class StageResult:
+    """Handle to a stage started with StageExecutor.submit()"""
+    def __init__(self, future=None, value=None, error=None):
+        self.future = future
+        self.value = value
+        self.error = error
+
+    def result(self):
+        """Wait for the stage and return its value, re-raising its exception"""
+        if self.future is not None:
+            return self.future.result()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class StageExecutor:
+    """
+    Runs the independent stages of one frame on at most cores_per_stream threads.
+    The calling thread counts as one of them; with one core every stage runs
+    inline, exactly as if it had been called directly.
+    """
+    def __init__(self, cores_per_stream=1):
+        self.cores_per_stream = max(1, int(cores_per_stream))
+        self.pool = None
+        if self.cores_per_stream > 1:
+            self.pool = ThreadPoolExecutor(max_workers=self.cores_per_stream - 1,
+                                           thread_name_prefix='detector-stage')
+
+        # Last and smoothed run time of each stage in milliseconds, and how often
+        # each stage produced a usable result
+        self.stage_times = {}
+        self.stage_costs = {}
+        self.stage_hit_rates = {}
+        self.lock = threading.Lock()
+
+    def can_speculate(self):
+        """
+        Whether there are enough cores to start a stage whose result may be thrown away
+        (beyond the caller and one parallel stage)
+        """
+        return self.cores_per_stream >= 3
+
+    def timed(self, name, func, args):
+        start_time = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = (time.perf_counter() - start_time) * 1000
+            with self.lock:
+                self.stage_times[name] = elapsed
+                cost = self.stage_costs.get(name)
+                self.stage_costs[name] = elapsed if cost is None else cost + COST_SMOOTHING * (elapsed - cost)
+
+    def submit(self, name, func, *args):
+        """Start a stage and return a StageResult; runs inline when there is no pool"""
+        if self.pool is not None:
+            return StageResult(future=self.pool.submit(self.timed, name, func, args))
+        try:
+            return StageResult(value=self.timed(name, func, args))
+        except Exception as e:
+            return StageResult(error=e)
+
+    def run(self, name, func, *args):
+        """Run a stage on the calling thread, timing it like a submitted one"""
+        return self.timed(name, func, args)
+
+    def record_hit(self, name, hit):
+        """Record whether a stage produced a usable result on this frame"""
+        value = 1.0 if hit else 0.0
+        with self.lock:
+            rate = self.stage_hit_rates.get(name)
+            self.stage_hit_rates[name] = value if rate is None else rate + COST_SMOOTHING * (value - rate)
+
+    def order_by_cost(self, names):
+        """
+        Order interchangeable stages by measured cost per useful result, cheapest first.
+        The given order is kept until every stage has been measured.
+        """
+        with self.lock:
+            if any(name not in self.stage_costs or name not in self.stage_hit_rates for name in names):
+                return list(names)
+            return sorted(names, key=lambda name: self.stage_costs[name] / max(self.stage_hit_rates[name], MIN_HIT_RATE))
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'cores_per_stream': self.cores_per_stream,
+                'stage_ms': {name: round(ms, 2) for name, ms in self.stage_times.items()},
+                'avg_stage_ms': {name: round(ms, 2) for name, ms in self.stage_costs.items()},
+                'hit_rates': {name: round(rate, 2) for name, rate in self.stage_hit_rates.items()}
+            }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
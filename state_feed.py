@@ -0,0 +1,109 @@
+"""
+Server-push channel for the simulation state and the camera sensor readings.
+Instead of polling /api/state and /api/camera_sensors, browsers follow one
+Server-Sent Events stream. The app publishes whole sections ('state',
+'sensors') whenever they may have changed; the feed compares them field by
+field and only fields whose values actually changed are sent.
+
+Each client has a maximum update rate. Changes that arrive faster are
+coalesced: the client gets one message with every field that changed since its
+last one, holding the newest values, so a per-frame sensor update costs at most
+max_rate messages per second per client. The first message holds every field.
+"""
+import copy
+import json
+import threading
+import time
+
+
+class StateFeed:
+    def __init__(self, max_rate=5.0):
+        self.condition = threading.Condition()
+        self.max_rate = max_rate    # Default messages per second per client
+        self.sections = {}          # section -> {field: value}
+        self.field_versions = {}    # (section, field) -> version of its last change
+        self.version = 0
+        self.clients = 0
+
+        # Statistics
+        self.publishes = 0
+        self.changes = 0            # Publishes that changed at least one field
+        self.messages = 0
+
+    def publish(self, section, fields):
+        """Merge new values into a section; returns whether any field changed"""
+        with self.condition:
+            self.publishes += 1
+            current = self.sections.setdefault(section, {})
+            changed = [key for key, value in fields.items() if key not in current or current[key] != value]
+            if not changed:
+                return False
+
+            self.version += 1
+            self.changes += 1
+            for key in changed:
+                # Copy so later in-place changes to the caller's dicts are seen as changes
+                current[key] = copy.deepcopy(fields[key])
+                self.field_versions[(section, key)] = self.version
+            self.condition.notify_all()
+            return True
+
+    def get(self):
+        """Every section with its current values"""
+        with self.condition:
+            return copy.deepcopy(self.sections)
+
+    def changes_since(self, version):
+        """Fields changed after a version, grouped by section (caller holds the lock)"""
+        changes = {}
+        for (section, key), field_version in self.field_versions.items():
+            if field_version > version:
+                changes.setdefault(section, {})[key] = self.sections[section][key]
+        return changes
+
+    def stream(self, max_rate=None, keepalive=15.0):
+        """
+        Generator of Server-Sent Events for a Flask streaming response, sending at
+        most max_rate messages per second with the fields changed since the last one
+        """
+        max_rate = max_rate or self.max_rate
+        min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        with self.condition:
+            self.clients += 1
+        try:
+            version = 0
+            last_sent = 0.0
+            while True:
+                # Wait out the rest of the interval; whatever changes meanwhile goes into one message
+                delay = last_sent + min_interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                with self.condition:
+                    if not self.condition.wait_for(lambda: self.version > version, keepalive):
+                        changes = None
+                    else:
+                        changes = self.changes_since(version)
+                        version = self.version
+                        self.messages += 1
+
+                if changes is None:
+                    # Comment line so proxies don't close an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                last_sent = time.monotonic()
+                changes['version'] = version
+                yield f"data: {json.dumps(changes)}\n\n"
+        finally:
+            with self.condition:
+                self.clients -= 1
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'version': self.version,
+                'clients': self.clients,
+                'publishes': self.publishes,
+                'changes': self.changes,
+                'messages': self.messages
+            }
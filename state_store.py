@@ -0,0 +1,132 @@
+"""
+Versioned store for the simulation state shared by the Flask workers and the
+detection thread.
+Readers take the current snapshot with get(): an immutable, versioned copy of
+the whole state, swapped in atomically by writers, so reading needs no lock and
+can never see half of an update. Writers change the state either in one call
+(update) or through a draft copy they edit under the store's lock (edit);
+either way a change that actually alters something produces one new snapshot
+with the next version number, and listeners are told about it.
+
+A snapshot serializes itself to JSON once and carries an ETag made of the
+store's start time and its version, so HTTP clients can ask "has it changed?"
+with If-None-Match and get a 304 without the state being serialized again.
+"""
+import contextlib
+import json
+import threading
+import time
+import types
+
+
+def freeze(value):
+    """Read-only deep copy: dicts become mapping proxies and lists tuples"""
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return types.MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Plain, mutable deep copy of a frozen value"""
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+class Snapshot:
+    """One immutable version of the state"""
+    def __init__(self, version, data, store_id):
+        self.version = version
+        self.data = data
+        self.etag = f'{store_id}-{version}'
+        self.serialized = None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def to_dict(self):
+        """Mutable copy of the state"""
+        return thaw(self.data)
+
+    def to_json(self):
+        """The state as JSON bytes, serialized on first use and then reused"""
+        if self.serialized is None:
+            # Two readers racing here both produce the same bytes, so no lock is needed
+            self.serialized = json.dumps(self.to_dict()).encode()
+        return self.serialized
+
+
+class StateStore:
+    def __init__(self, initial):
+        self.lock = threading.RLock()
+        self.store_id = format(int(time.time() * 1000), 'x')  # Keeps ETags from an earlier run from matching
+        self.snapshot = Snapshot(1, freeze(initial), self.store_id)
+        self.listeners = []  # Called with each new snapshot, after the lock is released
+
+        # Statistics
+        self.updates = 0
+        self.unchanged_updates = 0
+
+    def get(self):
+        """The current snapshot; safe to read from any thread without locking"""
+        return self.snapshot
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) for every new version; it must be quick"""
+        self.listeners.append(listener)
+
+    def commit(self, data):
+        """Replace the state with data (caller holds the lock); returns the new snapshot or None"""
+        self.updates += 1
+        frozen = freeze(data)
+        if frozen == self.snapshot.data:
+            self.unchanged_updates += 1
+            return None
+        self.snapshot = Snapshot(self.snapshot.version + 1, frozen, self.store_id)
+        return self.snapshot
+
+    def notify(self, snapshot):
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in state store listener: {e}")
+
+    def update(self, changes=None, **fields):
+        """Set some top-level fields in one atomic step; returns the current snapshot"""
+        with self.lock:
+            data = dict(self.snapshot.data)
+            data.update(changes or {})
+            data.update(fields)
+            snapshot = self.commit(data)
+        if snapshot is not None:
+            self.notify(snapshot)
+        return self.snapshot
+
+    @contextlib.contextmanager
+    def edit(self):
+        """
+        Yield a mutable copy of the state to read and change; the changes are
+        published as one new version when the block ends without an exception.
+        Other writers wait meanwhile, so keep slow work (network calls) outside.
+        """
+        with self.lock:
+            draft = self.snapshot.to_dict()
+            yield draft
+            snapshot = self.commit(draft)
+        if snapshot is not None:
+            self.notify(snapshot)
+
+    def get_stats(self):
+        return {
+            'version': self.snapshot.version,
+            'updates': self.updates,
+            'unchanged_updates': self.unchanged_updates
+        }
@@ -224,7 +224,7 @@ class DirectVoiceAssistant {
         this.updateVoiceResponse(`Processing: "${command}"`, "processing");
         
         try {
-            const response = await fetch('/api/voice_command', {
+            const response = await fetch(`${window.HELMET_BASE || ''}/api/voice_command`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
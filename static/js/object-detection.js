@@ -21,12 +21,22 @@ class ObjectDetector {
         this.humanCount = 0;
         this.vehicleCount = 0;
         this.updateInterval = null;
+        this.eventSource = null;
+        
+        // Box colors per detection category, matching the server-side overlays
+        this.colors = {
+            person: '#00ff00',
+            face: '#00ff00',
+            vehicle: '#ffa500',
+            other: '#ff0000'
+        };
         
         // Bind methods
         this.resizeCanvas = this.resizeCanvas.bind(this);
         this.startDetection = this.startDetection.bind(this);
         this.stopDetection = this.stopDetection.bind(this);
         this.updateStats = this.updateStats.bind(this);
+        this.handleDetections = this.handleDetections.bind(this);
         
         // Initialize
         this.init();
@@ -64,8 +74,14 @@ class ObjectDetector {
         // Stop any existing update loop
         this.stopDetection();
         
-        // Start updating stats at regular intervals
-        this.updateInterval = setInterval(this.updateStats, 1000);
+        if (window.EventSource) {
+            // The server pushes every new set of detections
+            this.eventSource = new EventSource(`${window.HELMET_BASE || ''}/api/detections/stream`);
+            this.eventSource.onmessage = (event) => this.handleDetections(JSON.parse(event.data));
+        } else {
+            // Fall back to polling the latest detections
+            this.updateInterval = setInterval(this.updateStats, 1000);
+        }
         
         console.log('Detection visualization started');
     }
@@ -75,27 +91,78 @@ class ObjectDetector {
             clearInterval(this.updateInterval);
             this.updateInterval = null;
         }
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
     }
     
     updateStats() {
-        // This function now only retrieves detection stats from the Python backend
-        fetch('/api/detection_stats')
+        // Retrieve the latest detections from the Python backend
+        fetch(`${window.HELMET_BASE || ''}/api/detections`)
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    this.humanCount = data.humans_count || 0;
-                    this.vehicleCount = data.vehicles_count || 0;
-                    
-                    // Update the display
-                    this.humanCountElement.textContent = this.humanCount;
-                    this.vehicleCountElement.textContent = this.vehicleCount;
+                    this.handleDetections(data.detections);
                 }
             })
             .catch(error => {
-                console.error('Error fetching detection stats:', error);
+                console.error('Error fetching detections:', error);
             });
     }
     
+    handleDetections(snapshot) {
+        this.humanCount = snapshot.humans_count || 0;
+        this.vehicleCount = snapshot.vehicles_count || 0;
+        
+        // Update the display
+        this.humanCountElement.textContent = this.humanCount;
+        this.vehicleCountElement.textContent = this.vehicleCount;
+        
+        this.drawDetections(snapshot);
+    }
+    
+    drawDetections(snapshot) {
+        this.clearOverlay();
+        
+        // In the default mode the server has already drawn the boxes into the frames
+        if (snapshot.annotated || !snapshot.detections.length) return;
+        
+        // Map frame coordinates onto the displayed (letterboxed) stream element
+        const stream = this.cameraStream.classList.contains('d-none') ? this.localVideoStream : this.cameraStream;
+        const [frameWidth, frameHeight] = snapshot.resolution.split('x').map(Number);
+        const streamRect = stream.getBoundingClientRect();
+        const canvasRect = this.canvas.getBoundingClientRect();
+        if (!frameWidth || !frameHeight || !streamRect.width) return;
+        
+        const scaleX = streamRect.width / frameWidth;
+        const scaleY = streamRect.height / frameHeight;
+        const offsetX = streamRect.left - canvasRect.left;
+        const offsetY = streamRect.top - canvasRect.top;
+        
+        this.ctx.lineWidth = 2;
+        this.ctx.font = '12px sans-serif';
+        snapshot.detections.forEach(detection => {
+            const [x, y, w, h] = detection.box;
+            const color = this.colors[detection.category] || this.colors.other;
+            let label = detection.label.charAt(0).toUpperCase() + detection.label.slice(1);
+            if (detection.confidence !== null) {
+                label += ` ${Math.round(Math.min(detection.confidence, 1.0) * 100)}%`;
+            }
+            
+            this.ctx.strokeStyle = color;
+            this.ctx.fillStyle = color;
+            this.ctx.strokeRect(offsetX + x * scaleX, offsetY + y * scaleY, w * scaleX, h * scaleY);
+            this.ctx.fillText(label, offsetX + x * scaleX, offsetY + y * scaleY - 4);
+        });
+    }
+    
+    clearOverlay() {
+        if (this.ctx) {
+            this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+        }
+    }
+    
     resizeCanvas() {
         // Resize canvas to match video dimensions
         const container = document.querySelector('.camera-container');
@@ -107,9 +174,7 @@ class ObjectDetector {
     
     clearCanvas() {
         // Clear the canvas and reset counts
-        if (this.ctx) {
-            this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
-        }
+        this.clearOverlay();
         
         this.humanCount = 0;
         this.vehicleCount = 0;
@@ -7,6 +7,11 @@ document.addEventListener('DOMContentLoaded', function() {
     let localStreamActive = false;
     let localStream = null;
     let sensorUpdateInterval = null;
+    let sensorUpdatesActive = false;
+    let stateSource = null;  // Server-Sent Events channel pushing changed state and sensor fields
+    const serverState = {};
+    const sensorState = {};
+    const apiBase = window.HELMET_BASE || '';  // This helmet's API prefix, set by the page
     
     // DOM Elements
     const speedControl = document.getElementById('speed-control');
@@ -163,9 +168,29 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Follow the server's state channel; it sends every field first, then only changed ones
+    function startStateStream() {
+        stateSource = new EventSource(`${apiBase}/api/state/stream`);
+        stateSource.onmessage = function(event) {
+            const changes = JSON.parse(event.data);
+            if (changes.state) {
+                Object.assign(serverState, changes.state);
+                updateUI(serverState);
+                currentSpeed = serverState.speed;
+                updateRoadLines();
+            }
+            if (changes.sensors) {
+                Object.assign(sensorState, changes.sensors);
+                if (sensorUpdatesActive) {
+                    showSensorData(sensorState);
+                }
+            }
+        };
+    }
+    
     // Fetch current state from server
     function fetchState() {
-        fetch('/api/state')
+        fetch(`${apiBase}/api/state`)
             .then(response => response.json())
             .then(state => {
                 updateUI(state);
@@ -177,7 +202,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Update speed on server
     function updateSpeed(speed) {
-        fetch('/api/update_speed', {
+        fetch(`${apiBase}/api/update_speed`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -270,7 +295,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Call handling
     startCallBtn.addEventListener('click', function() {
         const callerName = callerNameInput.value || null;
-        fetch('/api/trigger_call', {
+        fetch(`${apiBase}/api/trigger_call`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -290,7 +315,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     endCallBtn.addEventListener('click', function() {
-        fetch('/api/trigger_call', {
+        fetch(`${apiBase}/api/trigger_call`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -308,7 +333,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Music control
     playMusicBtn.addEventListener('click', function() {
-        fetch('/api/music_control', {
+        fetch(`${apiBase}/api/music_control`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -325,7 +350,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     pauseMusicBtn.addEventListener('click', function() {
-        fetch('/api/music_control', {
+        fetch(`${apiBase}/api/music_control`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -342,7 +367,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     prevTrackBtn.addEventListener('click', function() {
-        fetch('/api/music_control', {
+        fetch(`${apiBase}/api/music_control`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -359,7 +384,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     nextTrackBtn.addEventListener('click', function() {
-        fetch('/api/music_control', {
+        fetch(`${apiBase}/api/music_control`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -377,7 +402,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Navigation control
     startNavigationBtn.addEventListener('click', function() {
-        fetch('/api/navigation', {
+        fetch(`${apiBase}/api/navigation`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -394,7 +419,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     nextDirectionBtn.addEventListener('click', function() {
-        fetch('/api/navigation', {
+        fetch(`${apiBase}/api/navigation`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -411,7 +436,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     
     stopNavigationBtn.addEventListener('click', function() {
-        fetch('/api/navigation', {
+        fetch(`${apiBase}/api/navigation`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -441,7 +466,7 @@ document.addEventListener('DOMContentLoaded', function() {
             voiceResponse.className = 'mt-3 p-2 border rounded bg-light processing';
             voiceResponse.innerHTML = '<p class="text-muted mb-0">Processing command...</p>';
             
-            fetch('/api/voice_command', {
+            fetch(`${apiBase}/api/voice_command`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -499,7 +524,7 @@ document.addEventListener('DOMContentLoaded', function() {
         cameraStatus.textContent = 'Connecting...';
         cameraStatus.className = 'badge bg-warning';
         
-        fetch('/api/connect_camera', {
+        fetch(`${apiBase}/api/connect_camera`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -544,7 +569,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function updateCameraStream() {
         if (cameraConnected && !localStreamActive) {
             // Set random query parameter to avoid caching
-            cameraStream.src = `/camera_stream?t=${new Date().getTime()}`;
+            cameraStream.src = `${apiBase}/camera_stream?t=${new Date().getTime()}`;
             
             // Handle camera stream errors
             cameraStream.onerror = function() {
@@ -560,7 +585,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Check camera status on page load
     function checkCameraStatus() {
-        fetch('/api/camera_status')
+        fetch(`${apiBase}/api/camera_status`)
             .then(response => response.json())
             .then(data => {
                 if (data.connected) {
@@ -575,44 +600,53 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Sensor data handling
-    function fetchSensorData() {
+    function showCameraDisconnected() {
         if (!cameraConnected && !localStreamActive) {
             sensorStatus.textContent = 'Camera Disconnected';
             sensorStatus.className = 'badge bg-secondary';
-            return;
+            return true;
         }
+        return false;
+    }
+    
+    function showSensorData(sensors) {
+        if (showCameraDisconnected()) return;
+        
+        // Update UI with sensor data
+        updateSensorDisplay(sensors);
+        
+        // Update status badge
+        sensorStatus.textContent = 'Live Data';
+        sensorStatus.className = 'badge bg-success';
+        
+        // Ensure human and vehicle counts are updated in both places
+        const humanCountDisplays = document.querySelectorAll('[id="human-count"]');
+        const vehicleCountDisplays = document.querySelectorAll('[id="vehicle-count"]');
+        
+        humanCountDisplays.forEach(element => {
+            element.textContent = sensors.humans_count || 0;
+        });
+        
+        vehicleCountDisplays.forEach(element => {
+            element.textContent = sensors.vehicles_count || 0;
+        });
+        
+        // Update object detector counts if available
+        if (window.objectDetector) {
+            window.objectDetector.humanCount = sensors.humans_count || 0;
+            window.objectDetector.vehicleCount = sensors.vehicles_count || 0;
+        }
+    }
+    
+    function fetchSensorData() {
+        if (showCameraDisconnected()) return;
         
         // Make the API call to get sensor data
-        fetch('/api/camera_sensors')
+        fetch(`${apiBase}/api/camera_sensors`)
             .then(response => response.json())
             .then(data => {
                 if (data.success && data.sensors) {
-                    console.log("Received sensor data:", data.sensors);
-                    
-                    // Update UI with sensor data
-                    updateSensorDisplay(data.sensors);
-                    
-                    // Update status badge
-                    sensorStatus.textContent = 'Live Data';
-                    sensorStatus.className = 'badge bg-success';
-                    
-                    // Ensure human and vehicle counts are updated in both places
-                    const humanCountDisplays = document.querySelectorAll('[id="human-count"]');
-                    const vehicleCountDisplays = document.querySelectorAll('[id="vehicle-count"]');
-                    
-                    humanCountDisplays.forEach(element => {
-                        element.textContent = data.sensors.humans_count || 0;
-                    });
-                    
-                    vehicleCountDisplays.forEach(element => {
-                        element.textContent = data.sensors.vehicles_count || 0;
-                    });
-                    
-                    // Update object detector counts if available
-                    if (window.objectDetector) {
-                        window.objectDetector.humanCount = data.sensors.humans_count || 0;
-                        window.objectDetector.vehicleCount = data.sensors.vehicles_count || 0;
-                    }
+                    showSensorData(data.sensors);
                 } else {
                     console.error("Error in sensor data:", data);
                     sensorStatus.textContent = 'Data Error';
@@ -627,8 +661,6 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     function updateSensorDisplay(sensors) {
-        console.log("Updating sensor display with:", sensors);
-        
         // Update light level
         if (sensors.light_level !== undefined) {
             const lightPercent = Math.min(100, Math.max(0, sensors.light_level / 10));
@@ -756,20 +788,19 @@ document.addEventListener('DOMContentLoaded', function() {
     // Make the refresh button trigger continuous updates instead of a single update
     refreshSensorBtn.addEventListener('click', function() {
         // Change button text to indicate status
-        if (sensorUpdateInterval) {
+        if (sensorUpdatesActive) {
             // If already updating, stop updates
-            clearInterval(sensorUpdateInterval);
-            sensorUpdateInterval = null;
+            sensorUpdatesActive = false;
+            if (sensorUpdateInterval) {
+                clearInterval(sensorUpdateInterval);
+                sensorUpdateInterval = null;
+            }
             this.innerHTML = '<i class="bi bi-play-fill me-1"></i> Start Live Updates';
             this.classList.remove('btn-outline-danger');
             this.classList.add('btn-outline-success');
         } else {
             // Start continuous updates
-            sensorUpdateInterval = setInterval(fetchSensorData, 500); // Update every 500ms
-            fetchSensorData(); // Fetch immediately first
-            this.innerHTML = '<i class="bi bi-pause-fill me-1"></i> Pause Live Updates';
-            this.classList.remove('btn-outline-success');
-            this.classList.add('btn-outline-danger');
+            startSensorUpdates();
         }
     });
     
@@ -778,11 +809,22 @@ document.addEventListener('DOMContentLoaded', function() {
         // Clear any existing interval
         if (sensorUpdateInterval) {
             clearInterval(sensorUpdateInterval);
+            sensorUpdateInterval = null;
         }
+        sensorUpdatesActive = true;
         
-        // Start continuous updates
-        fetchSensorData(); // Fetch immediately first
-        sensorUpdateInterval = setInterval(fetchSensorData, 500); // Update every 500ms
+        if (stateSource) {
+            // The state channel pushes new readings; show the latest known ones now
+            if (Object.keys(sensorState).length) {
+                showSensorData(sensorState);
+            } else {
+                fetchSensorData();
+            }
+        } else {
+            // Start continuous updates
+            fetchSensorData(); // Fetch immediately first
+            sensorUpdateInterval = setInterval(fetchSensorData, 500); // Update every 500ms
+        }
         
         // Update button state
         refreshSensorBtn.innerHTML = '<i class="bi bi-pause-fill me-1"></i> Pause Live Updates';
@@ -1163,11 +1205,15 @@ ${data.error_details || 'No additional error details available'}
         }
     });
     
-    // Initial state fetch and periodic updates
-    fetchState();
+    // Initial state and then pushed updates, or periodic polling without EventSource
     checkCameraStatus();
     getAvailableCameras(); // Get available cameras on page load
-    updateInterval = setInterval(fetchState, 2000);
+    if (window.EventSource) {
+        startStateStream();
+    } else {
+        fetchState();
+        updateInterval = setInterval(fetchState, 2000);
+    }
     
     // Start continuous sensor updates by default
     startSensorUpdates();
@@ -1183,7 +1229,7 @@ ${data.error_details || 'No additional error details available'}
         cameraStatus.textContent = 'Connecting...';
         cameraStatus.className = 'badge bg-warning';
         
-        fetch('/api/connect_camera', {
+        fetch(`${apiBase}/api/connect_camera`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -1216,9 +1262,10 @@ ${data.error_details || 'No additional error details available'}
         });
     });
     
-    // Update camera stream periodically
+    // Reattach the camera stream only if it isn't already playing. The server keeps one
+    // shared connection to the ESP32, so reassigning src would just force a reconnect
     setInterval(function() {
-        if (cameraConnected) {
+        if (cameraConnected && !cameraStream.src.includes('/camera_stream')) {
             updateCameraStream();
         }
     }, 5000);
@@ -1228,6 +1275,7 @@ ${data.error_details || 'No additional error details available'}
         if (animationId) clearInterval(animationId);
         if (updateInterval) clearInterval(updateInterval);
         if (sensorUpdateInterval) clearInterval(sensorUpdateInterval);
+        if (stateSource) stateSource.close();
     });
 
     // Call fetchSensorData immediately on page load
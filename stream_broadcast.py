@@ -0,0 +1,150 @@
+"""
+Encode-once MJPEG broadcasting.
+Each processed frame is JPEG-encoded a single time and the bytes are fanned out
+to every connected viewer. Viewers get a small bounded queue that drops the
+oldest frame when they fall behind, and an optional frame-rate limit.
+"""
+import collections
+import threading
+import time
+import cv2
+
+BOUNDARY = b'frame'
+
+
+def make_mjpeg_packet(jpeg_bytes, boundary=BOUNDARY):
+    """Wrap JPEG bytes as one part of a multipart/x-mixed-replace stream"""
+    return (b'--' + boundary + b'\r\n' +
+            b'Content-Type: image/jpeg\r\n' +
+            b'Content-Length: ' + str(len(jpeg_bytes)).encode() + b'\r\n\r\n' +
+            bytes(jpeg_bytes) + b'\r\n')
+
+
+class StreamSubscriber:
+    """One viewer of a broadcast with its own bounded frame queue"""
+    def __init__(self, max_queue=2, max_fps=None):
+        self.packets = collections.deque(maxlen=max_queue)
+        self.condition = threading.Condition()
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.last_sent = 0.0
+        self.closed = False
+
+        # Per-client statistics
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.connected_at = time.time()
+
+    def is_due(self, now):
+        """Check whether the frame-rate limit allows this viewer another frame"""
+        return now - self.last_sent >= self.min_interval
+
+    def offer(self, packet, now):
+        """Queue a packet, dropping the oldest queued one if the viewer is behind"""
+        with self.condition:
+            if len(self.packets) == self.packets.maxlen:
+                self.frames_dropped += 1
+            self.packets.append(packet)
+            self.last_sent = now
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Wait for the next packet; returns None on timeout or when closed"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.packets or self.closed, timeout)
+            if not self.packets:
+                return None
+            self.frames_sent += 1
+            return self.packets.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_stats(self):
+        return {
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'queued': len(self.packets),
+            'max_fps': round(1.0 / self.min_interval, 1) if self.min_interval else None,
+            'connected_for': round(time.time() - self.connected_at, 1)
+        }
+
+
+class MJPEGBroadcaster:
+    """Fans one stream of frames out to any number of MJPEG viewers"""
+    def __init__(self, name, quality=85):
+        self.name = name
+        self.quality = quality
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.frames_published = 0
+        self.frames_encoded = 0
+
+    def subscribe(self, max_fps=None, max_queue=2):
+        """Register a new viewer"""
+        subscriber = StreamSubscriber(max_queue=max_queue, max_fps=max_fps)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def due_subscribers(self, now):
+        """Return the viewers whose frame-rate limit allows a frame now"""
+        with self.lock:
+            return [s for s in self.subscribers if s.is_due(now)]
+
+    def publish(self, frame):
+        """Encode a frame once and send it to every viewer that is due a frame"""
+        self.frames_published += 1
+        now = time.time()
+        due = self.due_subscribers(now)
+        if not due:
+            # Nobody is watching (or all viewers are rate limited): skip the encode
+            return
+
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        self.frames_encoded += 1
+        self.fan_out(make_mjpeg_packet(jpeg.tobytes()), due, now)
+
+    def publish_jpeg(self, jpeg_bytes):
+        """Send already-encoded JPEG bytes to every viewer that is due a frame"""
+        self.frames_published += 1
+        now = time.time()
+        due = self.due_subscribers(now)
+        if due:
+            self.fan_out(make_mjpeg_packet(jpeg_bytes), due, now)
+
+    def fan_out(self, packet, subscribers, now):
+        for subscriber in subscribers:
+            subscriber.offer(packet, now)
+
+    def stream(self, subscriber):
+        """Generator of MJPEG packets for a Flask streaming response"""
+        try:
+            while not subscriber.closed:
+                packet = subscriber.get(timeout=1.0)
+                if packet is not None:
+                    yield packet
+        finally:
+            # Runs when the viewer disconnects and Flask closes the generator
+            self.unsubscribe(subscriber)
+
+    def get_stats(self):
+        with self.lock:
+            clients = [s.get_stats() for s in self.subscribers]
+        return {
+            'name': self.name,
+            'frames_published': self.frames_published,
+            'frames_encoded': self.frames_encoded,
+            'subscribers': clients
+        }
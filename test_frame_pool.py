@@ -0,0 +1,41 @@
+"""
+Checks that a steady stream of same-sized frames stops allocating frame
+buffers once the pool has warmed up.
+"""
+import cv2
+import numpy as np
+
+from object_detection import ObjectDetector
+
+FRAMES = 30
+WARM_UP_FRAMES = 5
+
+
+def make_frames(count, width=320, height=240):
+    """Distinct smooth frames, so neither the frame cache nor the motion gate skips the detectors"""
+    rng = np.random.default_rng(0)
+    return [cv2.GaussianBlur(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8), (9, 9), 0)
+            for _ in range(count)]
+
+
+def test_detect_objects_stops_allocating():
+    detector = ObjectDetector(annotate=True)
+    allocations = []
+    for frame in make_frames(FRAMES):
+        processed_frame, _, _, _ = detector.detect_objects(frame)
+        detector.release_frame(processed_frame)
+        allocations.append(detector.frame_pool.allocations)
+
+    assert allocations[-1] == allocations[WARM_UP_FRAMES - 1]
+    assert detector.frame_pool.get_stats()['outstanding'] == 0
+
+
+def test_process_image_data_releases_its_frame():
+    detector = ObjectDetector(annotate=True)
+    for frame in make_frames(FRAMES):
+        result = detector.process_image_data(frame)
+        assert 'error' not in result
+
+    stats = detector.frame_pool.get_stats()
+    assert stats['outstanding'] == 0
+    assert stats['allocations'] <= WARM_UP_FRAMES
@@ -0,0 +1,228 @@
+"""
+Shared upstream reader for ESP32 camera streams.
+Keeps one persistent HTTP connection per camera URL, reconnects with backoff,
+runs detection once per upstream frame and fans the processed frames out to
+any number of viewers. Frames go through a decode -> detect -> encode pipeline
+whose stages run on their own threads, so decoding and encoding overlap with
+detection of the neighbouring frames. The ESP32 can only serve one or two streams at a time,
+so viewers must never open their own upstream connections.
+"""
+import threading
+import time
+import cv2
+import numpy as np
+import requests
+
+from mjpeg_parser import MJPEGParser
+from pipeline import Pipeline, Stage
+from stream_broadcast import MJPEGBroadcaster
+
+# Reconnect backoff in seconds
+INITIAL_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+
+# Stop reading a camera nobody has watched for this many seconds
+IDLE_TIMEOUT = 30.0
+
+
+class UpstreamStreamReader:
+    def __init__(self, url, detector, idle_timeout=IDLE_TIMEOUT):
+        self.url = url
+        self.stream_url = f'{url}/stream'
+        self.detector = detector
+        self.idle_timeout = idle_timeout
+
+        # One pooled keep-alive session for every connection to this camera
+        self.session = requests.Session()
+        self.response = None
+
+        # Capture -> decode -> detect -> encode, then fan-out to the viewers. Each stage
+        # keeps only the newest frame queued, so latency stays bounded when detection
+        # is slower than the camera; the thread counts come from the detector's config
+        self.broadcaster = MJPEGBroadcaster(f'esp32:{url}')
+        self.pipeline = self.build_pipeline(detector.pipeline_config)
+
+        self.running = False
+        self.last_viewer_time = time.time()
+
+        # Connection statistics
+        self.connected = False
+        self.connects = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.backoff = INITIAL_BACKOFF
+        self.frames_skipped = 0  # Frames superseded within the same network chunk
+
+    def build_pipeline(self, config):
+        """The per-frame stages between the MJPEG parser and the broadcaster"""
+        workers = config.get('workers', {})
+        queue_sizes = config.get('queue_sizes', {})
+        stages = [
+            Stage('decode', self.decode_stage, ['jpeg'], ['frame']),
+            # The detector keeps state between frames, so it always runs on one thread
+            Stage('detect', self.detect_stage, ['frame'], ['processed_frame']),
+            Stage('encode', self.encode_stage, ['jpeg', 'processed_frame'], [])
+        ]
+        for stage in stages:
+            if stage.name != 'detect':
+                stage.workers = max(1, int(workers.get(stage.name, 1)))
+            stage.queue_size = queue_sizes.get(stage.name, 1)
+        return Pipeline(f'esp32:{self.url}', stages, inputs=['jpeg'], on_drop=self.release_record)
+
+    def start(self):
+        """Start the reader thread and the pipeline's stage threads"""
+        self.running = True
+        self.pipeline.start()
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        print(f"Started upstream reader for {self.stream_url}")
+
+    def stop(self):
+        """Stop all threads and drop the upstream connection"""
+        self.running = False
+        self.pipeline.stop()
+        if self.response is not None:
+            self.response.close()
+        self.session.close()
+        print(f"Stopped upstream reader for {self.stream_url}")
+
+    def subscribe(self, max_fps=None):
+        """Add a viewer to this camera's broadcast"""
+        self.last_viewer_time = time.time()
+        return self.broadcaster.subscribe(max_fps=max_fps)
+
+    def is_idle(self):
+        """Check whether the camera has had no viewers for longer than the idle timeout"""
+        if self.broadcaster.subscribers:
+            self.last_viewer_time = time.time()
+            return False
+        return time.time() - self.last_viewer_time > self.idle_timeout
+
+    def read_loop(self):
+        """Capture thread: keep one upstream connection open, reconnecting with backoff"""
+        while self.running:
+            if self.is_idle():
+                self.stop()
+                break
+
+            try:
+                self.response = self.session.get(self.stream_url, stream=True, timeout=(3, 10))
+                self.response.raise_for_status()
+                self.connected = True
+                self.connects += 1
+                self.read_frames(self.response)
+            except Exception as e:
+                self.last_error = str(e)
+                if self.running:
+                    print(f"Upstream stream error for {self.stream_url}: {e}")
+            finally:
+                self.connected = False
+                if self.response is not None:
+                    self.response.close()
+
+            if not self.running:
+                break
+
+            # Wait before reconnecting, backing off further on repeated failures
+            self.reconnects += 1
+            time.sleep(self.backoff)
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def read_frames(self, response):
+        """Parse JPEGs out of the MJPEG stream into the pipeline"""
+        parser = MJPEGParser()
+        for chunk in response.iter_content(chunk_size=16384):
+            if not self.running or self.is_idle():
+                break
+
+            frames = parser.feed(chunk)
+            if frames:
+                # Hand only the newest JPEG to the pipeline, replacing any it hasn't taken yet
+                self.pipeline.submit({'jpeg': frames[-1]})
+                self.frames_skipped += len(frames) - 1
+
+                # A good frame means the connection is healthy again
+                self.backoff = INITIAL_BACKOFF
+
+    def decode_stage(self, record):
+        frame = cv2.imdecode(np.frombuffer(record['jpeg'], dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        return {'frame': frame}
+
+    def detect_stage(self, record):
+        processed_frame, _, _, _ = self.detector.detect_objects(record['frame'])
+        return {'processed_frame': processed_frame}
+
+    def encode_stage(self, record):
+        if self.detector.annotate:
+            self.broadcaster.publish(record['processed_frame'])
+        else:
+            # Nothing was drawn, so forward the camera's own JPEG without re-encoding
+            self.broadcaster.publish_jpeg(record['jpeg'])
+
+        # The broadcaster has encoded it, so the frame buffer can be reused
+        self.release_record(record)
+        return {}
+
+    def release_record(self, record):
+        """Give back the pooled frame of a finished or dropped record"""
+        self.detector.release_frame(record.get('processed_frame'))
+
+    def get_stats(self):
+        return {
+            'url': self.stream_url,
+            'connected': self.connected,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'last_error': self.last_error,
+            'frames_skipped': self.frames_skipped,
+            'pipeline': self.pipeline.get_stats(),
+            'broadcast': self.broadcaster.get_stats()
+        }
+
+
+# One reader per owner (the helmet whose detector it runs) and camera URL, shared by
+# every viewer of that helmet's camera in the process
+upstream_readers = {}
+upstream_readers_lock = threading.Lock()
+
+
+def get_upstream_reader(url, detector, owner=None):
+    """Return the running reader of an owner's camera URL, starting one if needed"""
+    with upstream_readers_lock:
+        reader = upstream_readers.get((owner, url))
+        if reader is not None and reader.running and reader.detector is not detector:
+            # The owner's detector was replaced; its results must not go to the old one
+            reader.stop()
+        if reader is None or not reader.running:
+            reader = UpstreamStreamReader(url, detector)
+            upstream_readers[(owner, url)] = reader
+            reader.start()
+
+        # Count the caller as a viewer so the reader can't idle out before it subscribes
+        reader.last_viewer_time = time.time()
+        return reader
+
+
+def find_upstream_reader(owner, url):
+    """The running reader of an owner's camera URL, or None"""
+    with upstream_readers_lock:
+        reader = upstream_readers.get((owner, url))
+        return reader if reader is not None and reader.running else None
+
+
+def stop_upstream_readers(owner):
+    """Stop and forget every reader of an owner, e.g. when its detector is closed"""
+    with upstream_readers_lock:
+        keys = [key for key in upstream_readers if key[0] == owner]
+        readers = [upstream_readers.pop(key) for key in keys]
+    for reader in readers:
+        if reader.running:
+            reader.stop()
+
+
+def get_upstream_stats(owner=None):
+    """Return statistics for every active upstream reader, or only an owner's"""
+    with upstream_readers_lock:
+        return [reader.get_stats() for (reader_owner, url), reader in upstream_readers.items()
+                if reader.running and (owner is None or reader_owner == owner)]
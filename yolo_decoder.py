@@ -0,0 +1,93 @@
+"""
+Vectorized decoding of raw YOLO output tensors.
+Turns the (rows x 85) outputs of a YOLO forward pass into class, confidence and
+box arrays using NumPy masks instead of a Python loop over every row.
+"""
+import numpy as np
+
+# Category codes stored in the class lookup tables
+CATEGORY_NONE = 0
+CATEGORY_PERSON = 1
+CATEGORY_VEHICLE = 2
+
+# YOLO rows hold 4 box values, an objectness score and one score per class
+YOLO_BOX_FIELDS = 5
+YOLO_MIN_ROW_LENGTH = 85
+
+
+def build_category_table(num_classes, is_person, is_vehicle):
+    """
+    Precompute the category of every class ID so decoding never has to match
+    class names. is_person/is_vehicle are the detector's own class checks.
+    """
+    table = np.zeros(num_classes, dtype=np.uint8)
+    for class_id in range(num_classes):
+        if is_person(class_id):
+            table[class_id] = CATEGORY_PERSON
+        elif is_vehicle(class_id):
+            table[class_id] = CATEGORY_VEHICLE
+    return table
+
+
+class YoloDecoder:
+    """Decodes YOLO outputs for one detector, caching its class lookup table"""
+    def __init__(self, is_person, is_vehicle):
+        self.is_person = is_person
+        self.is_vehicle = is_vehicle
+        self.category_tables = {}  # num_classes -> lookup table
+
+    def get_category_table(self, num_classes):
+        """Return the lookup table for the given number of classes, building it once"""
+        table = self.category_tables.get(num_classes)
+        if table is None:
+            table = build_category_table(num_classes, self.is_person, self.is_vehicle)
+            self.category_tables[num_classes] = table
+        return table
+
+    def decode(self, outputs, width, height, conf_threshold, min_box_size=0, max_box_ratio=None):
+        """
+        Decode all output tensors of a forward pass.
+        Returns: class_ids, confidences, boxes (N x 4 as x, y, w, h) and categories
+        """
+        rows = outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=0)
+
+        if rows.ndim != 2 or rows.shape[0] == 0 or rows.shape[1] < YOLO_MIN_ROW_LENGTH:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32),
+                    np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.uint8))
+
+        # Best class and its score for every row
+        scores = rows[:, YOLO_BOX_FIELDS:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        categories = self.get_category_table(scores.shape[1])[class_ids]
+
+        # Confidence and class whitelist filtering
+        keep = (confidences > conf_threshold) & (categories != CATEGORY_NONE)
+        rows = rows[keep]
+        class_ids = class_ids[keep]
+        confidences = confidences[keep]
+        categories = categories[keep]
+
+        # Scale the boxes back to the frame size, truncating like int() does
+        center_x = np.trunc(rows[:, 0] * width)
+        center_y = np.trunc(rows[:, 1] * height)
+        w = np.trunc(rows[:, 2] * width)
+        h = np.trunc(rows[:, 3] * height)
+        x = np.trunc(center_x - w / 2)
+        y = np.trunc(center_y - h / 2)
+
+        # Ensure coordinates are within frame boundaries
+        x = np.maximum(x, 0)
+        y = np.maximum(y, 0)
+        w = np.minimum(w, width - x)
+        h = np.minimum(h, height - y)
+
+        # Size filtering
+        keep = np.ones(len(x), dtype=bool)
+        if min_box_size:
+            keep &= (w >= min_box_size) & (h >= min_box_size)
+        if max_box_ratio is not None:
+            keep &= (w <= width * max_box_ratio) & (h <= height * max_box_ratio)
+
+        boxes = np.stack([x, y, w, h], axis=1)[keep].astype(np.int32)
+        return class_ids[keep], confidences[keep], boxes, categories[keep]